@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_jwt_auth import AuthJWT
 from pymongo.database import Database
-from app.models.user_model import UserDB, get_db
+from app.models.user_model import CurrentUser, get_db
 from app.models.schema import UserCreate, EmailVerificationSchema, EmailSchema
 from app.services.auth_services import AuthService
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 
@@ -17,12 +18,16 @@ def get_auth_service(db: Database = Depends(get_db)):
 async def get_current_user(
     Authorize: AuthJWT = Depends(),
     auth_service: AuthService = Depends(get_auth_service)
-) -> UserDB:
+) -> CurrentUser:
     Authorize.jwt_required()
     current_user_email = Authorize.get_jwt_subject()
-    user = await auth_service.get_user_by_email(current_user_email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await user_cache.get(current_user_email)
+    if user is None:
+        user_db = await auth_service.get_user_by_email(current_user_email)
+        if not user_db:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = CurrentUser.from_user(user_db)
+        await user_cache.set(user)
     return user
 
 
@@ -36,12 +41,14 @@ async def register(
 
 @router.post("/login")
 async def login(
+    request: Request,
     response: Response,
     Authorize: AuthJWT = Depends(),
     form_data: OAuth2PasswordRequestForm = Depends(),
     auth_service: AuthService = Depends(get_auth_service)
 ):
-    return await auth_service.login_user(form_data.username, form_data.password, Authorize, response)
+    client_ip = request.client.host if request.client else None
+    return await auth_service.login_user(form_data.username, form_data.password, Authorize, response, client_ip)
 
 
 @router.post("/logout")
@@ -51,8 +58,8 @@ def logout(response: Response, Authorize: AuthJWT = Depends()):
     return {"message": "Successfully logged out"}
 
 
-@router.get("/me", response_model=UserDB)
-async def get_me(current_user: UserDB = Depends(get_current_user)):
+@router.get("/me", response_model=CurrentUser)
+async def get_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
 
 
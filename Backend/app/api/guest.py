@@ -1,22 +1,35 @@
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, File, Header, UploadFile, Depends, HTTPException, Request
 from pymongo.database import Database
 from app.models.user_model import get_db
 from app.services.prediction_services import predict_and_save
+from app.utils.rate_limit import TokenBucketLimiter
+from app.config import settings
 
 router = APIRouter()
 
+guest_limiter = TokenBucketLimiter(
+    rate=settings.GUEST_RATE_PER_MINUTE / 60.0,
+    burst=settings.GUEST_BURST,
+    detail="Too many guest predictions. Sign in or try again shortly."
+)
+
 
 @router.post("/guest-predict")
 async def guest_predict(
+    request: Request,
     file: UploadFile = File(...),
+    x_model: Optional[str] = Header(None),
     db: Database = Depends(get_db)
 ):
+    guest_limiter.check(request.client.host if request.client else None)
     try:
-        result = await predict_and_save(file=file, db=db, user_id=None)
+        result = await predict_and_save(file=file, db=db, user_id=None, model_name=x_model)
 
         return {
             "disease": result["disease"],
-            "confidence": round(result["confidence"], 2)
+            "confidence": round(result["confidence"], 2),
+            "model": result["model"]
         }
     except HTTPException as e:
         raise e
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends
-from app.models.user_model import UserDB
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.models.user_model import CurrentUser
 from app.services.history_services import HistoryService
+from app.services.thumbnails import thumbnail_store
 from app.api.auth import get_current_user
 from pymongo.database import Database
 from app.models.user_model import get_db
@@ -14,16 +18,62 @@ def get_history_service(db: Database = Depends(get_db)):
 
 @router.get("/")
 async def get_history(
-    current_user: UserDB = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    disease: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
     history_service: HistoryService = Depends(get_history_service)
 ):
-    return await history_service.get_user_history(current_user.id)
+    history_list, next_cursor = await history_service.get_user_history(
+        current_user.id, limit=limit, before=before, fields=fields, start=start, end=end, disease=disease)
+    # The body stays a plain list; the cursor for the next page travels in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [thumbnail_store.with_public_url(doc, str(request.base_url)) for doc in history_list]
+
+
+@router.get("/stream")
+async def stream_history(
+    request: Request,
+    batch_size: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    disease: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    history_service: HistoryService = Depends(get_history_service)
+):
+    # Validate before the response starts; errors can't be reported mid-stream
+    HistoryService.build_projection(fields)
+    return StreamingResponse(
+        history_service.stream_user_history(
+            current_user.id, batch_size, fields=fields, start=start, end=end, disease=disease,
+            base_url=str(request.base_url)),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.get("/{history_id}/similar")
+async def get_similar_history(
+    request: Request,
+    history_id: int,
+    k: int = Query(5, ge=1, le=50),
+    current_user: CurrentUser = Depends(get_current_user),
+    history_service: HistoryService = Depends(get_history_service)
+):
+    similar = await history_service.get_similar_history(history_id, current_user.id, k)
+    return [thumbnail_store.with_public_url(doc, str(request.base_url)) for doc in similar]
 
 
 @router.delete("/{history_id}", status_code=200)
 async def delete_history(
     history_id: int,
-    current_user: UserDB = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     history_service: HistoryService = Depends(get_history_service)
 ):
 
@@ -0,0 +1,36 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from app.services.executor import pools
+from app.services.model_registry import model_registry
+from app.config import settings
+
+router = APIRouter()
+
+
+def _check_admin_token(token: Optional[str]):
+    if not settings.MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Model administration is disabled.")
+    if not token or not secrets.compare_digest(token, settings.MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+
+@router.get("/")
+async def list_models():
+    return {**model_registry.describe(), "loaded": pools.model_info}
+
+
+@router.get("/shadow-metrics")
+async def shadow_metrics():
+    return model_registry.metrics()["shadow"]
+
+
+@router.post("/reload")
+async def reload_models(x_admin_token: Optional[str] = Header(None)):
+    """Re-reads the registry manifest and hot-swaps the served models once the new set is warm."""
+    _check_admin_token(x_admin_token)
+    try:
+        await model_registry.reload(pools)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Model reload failed: {str(e)}")
+    return model_registry.describe()
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, File, UploadFile, Depends
+from typing import List, Optional
+from fastapi import APIRouter, File, Header, Request, UploadFile, Depends
+from fastapi.responses import StreamingResponse
 from pymongo.database import Database
-from app.models.user_model import get_db, UserDB
-from app.services.prediction_services import predict_and_save
+from app.models.user_model import get_db, CurrentUser
+from app.services.prediction_services import predict_and_save, predict_batch_and_save, stream_batch_predictions
 from app.api.auth import get_current_user
 
 router = APIRouter()
@@ -9,9 +11,42 @@ router = APIRouter()
 
 @router.post("/predict")
 async def predict(
+    request: Request,
     file: UploadFile = File(...),
+    x_model: Optional[str] = Header(None),
     db: Database = Depends(get_db),
-    current_user: UserDB = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    result = await predict_and_save(file=file, db=db, user_id=current_user.id)
+    result = await predict_and_save(
+        file=file, db=db, user_id=current_user.id, model_name=x_model, base_url=str(request.base_url))
     return result
+
+
+@router.post("/batch")
+async def predict_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    x_model: Optional[str] = Header(None),
+    db: Database = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    return await predict_batch_and_save(
+        files=files, db=db, user_id=current_user.id, model_name=x_model, base_url=str(request.base_url))
+
+
+@router.post("/batch/stream")
+async def predict_batch_stream(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    x_model: Optional[str] = Header(None),
+    db: Database = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    events = await stream_batch_predictions(
+        files=files, db=db, user_id=current_user.id, model_name=x_model, base_url=str(request.base_url))
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
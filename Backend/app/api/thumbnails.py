@@ -0,0 +1,36 @@
+import re
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from app.services.thumbnails import thumbnail_store
+from app.config import settings
+
+router = APIRouter()
+
+# Image keys are sha256 hex digests; anything else can't name a thumbnail
+IMAGE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+@router.get("/{image_key}")
+async def get_thumbnail(image_key: str, if_none_match: Optional[str] = Header(None)):
+    if not IMAGE_KEY.fullmatch(image_key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found.")
+    thumbnail = await thumbnail_store.get(image_key)
+    if thumbnail is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found.")
+
+    data, etag = thumbnail
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.THUMBNAIL_MAX_AGE_SECONDS}, immutable"
+    }
+    if _matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=data, media_type="image/webp", headers=headers)
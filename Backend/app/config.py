@@ -6,6 +6,13 @@ from pydantic import BaseModel
 class Settings(BaseSettings):
     MONGO_URI: str
     MONGO_INITDB_DATABASE: str
+    MONGO_DB_NAME: str = "derma_ai"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 30000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
     MAIL_USERNAME: str
@@ -23,6 +30,80 @@ class Settings(BaseSettings):
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
     FRONTEND_URL: str
+    INFERENCE_MAX_BATCH_SIZE: int = 16
+    INFERENCE_MAX_WAIT_MS: float = 5.0
+    MAX_BATCH_FILES: int = 32
+    MAX_REQUEST_BYTES: int = 21 * 1024 * 1024
+    MAX_BATCH_REQUEST_BYTES: int = 100 * 1024 * 1024
+    ADMISSION_MAX_IN_FLIGHT: int = 32
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_MAX_WAIT_MS: float = 2000.0
+    GUEST_RATE_PER_MINUTE: float = 30.0
+    GUEST_BURST: int = 10
+    ID_BLOCK_SIZE: int = 100
+    IO_POOL_WORKERS: int = 8
+    CPU_POOL_WORKERS: int = 1
+    MODEL_SERVER_SOCKET: str = ""
+    MODEL_SERVER_PROCESSES: int = 1
+    MODEL_SERVER_AUTHKEY: str = ""
+    MODEL_SERVER_THREADS: int = 2
+    MODEL_SERVER_RING_SLOTS: int = 4
+    MODEL_SERVER_OUTPUT_ROW_BYTES: int = 16384
+    MODEL_SERVER_CONNECT_TIMEOUT_SECONDS: float = 120.0
+    MODEL_SERVER_REQUEST_TIMEOUT_SECONDS: float = 60.0
+    MODEL_WEIGHTS_PATH: str = "models/my_model_weights.h5"
+    MODEL_BACKEND: str = "keras"
+    MODEL_NAME: str = "dermaai"
+    MODEL_VERSION: str = "v1"
+    MODEL_REGISTRY_PATH: str = ""
+    MODEL_ADMIN_TOKEN: str = ""
+    SHADOW_MAX_PENDING: int = 8
+    TTA_ENABLED: bool = False
+    TTA_VIEWS: int = 8
+    TTA_CONFIDENCE_THRESHOLD: float = 60.0
+    EMBEDDINGS_ENABLED: bool = False
+    EMBEDDING_INDEX_DIR: str = "embeddings"
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_SIZE: int = 256
+    THUMBNAIL_QUALITY: int = 80
+    # Public origin for thumbnail links, e.g. https://api.example.com; empty uses the request's
+    THUMBNAIL_BASE_URL: str = ""
+    THUMBNAIL_CACHE_SIZE: int = 2048
+    THUMBNAIL_MAX_AGE_SECONDS: int = 31536000
+    MODEL_ARTIFACT_PATH: str = ""
+    MODEL_NUM_THREADS: int = 0
+    MODEL_PRECISION: str = "float32"
+    PREDICTION_CACHE_SIZE: int = 1024
+    PREDICTION_CACHE_TTL_SECONDS: int = 86400
+    PREDICTION_CACHE_MONGO: bool = False
+    PREDICTION_CACHE_PHASH: bool = False
+    PREDICTION_CACHE_PHASH_DISTANCE: int = 4
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    LOGIN_MAX_CONCURRENT_PER_ACCOUNT: int = 2
+    LOGIN_MAX_CONCURRENT_PER_IP: int = 8
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+    EMAIL_OUTBOX_BACKOFF_SECONDS: float = 5.0
+    EMAIL_OUTBOX_POLL_SECONDS: float = 10.0
+    EMAIL_SMTP_TIMEOUT_SECONDS: float = 30.0
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_REDIS_URL: str = ""
+    STORAGE_BACKEND: str = "cloudinary"
+    LOCAL_STORAGE_DIR: str = "media"
+    LOCAL_STORAGE_BASE_URL: str = "http://localhost:8000/media"
+    DEFERRED_UPLOADS: bool = True
+    UPLOAD_QUEUE_SIZE: int = 256
+    UPLOAD_BATCH_SIZE: int = 8
+    UPLOAD_MAX_RETRIES: int = 5
+    UPLOAD_RETRY_BACKOFF_SECONDS: float = 0.5
+    UPLOAD_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    METRICS_ENABLED: bool = True
+    OTEL_ENABLED: bool = False
+    OTEL_SERVICE_NAME: str = "dermaai-api"
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = ""
 
     class Config:
         env_file = ".env"
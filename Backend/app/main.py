@@ -1,14 +1,132 @@
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import auth, predict, guest, history
+from app.api import auth, predict, guest, history, models, thumbnails
 from fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi.responses import JSONResponse
 from pymongo.errors import ServerSelectionTimeoutError
+from app.services.executor import pools
+from app.services.prediction_services import scheduler
+from app.services.prediction_cache import prediction_cache
+from app.services.upload_queue import upload_queue, storage
+from app.services.history_services import HistoryService
+from app.services.auth_services import AuthService
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher
+from app.services.email_outbox import email_outbox
+from app.services.id_allocator import history_id_allocator, user_id_allocator
+from app.services.admission import inference_admission
+from app.services.model_registry import model_registry
+from app.services.tta import tta
+from app.services.embedding_index import embedding_index
+from app.services.thumbnails import thumbnail_store
+from app.api.guest import guest_limiter
+from app.utils.body_limit import BodySizeLimitMiddleware, RequestTooLarge, too_large_response
+from app.utils.telemetry import registry, stats, configure_tracing, REQUEST_LATENCY, REQUESTS_IN_PROGRESS
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.models import user_model
+from app.config import settings
+from fastapi.staticfiles import StaticFiles
+
+
+class AppResources:
+    """
+    Owns the process-wide resources: the Mongo client, the worker pools holding the
+    model backends, storage clients and the background workers. `start` brings them up
+    in dependency order and warms the models up in the background, so the server answers
+    /healthz straight away but /readyz only once the models have run a first batch.
+    `stop` tears everything down in reverse.
+    """
+
+    def __init__(self):
+        self.mongo_client = user_model.client
+        self.db = user_model.db
+        self.pools = pools
+        self.storage = storage
+        self.ready = False
+        self.started_at = time.time()
+        self._warmup_task = None
+        self._index_sync_task = None
+
+    async def start(self):
+        if settings.OTEL_ENABLED:
+            configure_tracing(settings.OTEL_SERVICE_NAME, settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+        self.storage.open()
+        self.pools.start()
+        scheduler.start()
+        await prediction_cache.ensure_indexes()
+        await HistoryService.ensure_indexes(self.db)
+        await AuthService.ensure_indexes(self.db)
+        await email_outbox.ensure_indexes()
+        email_outbox.start()
+        upload_queue.start()
+        self._warmup_task = asyncio.create_task(self._warm_up())
+        if embedding_index.enabled:
+            self._index_sync_task = asyncio.create_task(self._sync_embedding_index())
+
+    async def _warm_up(self):
+        try:
+            await self.pools.warmup()
+            self.ready = True
+        except Exception as e:
+            print(f"Model warm-up failed: {str(e)}")
+
+    async def _sync_embedding_index(self):
+        try:
+            await embedding_index.sync(self.db)
+        except Exception as e:
+            print(f"Embedding index sync failed: {str(e)}")
+
+    async def wait_ready(self):
+        if self._warmup_task is not None:
+            await self._warmup_task
+
+    async def stop(self):
+        # Fail readiness first so the load balancer stops sending traffic while we drain
+        self.ready = False
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        if self._index_sync_task is not None and not self._index_sync_task.done():
+            self._index_sync_task.cancel()
+        await scheduler.stop()
+        await upload_queue.stop()
+        await email_outbox.stop()
+        embedding_index.flush()
+        await user_cache.close()
+        password_hasher.shutdown()
+        self.pools.shutdown()
+        self.storage.close()
+        self.mongo_client.close()
+
+    async def ping_db(self, timeout: float = 2.0) -> bool:
+        try:
+            await asyncio.wait_for(self.db.command("ping"), timeout)
+            return True
+        except Exception:
+            return False
+
+
+resources = AppResources()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.resources = resources
+    await resources.start()
+    try:
+        yield
+    finally:
+        await resources.stop()
+
 
 app = FastAPI(
     title="DermaAI API",
     description="FastAPI backend with image classification, JWT auth, Cloudinary, and MongoDB",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 origins = [
@@ -21,8 +139,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*", "Authorization", "X-CSRF-TOKEN"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    default_limit=settings.MAX_REQUEST_BYTES,
+    path_limits={
+        "/api/predict/batch": settings.MAX_BATCH_REQUEST_BYTES,
+        "/api/predict/batch/stream": settings.MAX_BATCH_REQUEST_BYTES
+    }
+)
+
+
+UNMETERED_PATHS = {"/metrics", "/healthz", "/readyz"}
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not settings.METRICS_ENABLED or request.url.path in UNMETERED_PATHS:
+        return await call_next(request)
+
+    REQUESTS_IN_PROGRESS.inc()
+    started_at = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_PROGRESS.dec()
+        # Label by route template, not the raw path, so ids in URLs don't explode cardinality
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, route.path if route else "unmatched", str(status_code)
+        ).observe(time.perf_counter() - started_at)
+
 
 @app.exception_handler(AuthJWTException)
 def authjwt_exception_handler(request, exc):
@@ -32,6 +184,11 @@ def authjwt_exception_handler(request, exc):
     )
 
 
+@app.exception_handler(RequestTooLarge)
+async def request_too_large_handler(request, exc):
+    return too_large_response(exc.limit)
+
+
 @app.exception_handler(ServerSelectionTimeoutError)
 async def db_exception_handler(request, exc):
     return JSONResponse(
@@ -44,7 +201,51 @@ async def db_exception_handler(request, exc):
 async def read_root():
     return {"message": "Welcome to the DermaAI API! Visit /docs for API documentation."}
 
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    # Liveness only: the process is up and serving the event loop
+    return {"status": "ok", "uptime_seconds": time.time() - resources.started_at}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    checks = {"warmed_up": resources.ready, "database": await resources.ping_db()}
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "checks": checks, "models": resources.pools.model_info}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+stats.register("pool", pools.metrics)
+stats.register("scheduler", scheduler.metrics)
+stats.register("prediction_cache", prediction_cache.metrics)
+stats.register("upload_queue", upload_queue.metrics)
+stats.register("user_cache", user_cache.metrics)
+stats.register("password_hasher", password_hasher.metrics)
+stats.register("email_outbox", email_outbox.metrics)
+stats.register("history_ids", history_id_allocator.metrics)
+stats.register("user_ids", user_id_allocator.metrics)
+stats.register("admission", inference_admission.metrics)
+stats.register("model_registry", model_registry.metrics)
+stats.register("tta", tta.metrics)
+stats.register("embedding_index", embedding_index.metrics)
+stats.register("thumbnails", thumbnail_store.metrics)
+stats.register("guest_rate_limit", guest_limiter.metrics)
+
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(predict.router, prefix="/api/predict", tags=["Prediction"])
 app.include_router(guest.router, prefix="/api/guest", tags=["Guest"])
 app.include_router(history.router, prefix="/api/history", tags=["History"])
+app.include_router(models.router, prefix="/api/models", tags=["Models"])
+app.include_router(thumbnails.router, prefix="/api/thumbnails", tags=["Thumbnails"])
+
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(settings.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount("/media", StaticFiles(directory=settings.LOCAL_STORAGE_DIR), name="media")
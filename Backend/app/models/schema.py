@@ -28,7 +28,9 @@ class PredictionHistory(BaseModel):
     user_id: int
     disease: str
     confidence: float
-    image_url: str
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    model: Optional[str] = None
     timestamp: Optional[datetime] = None
 
     class Config:
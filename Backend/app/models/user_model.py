@@ -1,12 +1,26 @@
-import os
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.database import Database
+from app.config import settings
 
-client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
-db = client.get_database("derma_ai")
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    # Motor connects lazily, so this does no I/O; the app lifespan closes the client on shutdown
+    return AsyncIOMotorClient(
+        settings.MONGO_URI,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS or None,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS or None
+    )
+
+
+client = create_mongo_client()
+db = client.get_database(settings.MONGO_DB_NAME)
 
 
 def get_db() -> Database:
@@ -25,3 +39,21 @@ class UserDB(BaseModel):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
+
+
+class CurrentUser(BaseModel):
+    """The authenticated user as routes and the user cache see it, without the password hash."""
+    id: int = Field(alias="_id")
+    full_name: str
+    email: EmailStr
+    is_verified: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_user(cls, user: UserDB) -> "CurrentUser":
+        return cls(**user.dict(by_alias=True, exclude={"password"}))
@@ -0,0 +1,132 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+class AdmissionController:
+    """
+    Caps how many images are in inference at once and how long callers may queue for a slot.
+
+    Requests over `max_in_flight` wait in a FIFO queue of at most `max_queue` entries.
+    A request is shed with 503 + Retry-After, without queueing, when the queue is full
+    or when the expected wait (from a moving average of service time) is already beyond
+    `max_wait_ms`. It is also shed if it is still queued when that deadline passes.
+    Shedding early keeps the latency of admitted requests bounded under overload and
+    stops request bodies from piling up in memory.
+    """
+
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64, max_wait_ms: float = 2000.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000.0
+        self._in_flight = 0
+        self._waiters = deque()
+        self._queued_cost = 0
+        # Moving average of how long one admitted unit holds its slot
+        self._service_seconds = 0.0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+
+    def _expected_wait(self, cost: int) -> float:
+        return (self._queued_cost + cost) / self.max_in_flight * self._service_seconds
+
+    def _shed(self, reason: str, wait_seconds: float):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"The server is busy ({reason}). Please retry shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(wait_seconds)))}
+        )
+
+    def _release(self, cost: int, held_seconds: float):
+        self._in_flight -= cost
+        if held_seconds:
+            per_unit = held_seconds / cost
+            self._service_seconds = (0.9 * self._service_seconds + 0.1 * per_unit) if self._service_seconds else per_unit
+        while self._waiters:
+            waiter_cost, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled, and not yet dropped by its own caller
+                self._waiters.popleft()
+                self._queued_cost -= waiter_cost
+                continue
+            if self._in_flight + waiter_cost > self.max_in_flight:
+                break
+            self._waiters.popleft()
+            self._queued_cost -= waiter_cost
+            self._in_flight += waiter_cost
+            future.set_result(None)
+
+    def _drop_waiter(self, cost: int, future: asyncio.Future):
+        # _release may already have dropped it while wait_for was cancelling the future
+        if (cost, future) in self._waiters:
+            self._waiters.remove((cost, future))
+            self._queued_cost -= cost
+
+    async def _wait_for_slot(self, cost: int):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, future))
+        self._queued_cost += cost
+        self.queued += 1
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._drop_waiter(cost, future)
+            self.shed_deadline += 1
+            self._shed("queue deadline exceeded", self._expected_wait(0))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self._release(cost, 0.0)
+            else:
+                self._drop_waiter(cost, future)
+            raise
+
+    @asynccontextmanager
+    async def admit(self, cost: int = 1):
+        """Holds `cost` inference slots (one per image) for the duration of the block."""
+        cost = max(1, min(cost, self.max_in_flight))
+        if self._waiters or self._in_flight + cost > self.max_in_flight:
+            if len(self._waiters) >= self.max_queue:
+                self.shed_queue_full += 1
+                self._shed("queue full", self._expected_wait(cost))
+            if self._expected_wait(cost) > self.max_wait:
+                self.shed_deadline += 1
+                self._shed("expected wait too long", self._expected_wait(cost))
+            await self._wait_for_slot(cost)
+        else:
+            self._in_flight += cost
+
+        self.admitted += 1
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(cost, time.perf_counter() - started_at)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "avg_service_ms": self._service_seconds * 1000.0,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline
+        }
+
+
+inference_admission = AdmissionController(
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait_ms=settings.ADMISSION_MAX_WAIT_MS
+)
@@ -1,23 +1,25 @@
 from fastapi import HTTPException, status
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from pymongo.database import Database
 from app.models.user_model import UserDB
 from app.models.schema import UserCreate
 from app.config import settings
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from fastapi_jwt_auth import AuthJWT
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher
+from app.services.email_outbox import email_outbox
+from app.services.id_allocator import user_id_allocator
+from app.utils.email_templates import render_verification_email
+from app.utils.rate_limit import KeyedConcurrencyLimiter
+
+login_account_limiter = KeyedConcurrencyLimiter(
+    settings.LOGIN_MAX_CONCURRENT_PER_ACCOUNT,
+    detail="A sign-in for this account is already in progress. Please wait a moment.")
+login_ip_limiter = KeyedConcurrencyLimiter(
+    settings.LOGIN_MAX_CONCURRENT_PER_IP,
+    detail="Too many sign-in attempts from your network. Please wait a moment.")
 
 
 def set_access_token_cookie(response, Authorize: AuthJWT, subject: str):
@@ -35,21 +37,22 @@ class AuthService:
     def __init__(self, db: Database):
         self.db = db
 
+    @staticmethod
+    async def ensure_indexes(db: Database):
+        try:
+            await db.users.create_index("email", unique=True)
+        except OperationFailure as e:
+            print(f"Could not create unique index on users.email: {str(e)}")
+
     async def register_user(self, payload: UserCreate):
         user_in_db = await self.db.users.find_one({"email": payload.email})
         if user_in_db:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
 
-        sequence_doc = await self.db.counters.find_one_and_update(
-            {'_id': 'user_id'},
-            {'$inc': {'sequence_value': 1}},
-            upsert=True,
-            return_document=True
-        )
-        user_id = sequence_doc['sequence_value']
+        user_id = await user_id_allocator.allocate_one()
 
-        hashed_password = hash_password(payload.password)
+        hashed_password = await password_hasher.hash(payload.password)
 
         user = UserDB(
             _id=user_id,
@@ -60,23 +63,35 @@ class AuthService:
             updated_at=datetime.utcnow()
         )
 
-        await self.db.users.insert_one(user.dict(by_alias=True))
+        try:
+            await self.db.users.insert_one(user.dict(by_alias=True))
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
 
         await self.send_verification_email(user)
 
         return {"message": "Registration successful. Please check your email to verify your account."}
 
-    async def login_user(self, email, password, Authorize, response):
-        user_data = await self.db.users.find_one({"email": email})
-        if not user_data:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                                detail="User with this email does not exist. Please create an account first.")
+    async def login_user(self, email, password, Authorize, response, client_ip: str = None):
+        async with login_ip_limiter.acquire(client_ip), login_account_limiter.acquire(email):
+            user_data = await self.db.users.find_one({"email": email})
+            if not user_data:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail="User with this email does not exist. Please create an account first.")
 
-        user = UserDB(**user_data)
+            user = UserDB(**user_data)
 
-        if not verify_password(password, user.password):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password provided.")
+            is_valid, new_hash = await password_hasher.verify_and_update(password, user.password)
+            if not is_valid:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password provided.")
+
+            if new_hash:
+                # The configured cost factor changed since this hash was created
+                await self.db.users.update_one(
+                    {"_id": user.id}, {"$set": {"password": new_hash, "updated_at": datetime.utcnow()}})
+                await user_cache.invalidate(user.email)
 
         if not user.is_verified:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
@@ -106,6 +121,7 @@ class AuthService:
         if result.matched_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        await user_cache.invalidate(email)
 
         return {"message": "Email verified successfully"}
 
@@ -119,109 +135,16 @@ class AuthService:
 
         verification_link = f"{settings.FRONTEND_URL}/verify-email?email={user.email}&token={token}"
 
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Verify Your Email - DermaAI</title>
-            <style>
-                body {{
-                    margin: 0;
-                    padding: 0;
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif, 'Apple Color Emoji', 'Segoe UI Emoji', 'Segoe UI Symbol';
-                    background-color: #0c111f;
-                    color: #e2e8f0;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: 40px auto;
-                    background-color: #111827;
-                    border: 1px solid #374151;
-                    border-radius: 16px;
-                    overflow: hidden;
-                }}
-                .header {{
-                    padding: 24px;
-                    text-align: center;
-                    background: linear-gradient(90deg, #1e3a8a, #14b8a6);
-                }}
-                .header h1 {{
-                    margin: 0;
-                    color: #ffffff;
-                    font-size: 28px;
-                }}
-                .content {{
-                    padding: 32px;
-                    text-align: center;
-                }}
-                .content p {{
-                    font-size: 16px;
-                    line-height: 1.5;
-                    color: #9ca3af;
-                }}
-                .button {{
-                    display: inline-block;
-                    margin-top: 24px;
-                    padding: 14px 28px;
-                    background: linear-gradient(90deg, #3b82f6, #14b8a6);
-                    color: #ffffff;
-                    text-decoration: none;
-                    font-weight: bold;
-                    border-radius: 8px;
-                    font-size: 16px;
-                }}
-                .footer {{
-                    padding: 24px;
-                    text-align: center;
-                    font-size: 12px;
-                    color: #6b7280;
-                    border-top: 1px solid #374151;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>DermaAI</h1>
-                </div>
-                <div class="content">
-                    <h2 style="color: #ffffff; font-size: 24px;">Confirm Your Email Address</h2>
-                    <p>Thank you for signing up for DermaAI. To complete your registration, please click the button below to verify your email address.</p>
-                    <a href="{verification_link}" class="button">Verify Email</a>
-                    <p style="margin-top: 24px;">If you did not create an account, no further action is required.</p>
-                </div>
-                <div class="footer">
-                    &copy; {datetime.utcnow().year} DermaAI. All Rights Reserved.
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        message = MessageSchema(
-            subject="Verify your email for DermaAI",
-            recipients=[user.email],
-            body=html_content,
-            subtype="html"
-        )
+        html_content = render_verification_email(verification_link, datetime.utcnow().year)
 
-        conf = ConnectionConfig(
-            MAIL_USERNAME=settings.MAIL_USERNAME,
-            MAIL_PASSWORD=settings.MAIL_PASSWORD,
-            MAIL_FROM=settings.MAIL_FROM,
-            MAIL_PORT=settings.MAIL_PORT,
-            MAIL_SERVER=settings.MAIL_SERVER,
-            MAIL_STARTTLS=settings.MAIL_STARTTLS,
-            MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-            USE_CREDENTIALS=settings.USE_CREDENTIALS,
-            VALIDATE_CERTS=settings.VALIDATE_CERTS
+        # Queued for the background sender; repeat requests replace the pending email's link
+        await email_outbox.enqueue(
+            recipient=user.email,
+            subject="Verify your email for DermaAI",
+            html=html_content,
+            dedupe_key=f"verify-email:{user.email}"
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message)
-
     async def request_new_verification_token(self, email: str):
         user_data = await self.db.users.find_one({"email": email})
 
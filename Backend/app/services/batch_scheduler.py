@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.telemetry import stage, MODEL_BATCH_SIZE
+
+
+class BatchScheduler:
+    """
+    Collects concurrent single-image inference requests into batched forward passes.
+
+    Requests wait up to `max_wait_ms` for the batch to fill to `max_batch_size`,
+    the batch is handed to the async `predict_fn` (which runs it off the event loop),
+    and each caller receives its own softmax row. If `predict_fn` returns a tuple of
+    outputs (such as probabilities and embeddings) each caller gets a tuple of its rows,
+    with None for outputs that are None. Up to `max_concurrent_batches` batches may be
+    in flight at once.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+        history_size: int = 1000
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_sizes = deque(maxlen=history_size)
+        self._total_batches = 0
+        self._total_items = 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def predict(self, image: np.ndarray) -> np.ndarray:
+        """Submits one preprocessed image of shape (1, H, W, C) or (H, W, C) and returns its softmax row."""
+        self.start()
+        if image.ndim == 4:
+            image = image[0]
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                items = await self._collect()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            items = [(image, future) for image, future in items if not future.cancelled()]
+            if not items:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._dispatch(items))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, items: List[Tuple[np.ndarray, asyncio.Future]]):
+        try:
+            batch = np.stack([image for image, _ in items])
+            self._batch_sizes.append(len(items))
+            self._total_batches += 1
+            self._total_items += len(items)
+            MODEL_BATCH_SIZE.labels("scheduler").observe(len(items))
+
+            try:
+                with stage("model_batch"):
+                    predictions = await self.predict_fn(batch)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            if isinstance(predictions, tuple):
+                predictions = list(zip(*[
+                    output if output is not None else [None] * len(items) for output in predictions
+                ]))
+            for (_, future), row in zip(items, predictions):
+                if not future.done():
+                    future.set_result(row)
+        finally:
+            self._slots.release()
+
+    def metrics(self) -> dict:
+        sizes = list(self._batch_sizes)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._in_flight),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "total_batches": self._total_batches,
+            "total_items": self._total_items,
+            "last_batch_size": sizes[-1] if sizes else 0,
+            "avg_batch_size": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "max_observed_batch_size": max(sizes) if sizes else 0
+        }
+
+
+class KeyedBatchScheduler:
+    """
+    One BatchScheduler per model key, created on first use, so requests for different
+    models never share a forward pass. `predict_fn(batch, key, config)` runs one batch
+    with the config most recently requested for the key, so a registry reload that
+    changes a key's config takes effect without recreating its scheduler.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray, str, tuple], Awaitable[np.ndarray]], **options):
+        self.predict_fn = predict_fn
+        self.options = options
+        self._schedulers: Dict[str, BatchScheduler] = {}
+        self._configs: Dict[str, tuple] = {}
+
+    def _scheduler(self, key: str, config: tuple) -> BatchScheduler:
+        self._configs[key] = config
+        scheduler = self._schedulers.get(key)
+        if scheduler is None:
+            scheduler = BatchScheduler(
+                predict_fn=lambda batch: self.predict_fn(batch, key, self._configs[key]), **self.options)
+            self._schedulers[key] = scheduler
+        return scheduler
+
+    def start(self):
+        for scheduler in self._schedulers.values():
+            scheduler.start()
+
+    async def stop(self):
+        await asyncio.gather(*[scheduler.stop() for scheduler in self._schedulers.values()])
+
+    async def predict(self, image: np.ndarray, key: str, config: tuple) -> np.ndarray:
+        return await self._scheduler(key, config).predict(image)
+
+    def metrics(self) -> dict:
+        return {key: scheduler.metrics() for key, scheduler in self._schedulers.items()}
@@ -0,0 +1,250 @@
+import asyncio
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import List, Optional
+
+import aiosmtplib
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.models.user_model import db
+
+
+class SMTPConnectionPool:
+    """Keeps one authenticated SMTP connection open and reuses it across sends."""
+
+    def __init__(self):
+        self._client: Optional[aiosmtplib.SMTP] = None
+        self.connects = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS,
+            validate_certs=settings.VALIDATE_CERTS,
+            timeout=settings.EMAIL_SMTP_TIMEOUT_SECONDS
+        )
+        await client.connect()
+        if settings.USE_CREDENTIALS:
+            await client.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        self.connects += 1
+        return client
+
+    async def get(self) -> aiosmtplib.SMTP:
+        if self._client is not None and self._client.is_connected:
+            try:
+                # Servers drop idle connections; a NOOP tells us before we try to send
+                await self._client.noop()
+                return self._client
+            except aiosmtplib.SMTPException:
+                await self.discard()
+        self._client = await self._connect()
+        return self._client
+
+    async def discard(self):
+        if self._client is not None:
+            try:
+                await self._client.quit()
+            except Exception:
+                self._client.close()
+            self._client = None
+
+
+class EmailOutbox:
+    """
+    Persistent outbox for transactional email, drained by a background worker.
+
+    Messages are written to a Mongo collection and sent in batches over a pooled SMTP
+    connection, with exponential backoff on failure. Documents are claimed with a lease,
+    so several workers can drain one outbox and messages claimed by a crashed worker are
+    retried once the lease runs out. Every lease counts as an attempt, so a message that
+    keeps crashing its worker is eventually given up on too. Messages sharing a
+    `dedupe_key` collapse into one pending email carrying the newest content; a unique
+    partial index keeps concurrent enqueues from creating two.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        batch_size: int = 20,
+        max_attempts: int = 5,
+        backoff_seconds: float = 5.0,
+        poll_seconds: float = 10.0,
+        lease_seconds: float = 60.0
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.smtp = SMTPConnectionPool()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.deduplicated = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+        await self.collection.create_index(
+            [("dedupe_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "pending", "dedupe_key": {"$type": "string"}}
+        )
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.smtp.discard()
+
+    async def enqueue(self, recipient: str, subject: str, html: str, dedupe_key: Optional[str] = None):
+        now = datetime.utcnow()
+        content = {"recipient": recipient, "subject": subject, "html": html, "updated_at": now}
+
+        new_fields = {"attempts": 0, "next_attempt_at": now, "created_at": now}
+
+        if dedupe_key:
+            pending = {"dedupe_key": dedupe_key, "status": "pending"}
+            update = {"$set": content, "$setOnInsert": new_fields}
+            try:
+                result = await self.collection.update_one(pending, update, upsert=True)
+            except DuplicateKeyError:
+                # A concurrent enqueue inserted the pending message first; update that one
+                result = await self.collection.update_one(pending, update, upsert=True)
+            if result.upserted_id is None:
+                self.deduplicated += 1
+                return
+        else:
+            await self.collection.insert_one({**content, **new_fields, "dedupe_key": None, "status": "pending"})
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "sending", "lease_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _claim_batch(self) -> List[dict]:
+        batch = []
+        while len(batch) < self.batch_size:
+            doc = await self._claim()
+            if doc is None:
+                break
+            if doc["attempts"] > self.max_attempts:
+                # Its earlier leases all expired without a result
+                await self._give_up(doc, "lease expired on every attempt", doc["attempts"] - 1)
+                continue
+            batch.append(doc)
+        return batch
+
+    @staticmethod
+    def _build_message(doc: dict) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM))
+        message["To"] = doc["recipient"]
+        message["Subject"] = doc["subject"]
+        message.set_content(doc["html"], subtype="html")
+        return message
+
+    async def _send_batch(self, batch: List[dict]):
+        for doc in batch:
+            try:
+                client = await self.smtp.get()
+                await client.send_message(self._build_message(doc))
+            except (aiosmtplib.SMTPException, OSError) as e:
+                await self.smtp.discard()
+                await self._failed(doc, e)
+                continue
+            await self.collection.delete_one({"_id": doc["_id"]})
+            self.sent += 1
+
+    async def _give_up(self, doc: dict, error: str, attempts: int):
+        self.failed += 1
+        print(f"Giving up on email to {doc['recipient']}: {error}")
+        await self.collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"status": "failed", "attempts": attempts, "last_error": error}, "$unset": {"lease_until": ""}}
+        )
+
+    async def _failed(self, doc: dict, error: Exception):
+        # The claim already counted this attempt
+        attempts = doc["attempts"]
+        if attempts >= self.max_attempts:
+            await self._give_up(doc, str(error), attempts)
+            return
+
+        self.retried += 1
+        delay = self.backoff_seconds * 2 ** (attempts - 1)
+        update = {
+            "status": "pending",
+            "last_error": str(error),
+            "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+        }
+        try:
+            await self.collection.update_one({"_id": doc["_id"]}, {"$set": update, "$unset": {"lease_until": ""}})
+        except DuplicateKeyError:
+            # A newer message with the same dedupe_key was enqueued while this one was out
+            await self.collection.delete_one({"_id": doc["_id"]})
+
+    async def _run(self):
+        while True:
+            try:
+                batch = await self._claim_batch()
+                if batch:
+                    await self._send_batch(batch)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error draining email outbox: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "deduplicated": self.deduplicated,
+            "smtp_connects": self.smtp.connects
+        }
+
+
+email_outbox = EmailOutbox(
+    db.email_outbox,
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    backoff_seconds=settings.EMAIL_OUTBOX_BACKOFF_SECONDS,
+    poll_seconds=settings.EMAIL_OUTBOX_POLL_SECONDS
+)
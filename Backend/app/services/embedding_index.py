@@ -0,0 +1,322 @@
+import fcntl
+import json
+import os
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ASCENDING
+from pymongo.database import Database
+
+from app.config import settings
+
+# Rows scored per matmul; bounds the float32 copy made of the float16 vectors
+SEARCH_CHUNK_ROWS = 65536
+
+
+def encode_embedding(embedding: np.ndarray) -> bytes:
+    """The compact form stored on history documents: raw float16, 2.5 KB for 1280 dims."""
+    return np.asarray(embedding, dtype=np.float16).tobytes()
+
+
+def decode_embedding(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float16)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingSegment:
+    """
+    The embeddings of one model in memory-mapped files: `<prefix>.vectors` holds the
+    L2-normalized float16 rows, `<prefix>.ids` the (history_id, user_id) of each row and
+    `<prefix>.json` the row count and dimension, which is taken from the first rows added.
+    Rows are only ever appended; deleting a prediction tombstones its row with id -1.
+    Capacity doubles when the files fill up.
+
+    Every API worker maps the same files. Writers take an exclusive lock on
+    `<prefix>.lock`, reload the row count from disk, write their rows and publish the new
+    count; readers reload the count before searching, so each worker sees every row.
+    """
+
+    def __init__(self, prefix: str, initial_capacity: int = 4096):
+        self.prefix = prefix
+        self.dim: Optional[int] = None
+        self.initial_capacity = initial_capacity
+        self.count = 0
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self.ids: Optional[np.memmap] = None
+
+    def open(self):
+        self.refresh()
+
+    def refresh(self):
+        """Picks up rows other processes appended since this one last looked."""
+        meta_path = f"{self.prefix}.json"
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        if meta["count"] > self.capacity or self.vectors is None:
+            # Another process grew the files; map them at their current size
+            file_rows = os.path.getsize(self.prefix + ".ids") // 16
+            self._map(max(self.initial_capacity, meta["count"], file_rows))
+        self.count = meta["count"]
+
+    @contextmanager
+    def _locked(self):
+        with open(f"{self.prefix}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self, capacity: int):
+        for suffix, row_bytes in ((".vectors", self.dim * 2), (".ids", 16)):
+            path = self.prefix + suffix
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(self.prefix + ".vectors", dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self.ids = np.memmap(self.prefix + ".ids", dtype=np.int64, mode="r+", shape=(capacity, 2))
+        self.capacity = capacity
+
+    def _write_meta(self):
+        meta_path = f"{self.prefix}.json"
+        # Per-process temp name: the rename is atomic, so readers never see a partial file
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count}, f)
+        os.replace(tmp_path, meta_path)
+
+    def history_ids(self) -> np.ndarray:
+        self.refresh()
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.array(self.ids[:self.count, 0])
+
+    def append(
+        self,
+        history_ids: Iterable[int],
+        user_ids: Iterable[int],
+        vectors: np.ndarray,
+        skip_indexed: bool = False
+    ) -> int:
+        """Appends the rows and returns how many were written; `skip_indexed` drops ids already present."""
+        history_ids = np.asarray(list(history_ids), dtype=np.int64)
+        user_ids = np.asarray(list(user_ids), dtype=np.int64)
+        if self.dim is None:
+            self.refresh()
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings for {self.prefix}, got {vectors.shape[1]}-d")
+
+        with self._locked():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._map(self.initial_capacity)
+            if skip_indexed and self.count:
+                new = ~np.isin(history_ids, self.ids[:self.count, 0])
+                history_ids, user_ids, vectors = history_ids[new], user_ids[new], vectors[new]
+            n = len(history_ids)
+            if n == 0:
+                return 0
+            if self.count + n > self.capacity:
+                self.flush()
+                self._map(max(self.capacity * 2, self.count + n))
+            self.vectors[self.count:self.count + n] = _normalize(vectors).astype(np.float16)
+            self.ids[self.count:self.count + n, 0] = history_ids
+            self.ids[self.count:self.count + n, 1] = user_ids
+            self.count += n
+            self._write_meta()
+        return n
+
+    def remove(self, history_id: int) -> bool:
+        if not os.path.exists(f"{self.prefix}.json"):
+            return False
+        with self._locked():
+            rows = np.flatnonzero(self.ids[:self.count, 0] == history_id)
+            self.ids[rows] = -1
+        return rows.size > 0
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        user_id: Optional[int] = None,
+        exclude: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """Exact cosine top-k over the live rows (of `user_id` only, if given), best first."""
+        self.refresh()
+        if self.count == 0:
+            return []
+        query = _normalize(query)
+        candidates = None
+        total = self.count
+        if user_id is not None:
+            candidates = np.flatnonzero(self.ids[:self.count, 1] == user_id)
+            total = candidates.size
+
+        best_scores = []
+        best_ids = []
+        for start in range(0, total, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, total)
+            rows = slice(start, end) if candidates is None else candidates[start:end]
+            ids = self.ids[rows, 0]
+            scores = self.vectors[rows].astype(np.float32) @ query
+            scores[ids < 0] = -np.inf
+            if exclude is not None:
+                scores[ids == exclude] = -np.inf
+            take = min(k, len(scores))
+            top = np.argpartition(-scores, take - 1)[:take]
+            best_scores.append(scores[top])
+            best_ids.append(ids[top])
+
+        if not best_scores:
+            return []
+        scores = np.concatenate(best_scores)
+        ids = np.concatenate(best_ids)
+        order = np.argsort(-scores)[:k]
+        return [(int(ids[i]), float(scores[i])) for i in order if np.isfinite(scores[i])]
+
+    def flush(self):
+        # The row count is published with every append; this only writes the pages to disk
+        if self.vectors is None:
+            return
+        self.vectors.flush()
+        self.ids.flush()
+
+
+class EmbeddingIndex:
+    """
+    Similar-case search over the embeddings stored with prediction history.
+
+    Each model gets its own segment, since embeddings from different models don't share
+    a space. New predictions are appended as they are saved and the files are flushed
+    every `flush_every` rows; on startup `sync` adds any stored embedding the index is
+    missing. Search is exact: the user's rows are found by scanning the ids column, then
+    scored with one float16 -> float32 matmul per chunk, which stays in the millisecond
+    range for hundreds of thousands of rows. All API workers share the files (see
+    EmbeddingSegment), so any worker can answer for predictions saved by another.
+    """
+
+    def __init__(self, directory: str, enabled: bool = False, flush_every: int = 256):
+        self.directory = directory
+        self.enabled = enabled
+        self.flush_every = flush_every
+        self.segments: Dict[str, EmbeddingSegment] = {}
+        self._unflushed = 0
+        self.added = 0
+        self.removed = 0
+        self.searches = 0
+        self._search_latencies = deque(maxlen=1000)
+
+    def _segment(self, model_key: str) -> EmbeddingSegment:
+        segment = self.segments.get(model_key)
+        if segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Model keys look like "dermaai:v2"; keep file names portable
+            name = re.sub(r"[^a-zA-Z0-9_.-]", "_", model_key)
+            segment = EmbeddingSegment(os.path.join(self.directory, name))
+            segment.open()
+            self.segments[model_key] = segment
+        return segment
+
+    def add(self, model_key: str, history_ids: List[int], user_ids: List[int], embeddings: List[bytes]):
+        if not self.enabled or not history_ids:
+            return
+        try:
+            vectors = np.stack([decode_embedding(embedding) for embedding in embeddings])
+            self._segment(model_key).append(history_ids, user_ids, vectors)
+        except Exception as e:
+            # The history rows are saved either way; `sync` picks them up on the next start
+            print(f"Error indexing embeddings: {str(e)}")
+            return
+        self.added += len(history_ids)
+        self._unflushed += len(history_ids)
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def remove(self, history_id: int):
+        for segment in self.segments.values():
+            if segment.remove(history_id):
+                self.removed += 1
+
+    def search(
+        self,
+        model_key: str,
+        query: np.ndarray,
+        k: int = 5,
+        user_id: Optional[int] = None,
+        exclude: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        started_at = time.perf_counter()
+        matches = self._segment(model_key).search(query, k, user_id, exclude)
+        self.searches += 1
+        self._search_latencies.append(time.perf_counter() - started_at)
+        return matches
+
+    async def sync(self, db: Database, batch_size: int = 1000):
+        """
+        Appends every stored embedding the index doesn't have yet.
+
+        History ids come from per-worker blocks, so they don't follow insert order and a
+        high-water mark would skip rows; the stored ids are diffed against the indexed ones.
+        """
+        if not self.enabled:
+            return
+        await db.history.create_index([("model", ASCENDING), ("_id", ASCENDING)])
+        for model_key in await db.history.distinct("model"):
+            if not model_key:
+                continue
+            segment = self._segment(model_key)
+            stored = db.history.find(
+                {"model": model_key, "embedding": {"$exists": True}}, {"_id": 1}
+            ).batch_size(batch_size * 10)
+            missing = np.setdiff1d(
+                np.fromiter([doc["_id"] async for doc in stored], dtype=np.int64), segment.history_ids())
+            for start in range(0, len(missing), batch_size):
+                chunk = [int(history_id) for history_id in missing[start:start + batch_size]]
+                docs = await db.history.find(
+                    {"_id": {"$in": chunk}}, {"user_id": 1, "embedding": 1}).to_list(length=None)
+                if docs:
+                    self._append_docs(model_key, docs)
+        self.flush()
+
+    def _append_docs(self, model_key: str, docs: List[dict]):
+        # A worker may have indexed some of these since the diff was taken
+        self._segment(model_key).append(
+            [doc["_id"] for doc in docs],
+            [doc["user_id"] for doc in docs],
+            np.stack([decode_embedding(doc["embedding"]) for doc in docs]),
+            skip_indexed=True
+        )
+
+    def flush(self):
+        for segment in self.segments.values():
+            segment.flush()
+        self._unflushed = 0
+
+    def metrics(self) -> dict:
+        latencies = np.asarray(self._search_latencies) * 1000.0
+        return {
+            "enabled": self.enabled,
+            "rows": {key: segment.count for key, segment in self.segments.items()},
+            "added": self.added,
+            "removed": self.removed,
+            "searches": self.searches,
+            "search_p50_ms": float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+            "search_p95_ms": float(np.percentile(latencies, 95)) if latencies.size else 0.0
+        }
+
+
+embedding_index = EmbeddingIndex(settings.EMBEDDING_INDEX_DIR, enabled=settings.EMBEDDINGS_ENABLED)
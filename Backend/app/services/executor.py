@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+from app.services import model_loader
+from app.services.model_registry import model_registry
+from app.services.model_server import ModelServerClient, create_model_server_client
+
+
+class PoolStats:
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    def as_dict(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.max_workers, 0),
+            "saturation": self.in_flight / self.max_workers if self.max_workers else 0.0,
+            "avg_wait_ms": (self.total_wait_seconds / finished * 1000.0) if finished else 0.0,
+            "avg_run_ms": (self.total_run_seconds / finished * 1000.0) if finished else 0.0
+        }
+
+
+def timed_call(fn: Callable, submitted_at: float, *args):
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.time() - started_at
+
+
+class WorkerPools:
+    """
+    Owns the thread pool used for blocking I/O and the process pool used for CPU-bound work.
+
+    Every process in the CPU pool preloads its own copy of each model. With `cpu_workers=0`
+    CPU work runs on the I/O thread pool against models loaded in this process instead.
+    With a `model_server` client CPU work also runs on the I/O thread pool, but inference
+    is sent to the model-server processes, so web workers hold no model at all.
+    """
+
+    def __init__(
+        self,
+        io_workers: int,
+        cpu_workers: int,
+        model_configs: Dict[str, tuple],
+        model_server: Optional[ModelServerClient] = None
+    ):
+        self.io_workers = io_workers
+        self.model_server = model_server
+        self.cpu_workers = 0 if model_server is not None else cpu_workers
+        self.model_configs = model_configs
+        self.io_pool: Optional[ThreadPoolExecutor] = None
+        self.cpu_pool: Optional[Executor] = None
+        self.io_stats = PoolStats("io", io_workers)
+        self.cpu_stats = PoolStats("cpu", self.cpu_workers or io_workers)
+        self.model_info = []
+
+    def start(self):
+        if self.io_pool is None:
+            self.io_pool = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix="derma-io")
+        if self.cpu_pool is None:
+            if self.cpu_workers > 0:
+                self.cpu_pool = self._process_pool(self.model_configs)
+            else:
+                # Connecting or loading happens in warmup, on the pool rather than the event loop
+                if self.model_server is not None:
+                    model_loader.use_model_server(self.model_server)
+                model_loader.configure(self.model_configs)
+                self.cpu_pool = self.io_pool
+
+    def _process_pool(self, model_configs: Dict[str, tuple]) -> ProcessPoolExecutor:
+        # TensorFlow is not fork-safe, so workers are spawned fresh
+        return ProcessPoolExecutor(
+            max_workers=self.cpu_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=model_loader.init_worker,
+            initargs=(model_configs,)
+        )
+
+    async def warmup(self):
+        """Forces every CPU worker to start and load its model before traffic arrives."""
+        self.model_info = await asyncio.gather(*[
+            self.run_cpu(model_loader.model_info)
+            for _ in range(max(self.cpu_workers, 1))
+        ])
+
+    async def reload_models(self, model_configs: Dict[str, tuple]):
+        """
+        Hot-swaps the served model set. New CPU workers load and warm the models before
+        they take any work; the old workers then finish whatever was already queued on
+        them and exit, so no request is dropped. Needs memory for both sets meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        if self.cpu_workers == 0:
+            model_loader.configure(model_configs)
+            self.model_configs = model_configs
+            self.model_info = [await self.run_io(model_loader.model_info)]
+            return
+
+        new_pool = self._process_pool(model_configs)
+        try:
+            model_info = await asyncio.gather(*[
+                loop.run_in_executor(new_pool, model_loader.model_info)
+                for _ in range(self.cpu_workers)
+            ])
+        except Exception:
+            new_pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        old_pool, self.cpu_pool = self.cpu_pool, new_pool
+        self.model_configs = model_configs
+        self.model_info = model_info
+        if old_pool is not None:
+            await loop.run_in_executor(None, old_pool.shutdown, True)
+
+    def shutdown(self, wait: bool = True):
+        if self.cpu_pool is not None and self.cpu_pool is not self.io_pool:
+            self.cpu_pool.shutdown(wait=wait, cancel_futures=True)
+        if self.io_pool is not None:
+            self.io_pool.shutdown(wait=wait, cancel_futures=True)
+        if self.model_server is not None:
+            self.model_server.close()
+        self.cpu_pool = None
+        self.io_pool = None
+
+    async def _run(self, pool: Executor, stats: PoolStats, fn: Callable, *args):
+        if pool is None:
+            self.start()
+            pool = self.cpu_pool if stats is self.cpu_stats else self.io_pool
+
+        stats.submitted += 1
+        loop = asyncio.get_running_loop()
+        try:
+            result, waited, ran = await loop.run_in_executor(
+                pool, timed_call, fn, time.time(), *args)
+        except Exception:
+            stats.failed += 1
+            raise
+        stats.completed += 1
+        stats.total_wait_seconds += waited
+        stats.total_run_seconds += ran
+        return result
+
+    async def run_io(self, fn: Callable, *args):
+        return await self._run(self.io_pool, self.io_stats, fn, *args)
+
+    async def run_cpu(self, fn: Callable, *args):
+        return await self._run(self.cpu_pool, self.cpu_stats, fn, *args)
+
+    def metrics(self) -> dict:
+        if self.model_server is not None:
+            mode = "server"
+        else:
+            mode = "process" if self.cpu_workers > 0 else "thread"
+        metrics = {
+            "io": self.io_stats.as_dict(),
+            "cpu": {**self.cpu_stats.as_dict(), "mode": mode},
+            "models": self.model_info
+        }
+        if self.model_server is not None:
+            metrics["model_server"] = self.model_server.metrics()
+        return metrics
+
+
+pools = WorkerPools(
+    io_workers=settings.IO_POOL_WORKERS,
+    cpu_workers=settings.CPU_POOL_WORKERS,
+    model_configs=model_registry.model_configs(),
+    model_server=create_model_server_client()
+)
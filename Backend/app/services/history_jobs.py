@@ -0,0 +1,354 @@
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple, Union
+
+from bson import json_util
+from pymongo import InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+from app.models.schema import PredictionHistory
+from app.services.history_services import HistoryService
+
+
+class Throttle:
+    """Caps a job at `max_per_second` documents by sleeping between batches; 0 disables it."""
+
+    def __init__(self, max_per_second: float = 0.0):
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._next = 0.0
+        self.slept_seconds = 0.0
+
+    async def wait(self, count: int):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+            self.slept_seconds += self._next - now
+        self._next = max(self._next, now) + count * self.interval
+
+
+class JobCheckpoint:
+    """
+    A job's position in a JSON file, replaced atomically after every batch. `params`
+    identify the run, so a checkpoint is never resumed by a job with different inputs.
+    """
+
+    def __init__(self, path: Optional[str], params: dict):
+        self.path = path
+        self.params = params
+
+    def load(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["params"] != self.params:
+            raise ValueError(f"{self.path} belongs to a job with different parameters; delete it to start over")
+        return checkpoint["state"]
+
+    def save(self, state: dict):
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"params": self.params, "state": state}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class JobProgress:
+    """Counts what a job has done and reports it every `report_seconds`."""
+
+    def __init__(self, job: str, report_seconds: float = 10.0, report: Callable[[str], None] = print):
+        self.job = job
+        self.report_seconds = report_seconds
+        self.report = report
+        self.counts = {"processed": 0}
+        self.started_at = time.perf_counter()
+        self._last_report = self.started_at
+
+    def add(self, processed: int, **counts: int):
+        self.counts["processed"] += processed
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+        now = time.perf_counter()
+        if now - self._last_report >= self.report_seconds:
+            self._last_report = now
+            self.report(f"{self.job}: {self.counts['processed']} documents, {self.rate():.0f} docs/s, {self.counts}")
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        return self.counts["processed"] / elapsed if elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "job": self.job,
+            **self.counts,
+            "seconds": time.perf_counter() - self.started_at,
+            "docs_per_second": self.rate()
+        }
+
+
+class HistoryJob:
+    """
+    A resumable bulk job over the history collection. Subclasses implement `_run`, reading
+    in batches of `batch_size`, calling `throttle.wait` before each write so a large job
+    doesn't starve the primary, and saving their position with `checkpoint.save`.
+    """
+
+    name = ""
+
+    def __init__(
+        self,
+        history: HistoryService,
+        batch_size: int = 500,
+        throttle: Optional[Throttle] = None,
+        checkpoint_path: Optional[str] = None,
+        report_seconds: float = 10.0
+    ):
+        self.history = history
+        self.batch_size = batch_size
+        self.throttle = throttle or Throttle()
+        self.checkpoint = JobCheckpoint(checkpoint_path, self.params())
+        self.progress = JobProgress(self.name, report_seconds)
+
+    def params(self) -> dict:
+        return {"job": self.name}
+
+    async def run(self) -> dict:
+        state = self.checkpoint.load()
+        resumed = bool(state)
+        await self._run(state)
+        # Finished: a rerun should start from scratch rather than resume
+        self.checkpoint.clear()
+        return {**self.progress.as_dict(), "resumed": resumed, "throttled_seconds": self.throttle.slept_seconds}
+
+    async def _run(self, state: dict):
+        raise NotImplementedError
+
+
+class ExportJob(HistoryJob):
+    """
+    Writes history as newline-delimited MongoDB Extended JSON, so dates, ids and stored
+    embeddings survive a round trip through ImportJob. On resume the file is cut back to
+    the last checkpointed offset and the scan continues after the last exported _id.
+    """
+
+    name = "export"
+
+    def __init__(self, history: HistoryService, output_path: str, user_id: Optional[int] = None,
+                 include_embeddings: bool = True, **options):
+        self.output_path = output_path
+        self.user_id = user_id
+        self.include_embeddings = include_embeddings
+        super().__init__(history, **options)
+
+    def params(self) -> dict:
+        return {"job": self.name, "output": os.path.abspath(self.output_path),
+                "user_id": self.user_id, "include_embeddings": self.include_embeddings}
+
+    async def _run(self, state: dict):
+        query = {"user_id": self.user_id} if self.user_id is not None else {}
+        projection = None if self.include_embeddings else {"embedding": 0}
+        offset = state.get("offset", 0)
+
+        with open(self.output_path, "r+b" if offset else "wb") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            async for batch in self.history.scan(query, projection, self.batch_size, state.get("last_id")):
+                await self.throttle.wait(len(batch))
+                f.write("".join(json_util.dumps(doc) + "\n" for doc in batch).encode())
+                f.flush()
+                state = {"last_id": batch[-1]["_id"], "offset": f.tell()}
+                self.checkpoint.save(state)
+                self.progress.add(len(batch), exported=len(batch))
+
+
+class ImportJob(HistoryJob):
+    """
+    Loads an ExportJob file with unordered bulk writes. Documents are validated against
+    PredictionHistory; by default they replace any row with the same _id, or with
+    `skip_existing` rows already present are left untouched. The history_id counter is
+    moved past the largest imported _id so new predictions never collide with them.
+    """
+
+    name = "import"
+
+    def __init__(self, history: HistoryService, input_path: str, skip_existing: bool = False, **options):
+        self.input_path = input_path
+        self.skip_existing = skip_existing
+        super().__init__(history, **options)
+
+    def params(self) -> dict:
+        return {"job": self.name, "input": os.path.abspath(self.input_path), "skip_existing": self.skip_existing}
+
+    def _operation(self, line: bytes) -> Tuple[int, Union[InsertOne, ReplaceOne]]:
+        doc = json_util.loads(line)
+        PredictionHistory(**doc)
+        if self.skip_existing:
+            return doc["_id"], InsertOne(doc)
+        return doc["_id"], ReplaceOne({"_id": doc["_id"]}, doc, upsert=True)
+
+    async def _write(self, operations: list, invalid: int, offset: int, max_id: int):
+        await self.throttle.wait(len(operations) + invalid)
+        result = await self.history.bulk_write(operations) if operations else {}
+        self.checkpoint.save({"offset": offset, "max_id": max_id})
+        self.progress.add(
+            len(operations) + invalid,
+            written=result.get("inserted", 0) + result.get("upserted", 0) + result.get("modified", 0),
+            skipped=result.get("duplicates", 0),
+            errors=result.get("errors", 0) + invalid
+        )
+
+    async def _run(self, state: dict):
+        max_id = state.get("max_id", 0)
+        with open(self.input_path, "rb") as f:
+            f.seek(state.get("offset", 0))
+            operations = []
+            invalid = 0
+            for line in iter(f.readline, b""):
+                if not line.strip():
+                    continue
+                try:
+                    history_id, operation = self._operation(line)
+                except Exception as e:
+                    invalid += 1
+                    print(f"Skipping invalid history line: {str(e)}")
+                    continue
+                operations.append(operation)
+                max_id = max(max_id, history_id)
+                if len(operations) + invalid >= self.batch_size:
+                    await self._write(operations, invalid, f.tell(), max_id)
+                    operations = []
+                    invalid = 0
+            if operations or invalid:
+                await self._write(operations, invalid, f.tell(), max_id)
+
+        if max_id:
+            await self.history.db.counters.update_one(
+                {"_id": "history_id"}, {"$max": {"sequence_value": max_id}}, upsert=True)
+
+
+class Backfill:
+    """What a BackfillJob changes: the rows to visit, the fields to read, and the updates for a batch."""
+
+    name = ""
+    query: dict = {}
+    projection: Optional[dict] = None
+
+    def params(self) -> dict:
+        return {"backfill": self.name}
+
+    async def updates(self, docs: List[dict]) -> list:
+        raise NotImplementedError
+
+
+class ModelBackfill(Backfill):
+    """Sets `model` on rows saved before history recorded which model made each prediction."""
+
+    name = "model"
+    query = {"model": None}
+    projection = {"_id": 1}
+
+    def __init__(self, model_key: str):
+        self.model_key = model_key
+
+    def params(self) -> dict:
+        return {"backfill": self.name, "model": self.model_key}
+
+    async def updates(self, docs: List[dict]) -> list:
+        # The value is the same for every row, so one update covers the whole batch
+        return [UpdateMany(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}, "model": None},
+            {"$set": {"model": self.model_key}}
+        )]
+
+
+def fetch_image(url: str, timeout: float = 30.0) -> bytes:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+class RescoreBackfill(Backfill):
+    """
+    Re-scores uploaded images with another model and stores the result in a `rescored`
+    sub-document ({model, disease, confidence, timestamp}); the prediction the user was
+    shown is left as it was. Rows already rescored by the same model label are skipped.
+    """
+
+    name = "rescore"
+    projection = {"image_url": 1}
+
+    def __init__(self, backend, model_label: str, class_names: List[str], fetch: Callable[[str], bytes] = fetch_image):
+        self.backend = backend
+        self.model_label = model_label
+        self.class_names = class_names
+        self.fetch = fetch
+        self.query = {"image_url": {"$ne": None}, "rescored.model": {"$ne": model_label}}
+
+    def params(self) -> dict:
+        return {"backfill": self.name, "model": self.model_label}
+
+    async def _fetch(self, url: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self.fetch, url)
+        except Exception as e:
+            print(f"Could not fetch {url}: {str(e)}")
+            return None
+
+    async def updates(self, docs: List[dict]) -> list:
+        from app.utils.image_utils import preprocess_batch
+
+        images = await asyncio.gather(*[self._fetch(doc["image_url"]) for doc in docs])
+        fetched = [i for i, image in enumerate(images) if image is not None]
+        if not fetched:
+            return []
+        batch, errors = await asyncio.to_thread(preprocess_batch, [images[i] for i in fetched])
+        valid = [position for position, error in enumerate(errors) if error is None]
+        if not valid:
+            return []
+        probabilities = await asyncio.to_thread(self.backend.predict, batch[valid])
+
+        timestamp = datetime.utcnow()
+        operations = []
+        for position, row in zip(valid, probabilities):
+            index = int(row.argmax())
+            operations.append(UpdateOne({"_id": docs[fetched[position]]["_id"]}, {"$set": {"rescored": {
+                "model": self.model_label,
+                "disease": self.class_names[index],
+                "confidence": float(row[index] * 100),
+                "timestamp": timestamp
+            }}}))
+        return operations
+
+
+class BackfillJob(HistoryJob):
+    """Visits the rows a Backfill selects in _id order and applies its updates batch by batch."""
+
+    name = "backfill"
+
+    def __init__(self, history: HistoryService, backfill: Backfill, **options):
+        self.backfill = backfill
+        super().__init__(history, **options)
+
+    def params(self) -> dict:
+        return {"job": self.name, **self.backfill.params()}
+
+    async def _run(self, state: dict):
+        async for batch in self.history.scan(
+                self.backfill.query, self.backfill.projection, self.batch_size, state.get("last_id")):
+            await self.throttle.wait(len(batch))
+            operations = await self.backfill.updates(batch)
+            result = await self.history.bulk_write(operations) if operations else {}
+            self.checkpoint.save({"last_id": batch[-1]["_id"]})
+            self.progress.add(
+                len(batch),
+                modified=result.get("modified", 0),
+                errors=result.get("errors", 0)
+            )
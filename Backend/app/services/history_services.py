@@ -1,22 +1,211 @@
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
 from pymongo.database import Database
+from pymongo.errors import BulkWriteError
 from fastapi import HTTPException
+from app.services.embedding_index import embedding_index, decode_embedding
+from app.services.thumbnails import thumbnail_store
+
+HISTORY_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+HISTORY_FIELDS = {"user_id", "disease", "confidence", "image_url", "thumbnail_url", "model", "timestamp"}
+
+HISTORY_INDEXES = [
+    [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+    [("user_id", ASCENDING), ("disease", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(doc: dict) -> str:
+    timestamp = doc.get("timestamp")
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        timestamp, history_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(history_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
 
 
 class HistoryService:
     def __init__(self, db: Database):
         self.db = db
 
-    async def get_user_history(self, user_id: int):
-        history_cursor = self.db.history.find({"user_id": user_id})
-        history_list = await history_cursor.to_list(length=None)
-        return history_list
+    @staticmethod
+    async def ensure_indexes(db: Database):
+        for keys in HISTORY_INDEXES:
+            await db.history.create_index(keys)
+
+    @staticmethod
+    def build_query(
+        user_id: int,
+        before: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        disease: Optional[str] = None
+    ) -> dict:
+        conditions = [{"user_id": user_id}]
+        if disease:
+            conditions.append({"disease": disease})
+        if start or end:
+            timestamp_range = {}
+            if start:
+                timestamp_range["$gte"] = start
+            if end:
+                timestamp_range["$lt"] = end
+            conditions.append({"timestamp": timestamp_range})
+        if before:
+            # Keyset pagination: everything strictly after the cursor in (timestamp, _id) descending order
+            timestamp, history_id = decode_cursor(before)
+            conditions.append({"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": history_id}}
+            ]})
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    @staticmethod
+    def build_projection(fields: Optional[str]) -> dict:
+        if not fields:
+            # Embeddings are stored on the rows for similar-case search but never returned
+            return {"embedding": 0}
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - HISTORY_FIELDS - {"_id"}
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown history fields: {', '.join(sorted(unknown))}")
+        # _id and timestamp are always returned because the pagination cursor is built from them
+        return {field: 1 for field in requested | {"_id", "timestamp"}}
+
+    async def get_user_history(
+        self,
+        user_id: int,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        fields: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        disease: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Returns one page of history, newest first, and the cursor for the next page (if any)."""
+        history_cursor = self.db.history.find(
+            self.build_query(user_id, before, start, end, disease),
+            self.build_projection(fields)
+        ).sort(HISTORY_SORT)
+        if limit is None:
+            return await history_cursor.to_list(length=None), None
+
+        history_list = await history_cursor.limit(limit + 1).to_list(length=limit + 1)
+        if len(history_list) > limit:
+            history_list = history_list[:limit]
+            return history_list, encode_cursor(history_list[-1])
+        return history_list, None
+
+    async def stream_user_history(
+        self,
+        user_id: int,
+        batch_size: int = 100,
+        fields: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        disease: Optional[str] = None,
+        base_url: str = ""
+    ) -> AsyncIterator[str]:
+        """Streams history as NDJSON straight from the cursor, one chunk per `batch_size` documents."""
+        history_cursor = self.db.history.find(
+            self.build_query(user_id, None, start, end, disease),
+            self.build_projection(fields)
+        ).sort(HISTORY_SORT).batch_size(batch_size)
+        lines = []
+        async for doc in history_cursor:
+            lines.append(json.dumps(thumbnail_store.with_public_url(doc, base_url), default=_json_default))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    async def scan(
+        self,
+        query: Optional[dict] = None,
+        projection: Optional[dict] = None,
+        batch_size: int = 500,
+        after_id: Optional[int] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Streams history documents matching `query` in _id order, `batch_size` at a time,
+        starting after `after_id`. Used by the bulk jobs, which checkpoint the last _id seen.
+        """
+        conditions = [query or {}]
+        if after_id is not None:
+            conditions.append({"_id": {"$gt": after_id}})
+        history_cursor = self.db.history.find(
+            conditions[0] if len(conditions) == 1 else {"$and": conditions}, projection
+        ).sort("_id", ASCENDING).batch_size(batch_size)
+        batch = []
+        async for doc in history_cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def bulk_write(self, operations: list) -> dict:
+        """Applies the operations as one unordered bulk write; failed documents are counted, not raised."""
+        try:
+            result = (await self.db.history.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+        duplicates = sum(1 for error in result["writeErrors"] if error.get("code") == 11000)
+        return {
+            "inserted": result["nInserted"],
+            "upserted": result["nUpserted"],
+            "modified": result["nModified"],
+            "duplicates": duplicates,
+            "errors": len(result["writeErrors"]) - duplicates
+        }
 
     async def delete_history_item(self, history_id: int, user_id: int):
         # Find and delete the specific history item for the specific user
-        delete_result = await self.db.history.delete_one({"id": history_id, "user_id": user_id})
+        delete_result = await self.db.history.delete_one({"_id": history_id, "user_id": user_id})
 
         if delete_result.deleted_count == 0:
             raise HTTPException(
                 status_code=404, detail="History item not found or you do not have permission to delete it.")
 
+        embedding_index.remove(history_id)
         return {"message": "History item deleted successfully."}
+
+    async def get_similar_history(self, history_id: int, user_id: int, k: int = 5) -> List[dict]:
+        """Returns the user's `k` past predictions whose images are closest to this one, most similar first."""
+        if not embedding_index.enabled:
+            raise HTTPException(status_code=503, detail="Similar-case search is not enabled on this server.")
+
+        doc = await self.db.history.find_one({"_id": history_id, "user_id": user_id}, {"model": 1, "embedding": 1})
+        if doc is None:
+            raise HTTPException(status_code=404, detail="History item not found.")
+        if doc.get("embedding") is None or not doc.get("model"):
+            raise HTTPException(status_code=404, detail="No embedding is stored for this history item.")
+
+        matches = embedding_index.search(
+            doc["model"], decode_embedding(doc["embedding"]), k, user_id=user_id, exclude=history_id)
+        if not matches:
+            return []
+        similar_docs = await self.db.history.find(
+            {"_id": {"$in": [match_id for match_id, _ in matches]}, "user_id": user_id},
+            {field: 1 for field in HISTORY_FIELDS}
+        ).to_list(length=None)
+        # Rows deleted since they were indexed simply drop out here
+        by_id = {similar_doc["_id"]: similar_doc for similar_doc in similar_docs}
+        return [{**by_id[match_id], "similarity": score} for match_id, score in matches if match_id in by_id]
@@ -0,0 +1,65 @@
+import asyncio
+from typing import List
+
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+
+from app.config import settings
+from app.models.user_model import db
+
+
+class BlockIdAllocator:
+    """
+    Hands out integer IDs from blocks leased off a `counters` document.
+
+    Each lease is one `$inc` of `block_size` on the same `{_id: name, sequence_value}`
+    document the per-insert counters used, so leased IDs never collide with IDs handed
+    out by older workers still running the per-insert `$inc` during a rolling deploy.
+    IDs stay unique and increasing within a worker, but interleave across workers, and
+    the unused tail of a block is skipped when a worker restarts.
+    """
+
+    def __init__(self, collection: Collection, name: str, block_size: int = 100):
+        self.collection = collection
+        self.name = name
+        self.block_size = max(block_size, 1)
+        self._next = 1
+        self._end = 0
+        self._lock = asyncio.Lock()
+        self.leases = 0
+
+    async def _lease(self, count: int):
+        sequence_doc = await self.collection.find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'sequence_value': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.leases += 1
+        self._end = sequence_doc['sequence_value']
+        self._next = self._end - count + 1
+
+    async def allocate(self, count: int = 1) -> List[int]:
+        async with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next > self._end:
+                    await self._lease(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next + 1)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+    async def allocate_one(self) -> int:
+        return (await self.allocate(1))[0]
+
+    def metrics(self) -> dict:
+        return {
+            "leases": self.leases,
+            "block_size": self.block_size,
+            "remaining": self._end - self._next + 1
+        }
+
+
+user_id_allocator = BlockIdAllocator(db.counters, "user_id", settings.ID_BLOCK_SIZE)
+history_id_allocator = BlockIdAllocator(db.counters, "history_id", settings.ID_BLOCK_SIZE)
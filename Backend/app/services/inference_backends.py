@@ -0,0 +1,207 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+
+INPUT_SHAPE = (224, 224, 3)
+INPUT_NAME = "image"
+OUTPUT_NAME = "probabilities"
+# The feature vector the classifier head runs on (1280 floats for MobileNetV2)
+EMBEDDING_NAME = "embedding"
+
+DEFAULT_ARTIFACTS = {
+    "keras": "models/my_model_weights.h5",
+    "savedmodel": "models/dermaai_savedmodel",
+    "tflite": "models/dermaai.tflite",
+    "onnx": "models/dermaai.onnx"
+}
+
+# Post-training quantized variants are TFLite artifacts produced by scripts.quantize_model
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def default_artifact(name: str, precision: str = "float32") -> str:
+    if precision == "float32":
+        return DEFAULT_ARTIFACTS[name]
+    return f"models/dermaai_{precision}.tflite"
+
+
+class InferenceBackend(ABC):
+    """A loaded model that maps a float32 (N, 224, 224, 3) batch to (N, num_classes) softmax rows."""
+
+    name = ""
+    precisions = ("float32",)
+
+    def __init__(self, artifact_path: Optional[str] = None, num_threads: int = 0, precision: str = "float32"):
+        if precision not in self.precisions:
+            raise ValueError(f"The {self.name} backend does not support {precision} precision")
+        self.artifact_path = artifact_path or default_artifact(self.name, precision)
+        self.num_threads = num_threads
+        self.precision = precision
+
+    @abstractmethod
+    def load(self):
+        pass
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        pass
+
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Returns the softmax rows and, when the artifact exposes it, the embedding of each image."""
+        return self.predict(batch), None
+
+    def warmup(self, batch_size: int = 1):
+        self.predict(np.zeros((batch_size,) + INPUT_SHAPE, dtype=np.float32))
+
+
+class KerasBackend(InferenceBackend):
+    """Rebuilds the TF Hub model and loads the .h5 weights; needs network access to tfhub.dev."""
+
+    name = "keras"
+
+    def load(self):
+        from tensorflow import keras
+        from app.services.model_loader import build_model
+        self.model = build_model(self.artifact_path)
+        # Same weights, but also returns the feature extractor output in the same forward pass
+        self.embedding_model = keras.Model(
+            inputs=self.model.inputs, outputs=[self.model.output, self.model.layers[0].output])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        probabilities, embeddings = self.embedding_model.predict(batch, verbose=0)
+        return probabilities, embeddings
+
+
+class SavedModelBackend(InferenceBackend):
+    name = "savedmodel"
+
+    def load(self):
+        import tensorflow as tf
+        if self.num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+            except RuntimeError:
+                # TensorFlow was already initialized in this process; keep its thread pool
+                pass
+        self.model = tf.saved_model.load(self.artifact_path)
+        self.serve = self.model.signatures["serving_default"]
+        # Artifacts exported before embeddings were added only have the probabilities output
+        self.has_embeddings = EMBEDDING_NAME in self.serve.structured_outputs
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.serve(**{INPUT_NAME: batch})[OUTPUT_NAME].numpy()
+
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if not self.has_embeddings:
+            return self.predict(batch), None
+        outputs = self.serve(**{INPUT_NAME: batch})
+        return outputs[OUTPUT_NAME].numpy(), outputs[EMBEDDING_NAME].numpy()
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TFLite interpreter with the default XNNPACK delegate; the input is resized per batch size.
+
+    Quantized models with integer input/output tensors are (de)quantized here using the
+    scale and zero point stored in the model.
+    """
+
+    name = "tflite"
+    precisions = PRECISIONS
+
+    def load(self):
+        import tensorflow as tf
+        self.interpreter = tf.lite.Interpreter(
+            model_path=self.artifact_path,
+            num_threads=self.num_threads or None
+        )
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(
+                self.input_detail["index"], (batch_size,) + INPUT_SHAPE)
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def _quantize(self, batch: np.ndarray) -> np.ndarray:
+        dtype = self.input_detail["dtype"]
+        if dtype == np.float32:
+            return batch
+        scale, zero_point = self.input_detail["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output: np.ndarray) -> np.ndarray:
+        if output.dtype == np.float32:
+            return output.copy()
+        scale, zero_point = self.output_detail["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # The interpreter owns its tensors, so concurrent calls must be serialized
+        with self._lock:
+            self._resize(batch.shape[0])
+            self.interpreter.set_tensor(self.input_detail["index"], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self.output_detail["index"]))
+
+
+class ONNXBackend(InferenceBackend):
+    name = "onnx"
+
+    def load(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        self.session = ort.InferenceSession(
+            self.artifact_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        outputs = self.session.get_outputs()
+        output_names = [output.name for output in outputs]
+        if OUTPUT_NAME in output_names:
+            self.output_name = OUTPUT_NAME
+            self.embedding_name = EMBEDDING_NAME if EMBEDDING_NAME in output_names else None
+        else:
+            # Older exports have tf2onnx's Identity:0 style names; the probabilities are the
+            # output with one column per class, whatever order they were written in
+            from app.services.model_loader import CLASS_NAMES
+            by_width = {output.shape[-1]: output.name for output in outputs}
+            self.output_name = by_width.get(len(CLASS_NAMES), output_names[0])
+            self.embedding_name = None
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run([self.output_name], {self.input_name: batch})[0]
+
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.embedding_name is None:
+            return self.predict(batch), None
+        probabilities, embeddings = self.session.run(
+            [self.output_name, self.embedding_name], {self.input_name: batch})
+        return probabilities, embeddings
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (KerasBackend, SavedModelBackend, TFLiteBackend, ONNXBackend)
+}
+
+
+def create_backend(
+    name: str,
+    artifact_path: Optional[str] = None,
+    num_threads: int = 0,
+    precision: str = "float32"
+) -> InferenceBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {name}. Choose one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](artifact_path, num_threads, precision)
@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+FEATURE_EXTRACTOR_URL = "https://tfhub.dev/google/tf2-preview/mobilenet_v2/feature_vector/4"
+DEFAULT_WEIGHTS_PATH = "models/my_model_weights.h5"
+
+CLASS_NAMES = [
+    'Cellulitis', 'Impetigo', 'Athlete Foot', 'Nail Fungus',
+    'Ringworm', 'Cutaneous Larva Migrans', 'Chickenpox', 'Shingles'
+]
+
+# Per process: model key ("name:version") -> backend config tuple, loaded backend and load time
+_configs: Dict[str, tuple] = {}
+_backends = {}
+_startup_seconds: Dict[str, float] = {}
+_load_lock = threading.Lock()
+# Set in web workers that send inference to a model server instead of loading models
+_model_server = None
+
+
+def build_model(weights_path: str = DEFAULT_WEIGHTS_PATH):
+    # Imported here so worker processes and tooling only pay for TensorFlow when they need a model
+    from tensorflow import keras
+    import tensorflow_hub as hub
+
+    # Recreate the model architecture and load only the weights
+    feature_extractor_layer = hub.KerasLayer(
+        FEATURE_EXTRACTOR_URL,
+        input_shape=(224, 224, 3),
+        trainable=False
+    )
+
+    model = keras.Sequential([
+        feature_extractor_layer,
+        keras.layers.Dense(len(CLASS_NAMES), activation='softmax')
+    ])
+
+    model.load_weights(weights_path)
+    return model
+
+
+def configure(model_configs: Dict[str, tuple]):
+    """
+    Sets the models this process serves, as {model key: (backend, artifact_path, num_threads, precision)}.
+    Loaded backends whose key was removed or whose config changed are dropped.
+    """
+    for key in list(_backends):
+        if model_configs.get(key) != _configs.get(key):
+            _backends.pop(key)
+            _startup_seconds.pop(key, None)
+    _configs.clear()
+    _configs.update(model_configs)
+
+
+def use_model_server(client):
+    """Makes load_model hand out RemoteBackends that forward to `client` (a ModelServerClient)."""
+    global _model_server
+    _model_server = client
+    _backends.clear()
+    _startup_seconds.clear()
+
+
+def load_model(key: Optional[str] = None, config: Optional[tuple] = None):
+    """
+    Loads and warms up a model once per process. `config` lets callers that resolved a
+    model before a hot swap still be served after this process stopped listing it.
+    """
+    key = key or next(iter(_configs))
+    backend = _backends.get(key)
+    if backend is None:
+        from app.services.inference_backends import create_backend
+
+        with _load_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                started_at = time.perf_counter()
+                if _model_server is not None:
+                    from app.services.model_server import RemoteBackend
+                    backend = RemoteBackend(_model_server, key, config or _configs[key])
+                else:
+                    backend = create_backend(*(config or _configs[key]))
+                backend.load()
+                backend.warmup()
+                _startup_seconds[key] = time.perf_counter() - started_at
+                _backends[key] = backend
+    return backend
+
+
+def unload_model(key: str):
+    _backends.pop(key, None)
+    _startup_seconds.pop(key, None)
+
+
+def init_worker(model_configs: Dict[str, tuple]):
+    """Process pool initializer: every worker holds its own preloaded copy of each model."""
+    configure(model_configs)
+    for key in model_configs:
+        load_model(key)
+
+
+def model_info() -> List[dict]:
+    """Loads the models if needed and returns a picklable summary of each."""
+    info = []
+    for key in _configs:
+        backend = load_model(key)
+        info.append({
+            "model": key,
+            "backend": backend.name,
+            "precision": backend.precision,
+            "artifact": backend.artifact_path,
+            "startup_seconds": _startup_seconds.get(key)
+        })
+    return info
+
+
+def predict_batch(batch: np.ndarray, key: Optional[str] = None, config: Optional[tuple] = None) -> np.ndarray:
+    return load_model(key, config).predict(batch)
+
+
+def predict_with_embeddings(
+    batch: np.ndarray,
+    key: Optional[str] = None,
+    config: Optional[tuple] = None
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Softmax rows plus float16 embeddings (None if the model's artifact has no embedding output)."""
+    probabilities, embeddings = load_model(key, config).predict_with_embeddings(batch)
+    return probabilities, (embeddings.astype(np.float16) if embeddings is not None else None)
+
+
+def predict_augmented(batch: np.ndarray, views: int, key: Optional[str] = None, config: Optional[tuple] = None) -> np.ndarray:
+    """
+    Runs `views` augmentations of every image in one forward pass and returns, per image,
+    the mean softmax over its views. Augmenting here keeps the K-times larger tensor
+    inside the worker instead of shipping it across the process boundary.
+    """
+    from app.utils.image_utils import tta_views
+
+    augmented = tta_views(batch, views)
+    rows = load_model(key, config).predict(augmented)
+    return rows.reshape(len(batch), -1, rows.shape[-1]).mean(axis=1)
@@ -0,0 +1,224 @@
+import json
+import random
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.model_loader import CLASS_NAMES
+
+
+class ModelSpec:
+    """One servable model version: how to load it and the labels of its output rows."""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        backend: str = "keras",
+        artifact: Optional[str] = None,
+        precision: str = "float32",
+        num_threads: int = 0,
+        class_names: Optional[List[str]] = None
+    ):
+        self.name = name
+        self.version = version
+        self.backend = backend
+        self.artifact = artifact
+        self.precision = precision
+        self.num_threads = num_threads
+        self.class_names = class_names or CLASS_NAMES
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.version}"
+
+    @property
+    def config(self) -> tuple:
+        """The picklable tuple model_loader.create_backend is called with in the workers."""
+        return (self.backend, self.artifact, self.num_threads, self.precision)
+
+    def metadata(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "backend": self.backend,
+            "precision": self.precision
+        }
+
+
+class ShadowStats:
+    """How a shadow model compares with the primary on the traffic sampled for it."""
+
+    def __init__(self, history_size: int = 1000):
+        self.sampled = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.agreements = 0
+        self.total_confidence_delta = 0.0
+        self._latencies = deque(maxlen=history_size)
+
+    def record(self, primary: np.ndarray, shadow: np.ndarray, latency_seconds: float):
+        self.completed += len(primary)
+        self.agreements += int(np.sum(np.argmax(primary, axis=1) == np.argmax(shadow, axis=1)))
+        self.total_confidence_delta += float(np.sum(np.abs(np.max(primary, axis=1) - np.max(shadow, axis=1))))
+        self._latencies.append(latency_seconds)
+
+    def as_dict(self) -> dict:
+        latencies = np.asarray(self._latencies) * 1000.0
+        return {
+            "sampled": self.sampled,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "agreement": self.agreements / self.completed if self.completed else 0.0,
+            "avg_confidence_delta": self.total_confidence_delta / self.completed if self.completed else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95)) if latencies.size else 0.0
+        }
+
+
+class RegistryState:
+    """An immutable snapshot of the registry, swapped in as a whole on reload."""
+
+    def __init__(
+        self,
+        models: Dict[str, ModelSpec],
+        active: Dict[str, str],
+        default: str,
+        shadow: Optional[str] = None,
+        shadow_sample_rate: float = 0.0
+    ):
+        self.models = models
+        self.active = active
+        self.default = default
+        self.shadow = shadow
+        self.shadow_sample_rate = shadow_sample_rate
+
+
+def _settings_state() -> RegistryState:
+    artifact = settings.MODEL_ARTIFACT_PATH or (settings.MODEL_WEIGHTS_PATH if settings.MODEL_BACKEND == "keras" else None)
+    spec = ModelSpec(
+        settings.MODEL_NAME, settings.MODEL_VERSION, settings.MODEL_BACKEND,
+        artifact, settings.MODEL_PRECISION, settings.MODEL_NUM_THREADS
+    )
+    return RegistryState({spec.key: spec}, {spec.name: spec.version}, spec.key)
+
+
+def read_manifest(path: str) -> RegistryState:
+    """
+    Reads a registry manifest:
+
+        {
+          "models": [
+            {"name": "dermaai", "version": "v1", "backend": "keras", "artifact": "models/my_model_weights.h5"},
+            {"name": "dermaai", "version": "v2", "backend": "tflite", "artifact": "models/dermaai_v2.tflite"}
+          ],
+          "active": {"dermaai": "v1"},
+          "default": "dermaai",
+          "shadow": {"model": "dermaai:v2", "sample_rate": 0.1}
+        }
+
+    `active` picks the version served for a bare model name (the last listed version
+    otherwise) and `default` is the model used when a request doesn't ask for one.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    models = {}
+    active = {}
+    for entry in manifest["models"]:
+        spec = ModelSpec(
+            name=entry["name"],
+            version=str(entry["version"]),
+            backend=entry.get("backend", "keras"),
+            artifact=entry.get("artifact"),
+            precision=entry.get("precision", "float32"),
+            num_threads=entry.get("num_threads", settings.MODEL_NUM_THREADS),
+            class_names=entry.get("class_names")
+        )
+        models[spec.key] = spec
+        active[spec.name] = spec.version
+    active.update(manifest.get("active", {}))
+
+    state = RegistryState(models, active, default="")
+    state.default = _resolve(state, manifest.get("default") or next(iter(models))).key
+    shadow = manifest.get("shadow")
+    if shadow:
+        state.shadow = _resolve(state, shadow["model"]).key
+        state.shadow_sample_rate = float(shadow.get("sample_rate", 0.0))
+    return state
+
+
+def _resolve(state: RegistryState, requested: str) -> ModelSpec:
+    name, _, version = requested.partition(":")
+    key = f"{name}:{version or state.active.get(name, '')}"
+    if key not in state.models:
+        raise KeyError(f"Unknown model: {requested}. Available: {', '.join(state.models)}")
+    return state.models[key]
+
+
+class ModelRegistry:
+    """
+    The named, versioned models this API serves and which one each request uses.
+
+    Requests are routed to the model named in their `X-Model` header ("name" for its
+    active version or "name:version"), or to the default model. `reload` re-reads the
+    manifest, loads the new model set into fresh workers and only then swaps it in,
+    so in-flight requests finish on the models they started with.
+    """
+
+    def __init__(self, manifest_path: str = ""):
+        self.manifest_path = manifest_path
+        self.state = read_manifest(manifest_path) if manifest_path else _settings_state()
+        self.shadow_stats: Dict[str, ShadowStats] = {}
+        self.reloads = 0
+
+    def model_configs(self) -> Dict[str, tuple]:
+        return {key: spec.config for key, spec in self.state.models.items()}
+
+    def resolve(self, requested: Optional[str] = None) -> ModelSpec:
+        state = self.state
+        return _resolve(state, requested) if requested else state.models[state.default]
+
+    def shadow_for(self, primary: ModelSpec) -> Optional[ModelSpec]:
+        """Picks the shadow model for a sampled share of requests, never for the shadow model itself."""
+        state = self.state
+        if state.shadow is None or state.shadow == primary.key or random.random() >= state.shadow_sample_rate:
+            return None
+        return state.models[state.shadow]
+
+    def stats_for(self, shadow: ModelSpec) -> ShadowStats:
+        if shadow.key not in self.shadow_stats:
+            self.shadow_stats[shadow.key] = ShadowStats()
+        return self.shadow_stats[shadow.key]
+
+    async def reload(self, pools) -> RegistryState:
+        if not self.manifest_path:
+            raise ValueError("MODEL_REGISTRY_PATH is not set; there is no manifest to reload")
+        state = read_manifest(self.manifest_path)
+        await pools.reload_models({key: spec.config for key, spec in state.models.items()})
+        self.state = state
+        self.reloads += 1
+        return state
+
+    def describe(self) -> dict:
+        state = self.state
+        return {
+            "default": state.default,
+            "active": state.active,
+            "models": {key: spec.metadata() for key, spec in state.models.items()},
+            "shadow": {"model": state.shadow, "sample_rate": state.shadow_sample_rate} if state.shadow else None
+        }
+
+    def metrics(self) -> dict:
+        return {
+            "models": len(self.state.models),
+            "reloads": self.reloads,
+            "shadow": {key: stats.as_dict() for key, stats in self.shadow_stats.items()}
+        }
+
+
+model_registry = ModelRegistry(settings.MODEL_REGISTRY_PATH)
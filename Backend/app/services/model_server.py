@@ -0,0 +1,500 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import model_loader
+from app.services.inference_backends import INPUT_SHAPE, InferenceBackend
+
+INPUT_ROW_BYTES = int(np.prod(INPUT_SHAPE)) * 4
+
+
+def server_addresses(socket_path: str, processes: int) -> List[str]:
+    """One Unix socket per model-server process: `<socket_path>.0`, `<socket_path>.1`, ..."""
+    return [f"{socket_path}.{i}" for i in range(processes)]
+
+
+class SharedMemoryRing:
+    """
+    A fixed set of slots in one shared-memory segment, each with room for `slot_rows`
+    float32 input images followed by `output_row_bytes` of results per row. The web
+    worker that creates the ring hands slots out in turn; the model server attaches to
+    the same segment by name, so batches cross the process boundary without pickling.
+    """
+
+    def __init__(self, shm: SharedMemory, slots: int, slot_rows: int, output_row_bytes: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.slot_rows = slot_rows
+        self.output_row_bytes = output_row_bytes
+        self.slot_bytes = slot_rows * (INPUT_ROW_BYTES + output_row_bytes)
+        self.owner = owner
+        self._free = list(range(slots))
+        self._waiters: deque = deque()
+        self._available = threading.Condition()
+
+    @classmethod
+    def create(cls, slots: int, slot_rows: int, output_row_bytes: int) -> "SharedMemoryRing":
+        size = slots * slot_rows * (INPUT_ROW_BYTES + output_row_bytes)
+        return cls(SharedMemory(create=True, size=size), slots, slot_rows, output_row_bytes, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_rows: int, output_row_bytes: int) -> "SharedMemoryRing":
+        shm = SharedMemory(name=name)
+        # The creating worker owns the segment; without this the server's resource tracker
+        # would unlink it when the server exits (see bpo-38119)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, slots, slot_rows, output_row_bytes, owner=False)
+
+    @property
+    def layout(self) -> tuple:
+        return self.shm.name, self.slots, self.slot_rows, self.output_row_bytes
+
+    def acquire(self) -> int:
+        # Slots are handed to waiters in arrival order; otherwise a thread that releases a slot
+        # can take it straight back and starve the others (a retry included)
+        with self._available:
+            if self._free and not self._waiters:
+                return self._free.pop(0)
+            waiter = [None]
+            self._waiters.append(waiter)
+            while waiter[0] is None:
+                self._available.wait()
+            return waiter[0]
+
+    def release(self, slot: int):
+        with self._available:
+            if self._waiters:
+                self._waiters.popleft()[0] = slot
+                self._available.notify_all()
+            else:
+                self._free.append(slot)
+
+    def inputs(self, slot: int, rows: int) -> np.ndarray:
+        return np.ndarray((rows,) + INPUT_SHAPE, dtype=np.float32, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def output_buffer(self, slot: int) -> Tuple[int, int]:
+        """(offset, size) of the slot's output area."""
+        offset = slot * self.slot_bytes + self.slot_rows * INPUT_ROW_BYTES
+        return offset, self.slot_rows * self.output_row_bytes
+
+    def write_outputs(self, slot: int, arrays: Tuple[Optional[np.ndarray], ...]) -> list:
+        """
+        Copies each result array into the slot's output area and returns how to read it
+        back. Arrays that don't fit (an unexpectedly wide embedding) travel inline instead.
+        """
+        offset, size = self.output_buffer(slot)
+        end = offset + size
+        descriptors = []
+        for array in arrays:
+            if array is None:
+                descriptors.append(None)
+                continue
+            array = np.ascontiguousarray(array)
+            if offset + array.nbytes > end:
+                descriptors.append(("inline", array))
+                continue
+            np.ndarray(array.shape, array.dtype, buffer=self.shm.buf, offset=offset)[...] = array
+            descriptors.append(("shm", offset, array.shape, array.dtype.str))
+            offset += array.nbytes
+        return descriptors
+
+    def read_outputs(self, descriptors: list) -> List[Optional[np.ndarray]]:
+        arrays = []
+        for descriptor in descriptors:
+            if descriptor is None:
+                arrays.append(None)
+            elif descriptor[0] == "inline":
+                arrays.append(descriptor[1])
+            else:
+                _, offset, shape, dtype = descriptor
+                arrays.append(np.ndarray(shape, np.dtype(dtype), buffer=self.shm.buf, offset=offset).copy())
+        return arrays
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view into the segment is still alive; the mapping goes away with the process
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ModelServer:
+    """
+    Holds the models for every web worker on the host. Workers connect over a Unix
+    socket, attach a SharedMemoryRing and then send small control messages naming a slot;
+    the batch itself is read from and the results written to shared memory.
+
+    Models are loaded per (model key, backend config), so web workers that are part way
+    through a hot reload keep being served; configs nobody has used for
+    `idle_unload_seconds` are dropped when another one is loaded.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        model_configs: Dict[str, tuple],
+        threads: int = 2,
+        idle_unload_seconds: float = 300.0
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.model_configs = model_configs
+        self.idle_unload_seconds = idle_unload_seconds
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="derma-model")
+        self._last_used: Dict[str, float] = {}
+        self._listener: Optional[Listener] = None
+
+    @staticmethod
+    def _model_key(key: str, config: tuple) -> str:
+        return f"{key}|{'|'.join(str(value) for value in config)}"
+
+    def _backend(self, key: str, config: tuple) -> InferenceBackend:
+        model_key = self._model_key(key, config)
+        self._last_used[model_key] = time.monotonic()
+        return model_loader.load_model(model_key, config)
+
+    def _load(self, key: str, config: tuple) -> dict:
+        backend = self._backend(key, config)
+        cutoff = time.monotonic() - self.idle_unload_seconds
+        for model_key, last_used in list(self._last_used.items()):
+            if last_used < cutoff:
+                model_loader.unload_model(model_key)
+                self._last_used.pop(model_key, None)
+        return {
+            "backend": backend.name,
+            "precision": backend.precision,
+            "artifact": backend.artifact_path,
+            "pid": os.getpid()
+        }
+
+    def serve_forever(self):
+        for key, config in self.model_configs.items():
+            self._load(key, config)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        print(f"Model server {os.getpid()} listening on {self.address}")
+        try:
+            while True:
+                try:
+                    connection = self._listener.accept()
+                except Exception as e:
+                    if self._listener is None:
+                        return
+                    # A client that failed the authkey handshake or hung up during it
+                    print(f"Rejected model server connection: {str(e)}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _serve_connection(self, connection: Connection):
+        ring: Optional[SharedMemoryRing] = None
+        send_lock = threading.Lock()
+
+        def reply(request_id: int, future: Future):
+            try:
+                message = (request_id, "ok", future.result())
+            except Exception as e:
+                message = (request_id, "error", f"{type(e).__name__}: {str(e)}")
+            with send_lock:
+                try:
+                    connection.send(message)
+                except OSError:
+                    pass
+
+        try:
+            while True:
+                request_id, op, args = connection.recv()
+                if op == "attach":
+                    if ring is not None:
+                        ring.close()
+                    ring = SharedMemoryRing.attach(*args)
+                    future = Future()
+                    future.set_result(None)
+                elif op == "load":
+                    future = self.executor.submit(self._load, *args)
+                else:
+                    future = self.executor.submit(self._predict, ring, op, *args)
+                future.add_done_callback(lambda done, request_id=request_id: reply(request_id, done))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            if ring is not None:
+                ring.close()
+
+    def _predict(self, ring: SharedMemoryRing, op: str, key: str, config: tuple, slot: int, rows: int) -> list:
+        backend = self._backend(key, config)
+        batch = ring.inputs(slot, rows)
+        if op == "predict_with_embeddings":
+            outputs = backend.predict_with_embeddings(batch)
+        else:
+            outputs = (backend.predict(batch),)
+        return ring.write_outputs(slot, outputs)
+
+
+class ServerConnection:
+    """One web worker's connection to one model-server process, with its own ring of slots."""
+
+    def __init__(self, address: str, authkey: bytes, slots: int, slot_rows: int, output_row_bytes: int):
+        self.address = address
+        self.connection = Client(address, family="AF_UNIX", authkey=authkey)
+        self.ring = SharedMemoryRing.create(slots, slot_rows, output_row_bytes)
+        self.in_flight = 0
+        self.closed = False
+        self._ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    def _read_replies(self):
+        try:
+            while True:
+                request_id, status, payload = self.connection.recv()
+                future = self._futures.pop(request_id)
+                if status == "ok":
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(f"Model server: {payload}"))
+        except (EOFError, OSError, TypeError):
+            # TypeError: close() from another thread released the handle mid-recv
+            pass
+        self.closed = True
+        for future in list(self._futures.values()):
+            future.set_exception(ConnectionError(f"Lost connection to the model server at {self.address}"))
+        self._futures.clear()
+
+    def request(self, op: str, args: tuple, timeout: float):
+        if self.closed:
+            raise ConnectionError(f"Lost connection to the model server at {self.address}")
+        request_id = next(self._ids)
+        future = Future()
+        self._futures[request_id] = future
+        self.in_flight += 1
+        try:
+            with self._send_lock:
+                try:
+                    self.connection.send((request_id, op, args))
+                except OSError:
+                    # Don't wait for the reader thread to notice; the retry must pick another connection
+                    self.closed = True
+                    raise ConnectionError(f"Lost connection to the model server at {self.address}")
+            return future.result(timeout)
+        except TimeoutError:
+            # The server may still write into the slot later; retire the connection and its ring
+            self.close()
+            raise
+        finally:
+            self._futures.pop(request_id, None)
+            self.in_flight -= 1
+
+    def predict(
+        self,
+        op: str,
+        key: str,
+        config: tuple,
+        batch: np.ndarray,
+        timeout: float
+    ) -> List[Optional[np.ndarray]]:
+        slot = self.ring.acquire()
+        try:
+            if self.closed:
+                raise ConnectionError(f"Lost connection to the model server at {self.address}")
+            np.copyto(self.ring.inputs(slot, len(batch)), batch)
+            descriptors = self.request(op, (key, config, slot, len(batch)), timeout)
+            return self.ring.read_outputs(descriptors)
+        except (TypeError, ValueError, BufferError) as e:
+            # Another thread closed the connection and its ring under us (a timed-out request);
+            # report it as a lost connection so the client retries on a fresh one
+            if not self.closed:
+                raise
+            raise ConnectionError(f"Lost connection to the model server at {self.address}") from e
+        finally:
+            self.ring.release(slot)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+        self.ring.close()
+
+
+class ModelServerClient:
+    """
+    Sends inference to the model-server processes from a web worker. Connections are
+    opened on first use and reopened after a server restarts; calls go to the live
+    connection with the fewest requests in flight and only wait when no server is up.
+    A request cut off by a dying server is retried once. Batches larger than a ring
+    slot are split.
+    """
+
+    def __init__(
+        self,
+        addresses: List[str],
+        authkey: bytes,
+        slots: int = 4,
+        slot_rows: int = 16,
+        output_row_bytes: int = 16384,
+        connect_timeout: float = 120.0,
+        request_timeout: float = 60.0
+    ):
+        self.addresses = addresses
+        self.authkey = authkey
+        self.slots = slots
+        self.slot_rows = slot_rows
+        self.output_row_bytes = output_row_bytes
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self._connections: Dict[str, ServerConnection] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.images = 0
+        self.retries = 0
+        self.reconnects = 0
+
+    def _try_connect(self, address: str) -> Optional[ServerConnection]:
+        connection = self._connections.get(address)
+        if connection is not None and not connection.closed:
+            return connection
+        try:
+            fresh = ServerConnection(address, self.authkey, self.slots, self.slot_rows, self.output_row_bytes)
+        except (OSError, EOFError):
+            # Not listening yet, or it died during the handshake
+            return None
+        fresh.request("attach", fresh.ring.layout, self.request_timeout)
+        if connection is not None:
+            connection.close()
+            self.reconnects += 1
+        self._connections[address] = fresh
+        return fresh
+
+    def _connection(self, address: Optional[str] = None) -> ServerConnection:
+        """A live connection to `address`, or else the least busy live one; waits for a server to come up."""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            with self._lock:
+                live = [connection for connection in map(self._try_connect, [address] if address else self.addresses)
+                        if connection is not None]
+            if live:
+                return min(live, key=lambda connection: connection.in_flight)
+            if time.monotonic() > deadline:
+                raise ConnectionError(f"No model server listening on {address or ', '.join(self.addresses)}")
+            # Outside the lock, so callers with a live connection aren't held up
+            time.sleep(0.5)
+
+    def load(self, key: str, config: tuple) -> List[dict]:
+        """Loads (and warms) the model on every server process; returns what each one loaded."""
+        return [
+            self._connection(address).request("load", (key, config), self.connect_timeout)
+            for address in self.addresses
+        ]
+
+    def _predict_chunk(self, op: str, key: str, config: tuple, batch: np.ndarray) -> List[Optional[np.ndarray]]:
+        try:
+            return self._connection().predict(op, key, config, batch, self.request_timeout)
+        except ConnectionError:
+            # The server went away mid-request; inference is idempotent, so retry on a live one
+            self.retries += 1
+            return self._connection().predict(op, key, config, batch, self.request_timeout)
+
+    def predict(self, op: str, key: str, config: tuple, batch: np.ndarray) -> List[Optional[np.ndarray]]:
+        self.requests += 1
+        self.images += len(batch)
+        chunks = [
+            self._predict_chunk(op, key, config, batch[start:start + self.slot_rows])
+            for start in range(0, len(batch), self.slot_rows)
+        ]
+        if len(chunks) == 1:
+            return chunks[0]
+        return [
+            np.concatenate(arrays) if arrays[0] is not None else None
+            for arrays in zip(*chunks)
+        ]
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "servers": len(self.addresses),
+            "connected": sum(1 for connection in self._connections.values() if not connection.closed),
+            "in_flight": sum(connection.in_flight for connection in self._connections.values()),
+            "requests": self.requests,
+            "images": self.images,
+            "retries": self.retries,
+            "reconnects": self.reconnects
+        }
+
+
+class RemoteBackend(InferenceBackend):
+    """Stands in for a model backend in a web worker; the model itself lives in the model server."""
+
+    def __init__(self, client: ModelServerClient, key: str, config: tuple):
+        self.client = client
+        self.key = key
+        self.config = config
+        self.name, self.artifact_path, self.num_threads, self.precision = config
+
+    def load(self):
+        loaded = self.client.load(self.key, self.config)
+        self.artifact_path = loaded[0]["artifact"]
+
+    def warmup(self, batch_size: int = 1):
+        # The server warmed the model when it loaded it
+        pass
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.client.predict("predict", self.key, self.config, batch)[0]
+
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        probabilities, embeddings = self.client.predict("predict_with_embeddings", self.key, self.config, batch)
+        return probabilities, embeddings
+
+
+def model_server_authkey() -> bytes:
+    from app.config import settings
+    return (settings.MODEL_SERVER_AUTHKEY or settings.JWT_SECRET_KEY).encode()
+
+
+def create_model_server_client() -> Optional[ModelServerClient]:
+    """The web worker's client when MODEL_SERVER_SOCKET is set, else None (models load in-process)."""
+    from app.config import settings
+    if not settings.MODEL_SERVER_SOCKET:
+        return None
+    return ModelServerClient(
+        server_addresses(settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_PROCESSES),
+        model_server_authkey(),
+        slots=settings.MODEL_SERVER_RING_SLOTS,
+        slot_rows=settings.INFERENCE_MAX_BATCH_SIZE,
+        output_row_bytes=settings.MODEL_SERVER_OUTPUT_ROW_BYTES,
+        connect_timeout=settings.MODEL_SERVER_CONNECT_TIMEOUT_SECONDS,
+        request_timeout=settings.MODEL_SERVER_REQUEST_TIMEOUT_SECONDS
+    )
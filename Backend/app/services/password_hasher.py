@@ -0,0 +1,84 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.services.executor import PoolStats, timed_call
+from app.utils.telemetry import stage
+
+# Hashes created with a different cost factor are flagged by needs_update and rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL) so hashing
+    never blocks the event loop or competes with the inference pools.
+
+    At most `max_workers + max_queue` operations may be waiting; beyond that callers
+    get a 503 with Retry-After instead of piling up behind a login storm.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, max_queue: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.stats = PoolStats("bcrypt", max_workers)
+        self.rejected = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="derma-bcrypt")
+        return self.pool
+
+    async def _run(self, fn, *args):
+        if self.stats.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in attempts right now. Please try again shortly.",
+                headers={"Retry-After": "2"}
+            )
+
+        self.stats.submitted += 1
+        loop = asyncio.get_running_loop()
+        try:
+            with stage("password_hash"):
+                result, waited, ran = await loop.run_in_executor(self._pool(), timed_call, fn, time.time(), *args)
+        except Exception:
+            self.stats.failed += 1
+            raise
+        self.stats.completed += 1
+        self.stats.total_wait_seconds += waited
+        self.stats.total_run_seconds += ran
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated settings."""
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def metrics(self) -> dict:
+        return {**self.stats.as_dict(), "rejected": self.rejected, "rounds": settings.BCRYPT_ROUNDS}
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
@@ -0,0 +1,147 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from pymongo.collection import Collection
+
+from app.config import settings
+from app.models.user_model import db
+from app.utils.ttl_cache import TTLCache
+
+
+def content_key(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def model_cache_key(model_key: str, image_key: str) -> str:
+    # Each model version caches its own predictions for the same image
+    return f"{model_key}/{image_key}"
+
+
+class PredictionCache:
+    """
+    Caches prediction results (disease, confidence, image_url) by model and upload content hash.
+
+    Lookups go to an in-memory LRU with TTL first, then to an optional Mongo collection
+    shared by every worker. An optional perceptual-hash tier matches near-duplicate
+    images (re-encoded or resized copies) held in the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl_seconds: int,
+        collection: Optional[Collection] = None,
+        use_phash: bool = False,
+        phash_distance: int = 4
+    ):
+        self.memory = TTLCache(maxsize, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self.use_phash = use_phash
+        self.phash_distance = phash_distance
+        self._phashes = {}
+        self._namespaces = set()
+        self.mongo_hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        if self.collection is not None:
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            await self.collection.create_index("image_key")
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry
+
+        if self.collection is not None:
+            doc = await self.collection.find_one({"_id": key})
+            if doc is not None:
+                self.mongo_hits += 1
+                entry = {
+                    "disease": doc["disease"],
+                    "confidence": doc["confidence"],
+                    "image_url": doc.get("image_url"),
+                    "image_key": doc.get("image_key", key),
+                    "thumbnail_url": doc.get("thumbnail_url"),
+                    "embedding": doc.get("embedding")
+                }
+                self.memory.set(key, entry)
+                return entry
+
+        if not self.use_phash:
+            self.misses += 1
+        return None
+
+    def get_similar(self, phash: int, namespace: str = "") -> Optional[dict]:
+        """Returns the closest in-memory entry under `namespace` within `phash_distance` bits, if any."""
+        best_key, best_distance = None, self.phash_distance + 1
+        prefix = f"{namespace}/" if namespace else ""
+        for key, other in list(self._phashes.items()):
+            if not key.startswith(prefix):
+                continue
+            distance = (phash ^ other).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+
+        entry = self.memory.peek(best_key) if best_key is not None else None
+        if entry is None:
+            if best_key is not None:
+                self._phashes.pop(best_key, None)
+            self.misses += 1
+            return None
+        self.phash_hits += 1
+        return entry
+
+    async def set(self, key: str, entry: dict, phash: Optional[int] = None):
+        self.memory.set(key, entry)
+        if "/" in key:
+            self._namespaces.add(key.rsplit("/", 1)[0])
+        if phash is not None:
+            self._phashes[key] = phash
+            # Drop hashes whose entries were evicted from the LRU
+            if len(self._phashes) > self.memory.maxsize:
+                self._phashes = {k: v for k, v in self._phashes.items() if k in self.memory}
+
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {**entry, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+    async def update_image_url(self, image_key: str, image_url: str):
+        """Sets the uploaded URL on every model's entry for the image."""
+        for key in [image_key] + [model_cache_key(namespace, image_key) for namespace in self._namespaces]:
+            entry = self.memory.peek(key)
+            if entry is not None:
+                entry["image_url"] = image_url
+        if self.collection is not None:
+            await self.collection.update_many({"image_key": image_key}, {"$set": {"image_url": image_url}})
+
+    def metrics(self) -> dict:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.mongo_hits + self.phash_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "misses": self.misses,
+            "memory_hits": memory["hits"],
+            "mongo_hits": self.mongo_hits,
+            "phash_hits": self.phash_hits,
+            "evictions": memory["evictions"] + memory["expirations"],
+            "size": memory["size"],
+            "maxsize": memory["maxsize"],
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+
+prediction_cache = PredictionCache(
+    maxsize=settings.PREDICTION_CACHE_SIZE,
+    ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+    collection=db.prediction_cache if settings.PREDICTION_CACHE_MONGO else None,
+    use_phash=settings.PREDICTION_CACHE_PHASH,
+    phash_distance=settings.PREDICTION_CACHE_PHASH_DISTANCE
+)
@@ -1,80 +1,484 @@
 from fastapi import UploadFile, HTTPException
 from pymongo.database import Database
+from contextlib import AsyncExitStack
 from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import asyncio
+import json
+import time
 import numpy as np
-from tensorflow import keras
-import tensorflow_hub as hub
-from app.utils.image_utils import preprocess_image
-from app.utils.cloudinary_helper import upload_to_cloudinary
+from app.utils.image_utils import (
+    preprocess_image, preprocess_image_with_thumbnail, preprocess_batch, preprocess_batch_with_thumbnails,
+    perceptual_hash, ImageValidationError
+)
 from app.models.schema import PredictionHistory
+from app.services.batch_scheduler import KeyedBatchScheduler
+from app.services.executor import pools
+from app.services.model_loader import predict_batch, predict_with_embeddings
+from app.services.model_registry import ModelSpec, model_registry
+from app.services.prediction_cache import prediction_cache, content_key, model_cache_key
+from app.services.upload_queue import upload_queue, storage
+from app.services.id_allocator import history_id_allocator
+from app.services.admission import inference_admission
+from app.services.tta import tta
+from app.services.embedding_index import embedding_index, encode_embedding
+from app.services.thumbnails import thumbnail_store
+from app.utils.telemetry import stage, MODEL_BATCH_SIZE
+from app.config import settings
+
+
 
-# Recreate the model architecture and load only the weights
-feature_extractor_url = "https://tfhub.dev/google/tf2-preview/mobilenet_v2/feature_vector/4"
-feature_extractor_layer = hub.KerasLayer(
-    feature_extractor_url,
-    input_shape=(224, 224, 3),
-    trainable=False
+def _model_outputs(batch: np.ndarray, key: str, config: tuple):
+    """Runs a batch in the CPU pool; with embeddings on it resolves to (probabilities, embeddings)."""
+    if embedding_index.enabled:
+        return pools.run_cpu(predict_with_embeddings, batch, key, config)
+    return pools.run_cpu(predict_batch, batch, key, config)
+
+
+scheduler = KeyedBatchScheduler(
+    predict_fn=_model_outputs,
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    max_concurrent_batches=max(settings.CPU_POOL_WORKERS, 1)
 )
 
-model = keras.Sequential([
-    feature_extractor_layer,
-    keras.layers.Dense(8, activation='softmax')
-])
+_shadow_tasks = set()
+
+
+def resolve_model(requested: Optional[str] = None) -> ModelSpec:
+    try:
+        return model_registry.resolve(requested)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+
+def _to_prediction(probabilities: np.ndarray, model: ModelSpec):
+    predicted_class_index = np.argmax(probabilities)
+    return model.class_names[predicted_class_index], float(np.max(probabilities) * 100)
+
+
+async def _run_shadow(shadow: ModelSpec, batch: np.ndarray, primary: np.ndarray):
+    stats = model_registry.stats_for(shadow)
+    started_at = time.perf_counter()
+    try:
+        with stage("shadow_inference"):
+            rows = await pools.run_cpu(predict_batch, batch, shadow.key, shadow.config)
+    except Exception as e:
+        stats.failed += 1
+        print(f"Shadow model {shadow.key} failed: {str(e)}")
+        return
+    stats.record(primary, rows, time.perf_counter() - started_at)
+
+
+def _maybe_shadow(model: ModelSpec, batch: np.ndarray, primary: np.ndarray):
+    """Runs the shadow model on a sample of traffic in the background; never delays the response."""
+    shadow = model_registry.shadow_for(model)
+    if shadow is None:
+        return
+    stats = model_registry.stats_for(shadow)
+    if len(_shadow_tasks) >= settings.SHADOW_MAX_PENDING:
+        stats.skipped += 1
+        return
+    stats.sampled += 1
+    task = asyncio.create_task(_run_shadow(shadow, batch, primary))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+async def _lookup_cache(image_bytes: bytes, model: ModelSpec):
+    """Returns (image_key, cached entry or None, perceptual hash or None)."""
+    with stage("cache_lookup"):
+        image_key = await pools.run_io(content_key, image_bytes)
+        cached = await prediction_cache.get(model_cache_key(model.key, image_key))
+
+    phash = None
+    if cached is None and prediction_cache.use_phash:
+        try:
+            phash = await pools.run_cpu(perceptual_hash, image_bytes)
+        except ValueError:
+            prediction_cache.misses += 1
+            return image_key, None, None
+        similar = prediction_cache.get_similar(phash, model.key)
+        if similar is not None:
+            # Only the prediction carries over: the near-duplicate may be another user's
+            # upload, so this image keeps its own key and is stored and uploaded itself
+            cached = {
+                "disease": similar["disease"],
+                "confidence": similar["confidence"],
+                "image_url": None,
+                "image_key": image_key,
+                "thumbnail_url": None,
+                "embedding": None
+            }
+            await prediction_cache.set(model_cache_key(model.key, image_key), dict(cached), phash)
+    return image_key, cached, phash
+
+
+def _from_cache(image_key: str, cached: dict) -> dict:
+    return {
+        "disease": cached["disease"],
+        "confidence": cached["confidence"],
+        "image_url": cached["image_url"],
+        "image_key": cached.get("image_key", image_key),
+        "thumbnail_url": cached.get("thumbnail_url"),
+        "embedding": cached.get("embedding")
+    }
 
-model.load_weights("models/my_model_weights.h5")
 
-CLASS_NAMES = [
-    'Cellulitis', 'Impetigo', 'Athlete Foot', 'Nail Fungus',
-    'Ringworm', 'Cutaneous Larva Migrans', 'Chickenpox', 'Shingles'
-]
+def _history_doc(history_id: int, user_id: int, result: dict, timestamp: datetime, model: ModelSpec) -> dict:
+    history_entry = PredictionHistory(
+        _id=history_id,
+        user_id=user_id,
+        disease=result["disease"],
+        confidence=result["confidence"],
+        image_url=result["image_url"],
+        thumbnail_url=result.get("thumbnail_url"),
+        model=model.key,
+        timestamp=timestamp
+    )
+    history_doc = history_entry.dict(by_alias=True)
+    # Stored alongside the row for similar-case search; never part of the API response
+    if result.get("embedding") is not None:
+        history_doc["embedding"] = result["embedding"]
+    return history_doc
+
+
+def _index_embeddings(history_docs: List[dict], model: ModelSpec):
+    docs = [doc for doc in history_docs if "embedding" in doc]
+    if docs:
+        embedding_index.add(
+            model.key,
+            [doc["_id"] for doc in docs],
+            [doc["user_id"] for doc in docs],
+            [doc["embedding"] for doc in docs]
+        )
+
+
+async def _reserve_history_ids(count: int) -> List[int]:
+    # IDs come from a block leased off the counters collection; at most one $inc per call
+    with stage("reserve_ids"):
+        return await history_id_allocator.allocate(count)
+
+
+async def _queue_upload(image_key: str, image_bytes: bytes, image_url: Optional[str], history_id: Optional[int]):
+    # The upload runs in the background; the history entry is patched once it lands
+    if image_url is None and not upload_queue.attach(image_key, history_id):
+        await upload_queue.enqueue(image_key, image_bytes, history_id)
+
+
+async def _preprocess(image_bytes: bytes):
+    """Returns (model input, thumbnail or None); the thumbnail reuses the decode done for the model."""
+    with stage("preprocess"):
+        if thumbnail_store.enabled:
+            return await pools.run_cpu(
+                preprocess_image_with_thumbnail, image_bytes, thumbnail_store.size, thumbnail_store.quality)
+        return await pools.run_cpu(preprocess_image, image_bytes), None
+
+
+async def _preprocess_batch(images: List[bytes]):
+    """Returns (batch, errors, thumbnails), with a None thumbnail for every failed image."""
+    with stage("preprocess"):
+        if thumbnail_store.enabled:
+            return await pools.run_cpu(
+                preprocess_batch_with_thumbnails, images, thumbnail_store.size, thumbnail_store.quality)
+        batch, errors = await pools.run_cpu(preprocess_batch, images)
+        return batch, errors, [None] * len(images)
+
+
+async def _predict_image(image_bytes: bytes, model: ModelSpec) -> dict:
+    """
+    Classifies one image with `model` through the cache and the batch scheduler.
+
+    Returns the disease, confidence, image_url (None until uploaded), thumbnail_url and
+    the storage key of the image; raises ImageValidationError for unreadable uploads.
+    """
+    image_key, cached, phash = await _lookup_cache(image_bytes, model)
+    if cached is not None:
+        return _from_cache(image_key, cached)
+
+    preprocessed_image, thumbnail = await _preprocess(image_bytes)
+    with stage("inference"):
+        prediction = await scheduler.predict(preprocessed_image, model.key, model.config)
+    embedding = None
+    if isinstance(prediction, tuple):
+        prediction, embedding = prediction
+    _maybe_shadow(model, preprocessed_image, prediction[None])
+    prediction = (await tta.refine(model, preprocessed_image, prediction[None]))[0]
+    predicted_class_name, confidence = _to_prediction(prediction, model)
+    entry = {
+        "disease": predicted_class_name,
+        "confidence": confidence,
+        "image_url": None,
+        "image_key": image_key,
+        "thumbnail_url": await thumbnail_store.add(image_key, thumbnail) if thumbnail is not None else None,
+        "embedding": encode_embedding(embedding) if embedding is not None else None
+    }
+    await prediction_cache.set(model_cache_key(model.key, image_key), dict(entry), phash)
+    return entry
 
 
 async def predict_and_save(
     file: UploadFile,
     db: Database,
-    user_id: int = None
+    user_id: int = None,
+    model_name: Optional[str] = None,
+    base_url: str = ""
 ):
     """
-    Preprocesses an image, gets a prediction from the model,
-    uploads the image to Cloudinary, and saves the result to the database if a user is logged in.
+    Preprocesses an image, gets a prediction from the requested (or default) model,
+    saves the result to the database if a user is logged in, and queues the image upload.
+    Re-uploads of a cached image skip inference and the upload.
     """
-    image_bytes = await file.read()
-    preprocessed_image = preprocess_image(image_bytes)
-    prediction = model.predict(preprocessed_image)
-    predicted_class_index = np.argmax(prediction)
-    predicted_class_name = CLASS_NAMES[predicted_class_index]
-    confidence = np.max(prediction) * 100
+    model = resolve_model(model_name)
+    # FastAPI has already spooled the body, within BodySizeLimitMiddleware's limit, by now;
+    # admitting first only spares shed requests the copy into bytes
+    async with inference_admission.admit():
+        with stage("read_upload"):
+            image_bytes = await file.read()
+        try:
+            result = await _predict_image(image_bytes, model)
+        except ImageValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    try:
-        image_url = upload_to_cloudinary(image_bytes)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to upload image: {str(e)}")
+    predicted_class_name = result["disease"]
+    confidence = result["confidence"]
+    image_url = result["image_url"]
+    image_key = result["image_key"]
 
+    if image_url is None and not settings.DEFERRED_UPLOADS and not upload_queue.attach(image_key):
+        try:
+            with stage("upload"):
+                image_url = await pools.run_io(storage.save, image_bytes, image_key)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Failed to upload image: {str(e)}")
+        await prediction_cache.update_image_url(image_key, image_url)
+
+    history_id = None
     if user_id:
         try:
-            sequence_doc = await db.counters.find_one_and_update(
-                {'_id': 'history_id'},
-                {'$inc': {'sequence_value': 1}},
-                upsert=True,
-                return_document=True
-            )
-            history_id = sequence_doc['sequence_value']
-
-            history_entry = PredictionHistory(
-                _id=history_id,
-                user_id=user_id,
-                disease=predicted_class_name,
-                confidence=confidence,
-                image_url=image_url,
-                timestamp=datetime.utcnow()
-            )
-            await db.history.insert_one(history_entry.dict(by_alias=True))
+            history_id = (await _reserve_history_ids(1))[0]
+            history_doc = _history_doc(history_id, user_id, {**result, "image_url": image_url}, datetime.utcnow(), model)
+            with stage("history_insert"):
+                await db.history.insert_one(history_doc)
+            _index_embeddings([history_doc], model)
         except Exception as e:
+            history_id = None
             print(f"Error saving history: {str(e)}")
 
+    await _queue_upload(image_key, image_bytes, image_url, history_id)
+
     return {
         "disease": predicted_class_name,
         "confidence": confidence,
-        "image_url": image_url
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_store.public_url(result["thumbnail_url"], base_url),
+        "model": model.metadata()
+    }
+
+
+async def predict_batch_and_save(
+    files: List[UploadFile],
+    db: Database,
+    user_id: int = None,
+    model_name: Optional[str] = None,
+    base_url: str = ""
+):
+    """
+    Predicts several images with one vectorized preprocessing and inference pass.
+
+    History IDs for the whole batch are reserved in one call to the ID allocator and
+    written with one insert_many. Results come back in upload order; images that
+    fail are reported individually without failing the rest of the batch.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"A batch can contain at most {settings.MAX_BATCH_FILES} images.")
+
+    model = resolve_model(model_name)
+    async with inference_admission.admit(len(files)):
+        with stage("read_upload"):
+            images = [await file.read() for file in files]
+        lookups = await asyncio.gather(*[_lookup_cache(image_bytes, model) for image_bytes in images])
+
+        results = [None] * len(images)
+        misses = []
+        for index, (image_key, cached, phash) in enumerate(lookups):
+            if cached is not None:
+                results[index] = _from_cache(image_key, cached)
+            else:
+                misses.append(index)
+
+        if misses:
+            batch, errors, thumbnails = await _preprocess_batch([images[i] for i in misses])
+            valid = [position for position, error in enumerate(errors) if error is None]
+            for position, error in enumerate(errors):
+                if error is not None:
+                    results[misses[position]] = {"error": str(error)}
+
+            if valid:
+                MODEL_BATCH_SIZE.labels("batch_endpoint").observe(len(valid))
+                try:
+                    with stage("inference"):
+                        outputs = await _model_outputs(batch[valid], model.key, model.config)
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+                probabilities, embeddings = outputs if isinstance(outputs, tuple) else (outputs, None)
+                _maybe_shadow(model, batch[valid], probabilities)
+                probabilities = await tta.refine(model, batch[valid], probabilities)
+
+                for offset, (position, row) in enumerate(zip(valid, probabilities)):
+                    index = misses[position]
+                    image_key, _, phash = lookups[index]
+                    predicted_class_name, confidence = _to_prediction(row, model)
+                    thumbnail_url = None
+                    if thumbnails[position] is not None:
+                        thumbnail_url = await thumbnail_store.add(image_key, thumbnails[position])
+                    entry = {
+                        "disease": predicted_class_name,
+                        "confidence": confidence,
+                        "image_url": None,
+                        "image_key": image_key,
+                        "thumbnail_url": thumbnail_url,
+                        "embedding": encode_embedding(embeddings[offset]) if embeddings is not None else None
+                    }
+                    await prediction_cache.set(model_cache_key(model.key, image_key), dict(entry), phash)
+                    results[index] = entry
+
+    succeeded = [index for index, result in enumerate(results) if "error" not in result]
+
+    history_ids = {}
+    if user_id and succeeded:
+        try:
+            reserved = await _reserve_history_ids(len(succeeded))
+            timestamp = datetime.utcnow()
+            history_docs = [
+                _history_doc(history_id, user_id, results[index], timestamp, model)
+                for index, history_id in zip(succeeded, reserved)
+            ]
+            with stage("history_insert"):
+                await db.history.insert_many(history_docs, ordered=False)
+            history_ids = dict(zip(succeeded, reserved))
+            _index_embeddings(history_docs, model)
+        except Exception as e:
+            print(f"Error saving history: {str(e)}")
+
+    response = []
+    for index, (file, result) in enumerate(zip(files, results)):
+        item = {"index": index, "filename": file.filename}
+        if "error" in result:
+            response.append({**item, "status": "failed", "error": result["error"]})
+            continue
+        history_id = history_ids.get(index)
+        await _queue_upload(result["image_key"], images[index], result["image_url"], history_id)
+        response.append({
+            **item,
+            "status": "ok",
+            "id": history_id,
+            "disease": result["disease"],
+            "confidence": result["confidence"],
+            "image_url": result["image_url"],
+            "thumbnail_url": thumbnail_store.public_url(result["thumbnail_url"], base_url)
+        })
+
+    return {
+        "results": response,
+        "succeeded": len(succeeded),
+        "failed": len(images) - len(succeeded),
+        "model": model.metadata()
     }
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_batch_predictions(
+    files: List[UploadFile],
+    db: Database,
+    user_id: int = None,
+    model_name: Optional[str] = None,
+    base_url: str = ""
+) -> AsyncIterator[str]:
+    """
+    Reads the uploads and returns a Server-Sent-Events stream with one `prediction`
+    event per image as soon as it is classified, followed by a `complete` event.
+
+    The stream is admitted like /batch, for all its images at once, and holds that
+    admission until the last image is classified. Images go through the shared batch
+    scheduler, so concurrent streams still share forward passes. History IDs are
+    reserved only for images that succeed; the rows are written with one insert_many
+    before `complete`.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"A batch can contain at most {settings.MAX_BATCH_FILES} images.")
+
+    model = resolve_model(model_name)
+    filenames = [file.filename for file in files]
+    async with AsyncExitStack() as stack:
+        # Shed streams get their 503 here, before the response starts
+        await stack.enter_async_context(inference_admission.admit(len(files)))
+        # Read everything up front: the uploads are closed once the endpoint returns
+        with stage("read_upload"):
+            images = [await file.read() for file in files]
+        # Handed to the stream, which releases it once the predictions are done
+        admission = stack.pop_all()
+
+    async def predict_one(index: int):
+        try:
+            return index, await _predict_image(images[index], model)
+        except ImageValidationError as e:
+            return index, {"error": str(e)}
+
+    async def events():
+        timestamp = datetime.utcnow()
+        history_docs = []
+        uploads = []
+        succeeded = 0
+
+        try:
+            for completed in asyncio.as_completed([predict_one(i) for i in range(len(images))]):
+                index, result = await completed
+                item = {"index": index, "filename": filenames[index]}
+                if "error" in result:
+                    yield _sse_event("prediction", {**item, "status": "failed", "error": result["error"]})
+                    continue
+
+                succeeded += 1
+                history_id = None
+                if user_id:
+                    history_id = (await _reserve_history_ids(1))[0]
+                    history_docs.append(_history_doc(history_id, user_id, result, timestamp, model))
+                uploads.append((result["image_key"], images[index], result["image_url"], history_id))
+                yield _sse_event("prediction", {
+                    **item,
+                    "status": "ok",
+                    "id": history_id,
+                    "disease": result["disease"],
+                    "confidence": result["confidence"],
+                    "image_url": result["image_url"],
+                    "thumbnail_url": thumbnail_store.public_url(result["thumbnail_url"], base_url)
+                })
+        finally:
+            await admission.aclose()
+
+        if history_docs:
+            try:
+                with stage("history_insert"):
+                    await db.history.insert_many(history_docs, ordered=False)
+                _index_embeddings(history_docs, model)
+            except Exception as e:
+                print(f"Error saving history: {str(e)}")
+
+        # Queued only after the rows exist so the upload can patch their image_url
+        for upload in uploads:
+            await _queue_upload(*upload)
+
+        yield _sse_event("complete", {
+            "succeeded": succeeded,
+            "failed": len(images) - succeeded,
+            "model": model.metadata()
+        })
+
+    return events()
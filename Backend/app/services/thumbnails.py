@@ -0,0 +1,114 @@
+import hashlib
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.services.executor import pools
+from app.services.upload_queue import upload_queue
+from app.utils.telemetry import stage
+from app.utils.ttl_cache import TTLCache
+
+# Where app.api.thumbnails is mounted
+THUMBNAIL_PATH = "/api/thumbnails"
+
+
+def thumbnail_etag(data: bytes) -> str:
+    # Strong validator: derived from the exact bytes served
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+class ThumbnailStore:
+    """
+    Small WebP thumbnails made at prediction time from the image already decoded for
+    the model, so listing pages never download or resize the full upload.
+
+    A thumbnail is stored next to its image as `<image_key>_thumb` through the upload
+    queue. Reads go to an in-memory LRU first, then to a still-pending upload, then to
+    storage. Image keys are content hashes, so a thumbnail never changes once made.
+
+    History rows and the prediction cache keep the relative `/api/thumbnails/<key>` path;
+    `public_url` makes it absolute (against `base_url`, or else the request's own base
+    URL) only when a response is built, so stored links survive a change of host.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        maxsize: int = 2048,
+        enabled: bool = True,
+        size: int = 256,
+        quality: int = 80
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.enabled = enabled
+        self.size = size
+        self.quality = quality
+        # Entries never go stale; the TTL only has to outlive the LRU
+        self.memory = TTLCache(maxsize, ttl_seconds=settings.THUMBNAIL_MAX_AGE_SECONDS)
+        self.created = 0
+        self.storage_reads = 0
+        self.not_found = 0
+
+    @staticmethod
+    def key(image_key: str) -> str:
+        return f"{image_key}_thumb"
+
+    @staticmethod
+    def path(image_key: str) -> str:
+        return f"{THUMBNAIL_PATH}/{image_key}"
+
+    def public_url(self, stored: Optional[str], request_base_url: str = "") -> Optional[str]:
+        """The absolute URL for a stored thumbnail path; rows written with absolute URLs pass through."""
+        if not stored or not stored.startswith("/"):
+            return stored
+        return (self.base_url or request_base_url).rstrip("/") + stored
+
+    def with_public_url(self, doc: dict, request_base_url: str = "") -> dict:
+        if not doc.get("thumbnail_url"):
+            return doc
+        return {**doc, "thumbnail_url": self.public_url(doc["thumbnail_url"], request_base_url)}
+
+    async def add(self, image_key: str, data: bytes) -> str:
+        """Keeps a freshly made thumbnail in memory, queues it for storage and returns its path."""
+        if self.memory.peek(image_key) is None:
+            self.memory.set(image_key, (data, thumbnail_etag(data)))
+            self.created += 1
+            await upload_queue.enqueue(self.key(image_key), data, derivative=True)
+        return self.path(image_key)
+
+    async def get(self, image_key: str) -> Optional[Tuple[bytes, str]]:
+        """Returns (webp bytes, etag), or None when no thumbnail was made for the image."""
+        cached = self.memory.get(image_key)
+        if cached is not None:
+            return cached
+
+        data = upload_queue.pending_data(self.key(image_key))
+        if data is None:
+            try:
+                with stage("thumbnail_load"):
+                    data = await pools.run_io(upload_queue.storage.load, self.key(image_key))
+                self.storage_reads += 1
+            except FileNotFoundError:
+                self.not_found += 1
+                return None
+
+        entry = (data, thumbnail_etag(data))
+        self.memory.set(image_key, entry)
+        return entry
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "created": self.created,
+            "storage_reads": self.storage_reads,
+            "not_found": self.not_found,
+            "memory": self.memory.stats()
+        }
+
+
+thumbnail_store = ThumbnailStore(
+    settings.THUMBNAIL_BASE_URL,
+    maxsize=settings.THUMBNAIL_CACHE_SIZE,
+    enabled=settings.THUMBNAILS_ENABLED,
+    size=settings.THUMBNAIL_SIZE,
+    quality=settings.THUMBNAIL_QUALITY
+)
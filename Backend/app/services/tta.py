@@ -0,0 +1,77 @@
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.executor import pools
+from app.services.model_loader import predict_augmented
+from app.utils.image_utils import TTA_AUGMENTATIONS
+from app.utils.telemetry import stage
+
+
+class TestTimeAugmentation:
+    """
+    Adaptive test-time augmentation for low-confidence predictions.
+
+    When the top class of a first-pass prediction scores under `threshold` percent, the
+    image is re-run as `views - 1` augmented copies (flips, small rotations, a centred
+    crop) in a single batched forward pass, and the softmax rows of all `views` are
+    averaged. Confident predictions pay nothing, so the average cost stays close to a
+    single pass while borderline cases get a more stable answer.
+    """
+
+    def __init__(self, enabled: bool = False, views: int = 8, threshold: float = 60.0):
+        self.enabled = enabled
+        self.views = max(2, min(views, len(TTA_AUGMENTATIONS) + 1))
+        self.threshold = threshold
+        self.evaluated = 0
+        self.triggered = 0
+        self.changed = 0
+        self.extra_forward_images = 0
+        self.total_extra_seconds = 0.0
+
+    async def refine(self, model, batch: np.ndarray, probabilities: np.ndarray) -> np.ndarray:
+        """Returns `probabilities` with the low-confidence rows replaced by their TTA average."""
+        self.evaluated += len(probabilities)
+        if not self.enabled:
+            return probabilities
+        low = np.max(probabilities, axis=1) * 100 < self.threshold
+        if not low.any():
+            return probabilities
+
+        started_at = time.perf_counter()
+        with stage("tta"):
+            augmented = await pools.run_cpu(
+                predict_augmented, batch[low], self.views - 1, model.key, model.config)
+        count = int(low.sum())
+        refined = np.array(probabilities, copy=True)
+        # The first pass counts as the un-augmented view
+        refined[low] = (probabilities[low] + augmented * (self.views - 1)) / self.views
+
+        self.triggered += count
+        self.extra_forward_images += count * (self.views - 1)
+        self.total_extra_seconds += time.perf_counter() - started_at
+        self.changed += int(np.sum(np.argmax(refined[low], axis=1) != np.argmax(probabilities[low], axis=1)))
+        return refined
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "views": self.views,
+            "threshold": self.threshold,
+            "evaluated": self.evaluated,
+            "triggered": self.triggered,
+            "trigger_rate": self.triggered / self.evaluated if self.evaluated else 0.0,
+            "changed_predictions": self.changed,
+            "extra_forward_images": self.extra_forward_images,
+            "avg_extra_ms_per_triggered": (self.total_extra_seconds / self.triggered * 1000.0) if self.triggered else 0.0,
+            "avg_extra_ms_per_image": (self.total_extra_seconds / self.evaluated * 1000.0) if self.evaluated else 0.0
+        }
+
+
+tta = TestTimeAugmentation(
+    enabled=settings.TTA_ENABLED,
+    views=settings.TTA_VIEWS,
+    threshold=settings.TTA_CONFIDENCE_THRESHOLD
+)
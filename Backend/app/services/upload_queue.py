@@ -0,0 +1,206 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from pymongo.collection import Collection
+
+from app.config import settings
+from app.models.user_model import db
+from app.services.executor import pools
+from app.services.prediction_cache import prediction_cache
+from app.utils.storage import StorageBackend, get_storage_backend
+from app.utils.telemetry import stage
+
+
+class UploadJob:
+    def __init__(self, key: str, data: bytes, history_id: Optional[int] = None, derivative: bool = False):
+        self.key = key
+        self.data = data
+        self.history_ids: List[int] = [history_id] if history_id is not None else []
+        # Derivatives (thumbnails) have no URL of their own to patch into history or the cache
+        self.derivative = derivative
+        self.attempts = 0
+
+
+class UploadQueue:
+    """
+    Uploads images in the background so predictions can return as soon as inference is done.
+
+    Jobs are drained in batches from a bounded queue, retried with exponential backoff,
+    and once an upload lands the `image_url` of every history entry waiting on it is
+    patched along with the prediction cache.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        collection: Collection,
+        maxsize: int = 256,
+        batch_size: int = 8,
+        max_retries: int = 5,
+        backoff_seconds: float = 0.5,
+        drain_timeout_seconds: float = 30.0
+    ):
+        self.storage = storage
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.drain_timeout_seconds = drain_timeout_seconds
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Dict[str, UploadJob] = {}
+        self.uploaded = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        # Jobs still queued when a worker stopped are picked up by its replacement
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, drain: bool = True):
+        if self._worker is None:
+            return
+        if drain:
+            try:
+                await asyncio.wait_for(self._queue.join(), self.drain_timeout_seconds)
+            except asyncio.TimeoutError:
+                print(f"Upload queue not drained after {self.drain_timeout_seconds}s; "
+                      f"{len(self._pending)} uploads abandoned")
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def enqueue(
+        self,
+        key: str,
+        data: bytes,
+        history_id: Optional[int] = None,
+        derivative: bool = False
+    ) -> UploadJob:
+        """Queues `data` for upload; waits for room when the queue is full."""
+        self.start()
+        job = self._pending.get(key)
+        if job is not None:
+            if history_id is not None:
+                job.history_ids.append(history_id)
+            return job
+        job = UploadJob(key, data, history_id, derivative)
+        self._pending[key] = job
+        await self._queue.put(job)
+        return job
+
+    def attach(self, key: str, history_id: Optional[int] = None) -> bool:
+        """Links a history entry to an upload that is still pending for `key`, if there is one."""
+        job = self._pending.get(key)
+        if job is None:
+            return False
+        if history_id is not None:
+            job.history_ids.append(history_id)
+        return True
+
+    def pending_data(self, key: str) -> Optional[bytes]:
+        """The bytes of an upload still queued for `key`, so readers don't have to wait for storage."""
+        job = self._pending.get(key)
+        return job.data if job is not None else None
+
+    async def _upload(self, job: UploadJob) -> Optional[str]:
+        while True:
+            job.attempts += 1
+            try:
+                with stage("upload"):
+                    return await pools.run_io(self.storage.save, job.data, job.key)
+            except Exception as e:
+                if job.attempts > self.max_retries:
+                    self.failed += 1
+                    print(f"Error uploading image {job.key}: {str(e)}")
+                    return None
+                self.retried += 1
+                await asyncio.sleep(self.backoff_seconds * 2 ** (job.attempts - 1))
+
+    def _forget(self, job: UploadJob):
+        # Only this job's entry: a newer job for the same key may already be pending
+        if self._pending.get(job.key) is job:
+            del self._pending[job.key]
+
+    async def _complete(self, job: UploadJob, url: Optional[str]):
+        self._forget(job)
+        if url is None:
+            return
+        self.uploaded += 1
+        if job.derivative:
+            return
+        try:
+            await prediction_cache.update_image_url(job.key, url)
+        except Exception as e:
+            print(f"Error updating cached image url: {str(e)}")
+        if job.history_ids:
+            try:
+                with stage("history_image_url_update"):
+                    await self.collection.update_many(
+                        {"_id": {"$in": job.history_ids}},
+                        {"$set": {"image_url": url}}
+                    )
+            except Exception as e:
+                print(f"Error updating history image url: {str(e)}")
+
+    async def _run(self):
+        while True:
+            jobs = [await self._queue.get()]
+            while len(jobs) < self.batch_size and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            try:
+                urls = await asyncio.gather(*[self._upload(job) for job in jobs], return_exceptions=True)
+                for job, url in zip(jobs, urls):
+                    if isinstance(url, BaseException):
+                        self.failed += 1
+                        print(f"Error uploading image {job.key}: {str(url)}")
+                        url = None
+                    try:
+                        await self._complete(job, url)
+                    except Exception as e:
+                        print(f"Error completing upload {job.key}: {str(e)}")
+            finally:
+                # Whatever happened, no job of this batch may keep its key pending: attach()
+                # would link new history rows to an upload that never completes
+                for job in jobs:
+                    self._forget(job)
+                    self._queue.task_done()
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._pending),
+            "uploaded": self.uploaded,
+            "retried": self.retried,
+            "failed": self.failed
+        }
+
+
+def _storage_options() -> dict:
+    if settings.STORAGE_BACKEND == "local":
+        return {"root": settings.LOCAL_STORAGE_DIR, "base_url": settings.LOCAL_STORAGE_BASE_URL}
+    return {
+        "cloud_name": settings.CLOUDINARY_CLOUD_NAME,
+        "api_key": settings.CLOUDINARY_API_KEY,
+        "api_secret": settings.CLOUDINARY_API_SECRET
+    }
+
+
+storage = get_storage_backend(settings.STORAGE_BACKEND, **_storage_options())
+
+upload_queue = UploadQueue(
+    storage=storage,
+    collection=db.history,
+    maxsize=settings.UPLOAD_QUEUE_SIZE,
+    batch_size=settings.UPLOAD_BATCH_SIZE,
+    max_retries=settings.UPLOAD_MAX_RETRIES,
+    backoff_seconds=settings.UPLOAD_RETRY_BACKOFF_SECONDS,
+    drain_timeout_seconds=settings.UPLOAD_DRAIN_TIMEOUT_SECONDS
+)
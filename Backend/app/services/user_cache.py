@@ -0,0 +1,99 @@
+from typing import Optional
+
+from app.config import settings
+from app.models.user_model import CurrentUser
+from app.utils.ttl_cache import TTLCache
+
+try:
+    import redis.asyncio as redis
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    REDIS_ERRORS = (RedisConnectionError, RedisTimeoutError)
+except ImportError:
+    redis = None
+    REDIS_ERRORS = ()
+
+
+class UserCache:
+    """
+    Caches authenticated users by JWT subject (email) so protected routes skip the
+    users.find_one round-trip.
+
+    Entries live in a per-process LRU with a short TTL. When a Redis URL is configured
+    the cache is also shared across uvicorn workers; invalidation clears Redis and the
+    local tier, and other workers' local copies age out within the TTL. An unreachable
+    Redis only costs the shared tier: lookups fall through to Mongo.
+
+    Entries are CurrentUser principals, so the password hash never leaves Mongo.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int, redis_url: str = ""):
+        self.local = TTLCache(maxsize, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.shared = None
+        self.shared_hits = 0
+        self.shared_errors = 0
+        if redis_url:
+            if redis is None:
+                raise RuntimeError("USER_CACHE_REDIS_URL is set but the redis package is not installed")
+            self.shared = redis.from_url(redis_url)
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"dermaai:user:{email}"
+
+    def _shared_failed(self, operation: str, error: Exception):
+        self.shared_errors += 1
+        print(f"User cache Redis {operation} failed: {str(error)}")
+
+    async def get(self, email: str) -> Optional[CurrentUser]:
+        user = self.local.get(email)
+        if user is not None:
+            return user
+        if self.shared is not None:
+            try:
+                data = await self.shared.get(self._key(email))
+            except REDIS_ERRORS as e:
+                self._shared_failed("get", e)
+                return None
+            if data is not None:
+                self.shared_hits += 1
+                user = CurrentUser.parse_raw(data)
+                self.local.set(email, user)
+                return user
+        return None
+
+    async def set(self, user: CurrentUser):
+        self.local.set(user.email, user)
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._key(user.email), user.json(by_alias=True), ex=self.ttl_seconds)
+            except REDIS_ERRORS as e:
+                self._shared_failed("set", e)
+
+    async def invalidate(self, email: str):
+        self.local.pop(email)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(self._key(email))
+            except REDIS_ERRORS as e:
+                # The shared entry then lives out its TTL
+                self._shared_failed("delete", e)
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+    def metrics(self) -> dict:
+        return {
+            **self.local.stats(),
+            "shared_hits": self.shared_hits,
+            "shared_errors": self.shared_errors,
+            "shared": self.shared is not None
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    redis_url=settings.USER_CACHE_REDIS_URL
+)
@@ -0,0 +1,81 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+
+def _too_large_detail(limit: int) -> str:
+    return f"Request body is larger than the {limit // (1024 * 1024)} MB limit."
+
+
+def too_large_response(limit: int) -> JSONResponse:
+    """The one 413 response, whether the size came from Content-Length or the streamed body."""
+    return JSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={"detail": _too_large_detail(limit)}
+    )
+
+
+class RequestTooLarge(HTTPException):
+    # An HTTPException so FastAPI's body parsing re-raises it instead of reporting a 400;
+    # the app's handler for it answers with too_large_response
+    def __init__(self, limit: int):
+        super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=_too_large_detail(limit))
+        self.limit = limit
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over a per-path byte limit with 413 before they are buffered.
+
+    A declared Content-Length over the limit is refused before any of the body is read.
+    Otherwise (chunked uploads, or a lying client) the body is counted as it streams in
+    and the request is cut off as soon as it passes the limit.
+    """
+
+    def __init__(self, app, default_limit: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.default_limit = default_limit
+        self.path_limits = path_limits or {}
+
+    def _limit_for(self, path: str) -> int:
+        return self.path_limits.get(path.rstrip("/"), self.default_limit)
+
+    @staticmethod
+    async def _reject(scope, receive, send, limit: int):
+        await too_large_response(limit)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self._limit_for(scope["path"])
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise RequestTooLarge(limit)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestTooLarge:
+            if not response_started:
+                await self._reject(scope, receive, send, limit)
@@ -1,22 +1,30 @@
 import cloudinary
 import cloudinary.uploader
-import os
-from dotenv import load_dotenv
+import cloudinary.utils
 import io
+import urllib.request
 
-load_dotenv()
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+def configure_cloudinary(cloud_name: str, api_key: str, api_secret: str):
+    cloudinary.config(
+        cloud_name=cloud_name,
+        api_key=api_key,
+        api_secret=api_secret
+    )
 
 
-def upload_to_cloudinary(raw_image_bytes, folder: str = "DermaAI"):
+def upload_to_cloudinary(raw_image_bytes, folder: str = "DermaAI", public_id: str = None):
     upload_result = cloudinary.uploader.upload(
         io.BytesIO(raw_image_bytes),
         folder=folder,
+        public_id=public_id,
+        overwrite=False,
         resource_type="image"
     )
     return upload_result["secure_url"]
+
+
+def download_from_cloudinary(public_id: str, folder: str = "DermaAI", timeout: float = 30.0) -> bytes:
+    url, _ = cloudinary.utils.cloudinary_url(f"{folder}/{public_id}", secure=True, resource_type="image")
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
@@ -0,0 +1,17 @@
+import os
+from string import Template
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+def _load(name: str) -> Template:
+    with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+        return Template(f.read())
+
+
+# Parsed once at import; rendering is a single substitute() call per email
+VERIFICATION_EMAIL = _load("verification_email.html")
+
+
+def render_verification_email(verification_link: str, year: int) -> str:
+    return VERIFICATION_EMAIL.substitute(verification_link=verification_link, year=year)
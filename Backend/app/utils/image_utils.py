@@ -1,14 +1,264 @@
+import struct
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
 import cv2
 import numpy as np
 
+IMAGE_SIZE = 224
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 80
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+
+# Start-of-frame markers carry the image dimensions; C4 (DHT), C8 (JPG) and CC (DAC) do not
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_REDUCED_COLOR_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_REDUCED_GRAYSCALE_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+_SCALE = np.float32(1.0 / 255.0)
+
+
+class ImageValidationError(ValueError):
+    pass
+
+
+def _jpeg_size(data: bytes) -> Tuple[int, int]:
+    i, n = 2, len(data)
+    while i + 9 <= n:
+        if data[i] != 0xFF:
+            break
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ImageValidationError("Corrupt JPEG header")
+
+
+def _webp_size(data: bytes) -> Tuple[int, int]:
+    chunk = data[12:16]
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    raise ImageValidationError("Corrupt WebP header")
 
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
 
-    image_array = np.frombuffer(image_bytes, np.uint8)
-    img_bgr = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    resized_img = cv2.resize(img_rgb, (224, 224))
-    scaled_img = resized_img / 255.0
-    preprocessed_img = np.expand_dims(scaled_img, axis=0)
+def read_image_header(image_bytes: bytes) -> Tuple[str, int, int]:
+    """Returns (format, width, height) from the file header without decoding any pixels."""
+    if image_bytes[:3] == b"\xff\xd8\xff":
+        return ("jpeg",) + _jpeg_size(image_bytes)
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n" and len(image_bytes) >= 24:
+        return ("png",) + struct.unpack(">II", image_bytes[16:24])
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return ("webp",) + _webp_size(image_bytes)
+    raise ImageValidationError("Unsupported image format. Please upload a JPEG, PNG or WebP image.")
 
+
+def validate_image(
+    image_bytes: bytes,
+    max_bytes: int = MAX_IMAGE_BYTES,
+    max_pixels: int = MAX_IMAGE_PIXELS
+) -> Tuple[str, int, int]:
+    """Rejects empty, oversized or unreadable uploads before any decode work is done."""
+    if not image_bytes:
+        raise ImageValidationError("Empty image upload")
+    if len(image_bytes) > max_bytes:
+        raise ImageValidationError(f"Image exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+    image_format, width, height = read_image_header(image_bytes)
+    if width <= 0 or height <= 0:
+        raise ImageValidationError("Image has invalid dimensions")
+    if width * height > max_pixels:
+        raise ImageValidationError("Image resolution is too large")
+    return image_format, width, height
+
+
+def _decode_flag(image_format: str, width: int, height: int, target: int, grayscale: bool = False) -> int:
+    # libjpeg can scale by 1/2, 1/4 or 1/8 during the IDCT, so pick the largest factor
+    # that still leaves at least `target` pixels on the short side
+    if image_format == "jpeg":
+        flags = _REDUCED_GRAYSCALE_FLAGS if grayscale else _REDUCED_COLOR_FLAGS
+        for factor, flag in flags:
+            if min(width, height) // factor >= target:
+                return flag
+    return cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+
+
+def decode_image(image_bytes: bytes, target: int = IMAGE_SIZE) -> np.ndarray:
+    """Decodes to a BGR uint8 image, at reduced resolution when the source is much larger than `target`."""
+    image_format, width, height = validate_image(image_bytes)
+    flag = _decode_flag(image_format, width, height, target)
+    img_bgr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if img_bgr is None:
+        raise ImageValidationError("Could not decode image. The file may be corrupt.")
+    return img_bgr
+
+
+def to_model_input(img_bgr: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Resizes a BGR image and writes RGB float32 in [0, 1] into `out` (shape HxWx3) in one pass."""
+    resized = cv2.resize(img_bgr, (out.shape[1], out.shape[0]))
+    # Channel flip, scaling and the float32 cast are fused into a single ufunc write
+    np.multiply(resized[..., ::-1], _SCALE, out=out, casting="unsafe")
+    return out
+
+
+def preprocess_image(image_bytes: bytes) -> np.ndarray:
+    preprocessed_img = np.empty((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+    to_model_input(decode_image(image_bytes), preprocessed_img[0])
     return preprocessed_img
+
+
+def make_thumbnail(img_bgr: np.ndarray, size: int = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Encodes an already-decoded BGR image as a WebP whose longest side is at most `size`."""
+    height, width = img_bgr.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        img_bgr = cv2.resize(
+            img_bgr, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".webp", img_bgr, [cv2.IMWRITE_WEBP_QUALITY, quality])[1].tobytes()
+
+
+def preprocess_image_with_thumbnail(
+    image_bytes: bytes,
+    thumbnail_size: int = THUMBNAIL_SIZE,
+    thumbnail_quality: int = THUMBNAIL_QUALITY
+) -> Tuple[np.ndarray, bytes]:
+    """Like preprocess_image, plus a thumbnail made from the same decoded image."""
+    img_bgr = decode_image(image_bytes)
+    preprocessed_img = np.empty((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+    to_model_input(img_bgr, preprocessed_img[0])
+    return preprocessed_img, make_thumbnail(img_bgr, thumbnail_size, thumbnail_quality)
+
+
+def allocate_batch(batch_size: int) -> np.ndarray:
+    return np.empty((batch_size, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+
+
+def preprocess_batch(
+    images: Sequence[bytes],
+    out: Optional[np.ndarray] = None,
+    thumbnails: Optional[List[Optional[bytes]]] = None,
+    thumbnail_size: int = THUMBNAIL_SIZE,
+    thumbnail_quality: int = THUMBNAIL_QUALITY
+) -> Tuple[np.ndarray, List[Optional[Exception]]]:
+    """
+    Fills an N x 224 x 224 x 3 float32 tensor in place, one row per image.
+
+    Rows for images that fail validation or decoding are zeroed and their error is
+    returned at the same index; successful rows have `None`. When a `thumbnails` list
+    is passed, one thumbnail per image (None for failures) is appended to it.
+    """
+    if out is None:
+        out = allocate_batch(len(images))
+    elif out.shape[0] < len(images) or out.shape[1:] != (IMAGE_SIZE, IMAGE_SIZE, 3) or out.dtype != np.float32:
+        raise ValueError("Output buffer does not fit the batch")
+
+    errors: List[Optional[Exception]] = []
+    for i, image_bytes in enumerate(images):
+        try:
+            img_bgr = decode_image(image_bytes)
+            to_model_input(img_bgr, out[i])
+            if thumbnails is not None:
+                thumbnails.append(make_thumbnail(img_bgr, thumbnail_size, thumbnail_quality))
+            errors.append(None)
+        except (ImageValidationError, cv2.error) as e:
+            out[i].fill(0)
+            if thumbnails is not None:
+                thumbnails.append(None)
+            errors.append(e if isinstance(e, ImageValidationError) else ImageValidationError(str(e)))
+    return out[:len(images)], errors
+
+
+def preprocess_batch_with_thumbnails(
+    images: Sequence[bytes],
+    thumbnail_size: int = THUMBNAIL_SIZE,
+    thumbnail_quality: int = THUMBNAIL_QUALITY
+) -> Tuple[np.ndarray, List[Optional[Exception]], List[Optional[bytes]]]:
+    """preprocess_batch for the process pool, where the thumbnails have to come back in the return value."""
+    thumbnails: List[Optional[bytes]] = []
+    batch, errors = preprocess_batch(images, None, thumbnails, thumbnail_size, thumbnail_quality)
+    return batch, errors, thumbnails
+
+
+# Test-time augmentations as (flip horizontally, flip vertically, rotation degrees, zoom);
+# zoom < 1 samples a centred crop of that fraction of the image
+TTA_AUGMENTATIONS = [
+    (True, False, 0.0, 1.0),
+    (False, True, 0.0, 1.0),
+    (False, False, 10.0, 1.0),
+    (False, False, -10.0, 1.0),
+    (False, False, 0.0, 0.9),
+    (True, False, 10.0, 0.9),
+    (False, True, -10.0, 0.9)
+]
+
+
+@lru_cache(maxsize=8)
+def _tta_grids(count: int, height: int, width: int):
+    """
+    Bilinear sampling for the first `count` augmentations: four flat pixel indices and
+    their weights, each (count * H * W,), so every view is a gather over the flattened image.
+    """
+    flip_h, flip_v, degrees, zoom = (np.array(column, dtype=np.float32)[:, None, None]
+                                     for column in zip(*TTA_AUGMENTATIONS[:count]))
+    cy, cx = (height - 1) / 2.0, (width - 1) / 2.0
+    v, u = np.mgrid[0:height, 0:width].astype(np.float32)
+    u, v = (u - cx) * zoom, (v - cy) * zoom
+    theta = np.deg2rad(degrees)
+    xs = np.cos(theta) * u - np.sin(theta) * v + cx
+    ys = np.sin(theta) * u + np.cos(theta) * v + cy
+    xs = np.clip(np.where(flip_h > 0, (width - 1) - xs, xs), 0, width - 1)
+    ys = np.clip(np.where(flip_v > 0, (height - 1) - ys, ys), 0, height - 1)
+
+    x0, y0 = np.floor(xs).astype(np.int64), np.floor(ys).astype(np.int64)
+    x1, y1 = np.minimum(x0 + 1, width - 1), np.minimum(y0 + 1, height - 1)
+    wx, wy = xs - x0, ys - y0
+    indices = [(y * width + x).ravel() for y, x in ((y0, x0), (y0, x1), (y1, x0), (y1, x1))]
+    weights = [w.ravel()[:, None].astype(np.float32) for w in
+               ((1 - wx) * (1 - wy), wx * (1 - wy), (1 - wx) * wy, wx * wy)]
+    return indices, weights
+
+
+def tta_views(images: np.ndarray, count: int) -> np.ndarray:
+    """
+    Returns `count` augmented views of each image in an (N, H, W, 3) float32 batch as
+    an (N * count, H, W, 3) batch, image-major. All views of an image come from four
+    vectorized gathers over its flattened pixels; the sampling grids are cached per shape.
+    """
+    count = min(count, len(TTA_AUGMENTATIONS))
+    n, height, width, channels = images.shape
+    indices, weights = _tta_grids(count, height, width)
+    views = np.empty((n, count * height * width, channels), dtype=np.float32)
+    for i, pixels in enumerate(images.reshape(n, height * width, channels)):
+        out = views[i]
+        np.multiply(np.take(pixels, indices[0], axis=0), weights[0], out=out)
+        for index, weight in zip(indices[1:], weights[1:]):
+            out += np.take(pixels, index, axis=0) * weight
+    return views.reshape(n * count, height, width, channels)
+
+
+def perceptual_hash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """Difference hash (dHash) of the image, robust to re-encoding and small resizes."""
+    image_format, width, height = validate_image(image_bytes)
+    flag = _decode_flag(image_format, width, height, 64, grayscale=True)
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if gray is None:
+        raise ImageValidationError("Could not decode image")
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
@@ -0,0 +1,75 @@
+import math
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+from fastapi import HTTPException, status
+
+
+class KeyedConcurrencyLimiter:
+    """Caps how many operations may run at once for the same key (an account, an IP address)."""
+
+    def __init__(self, limit: int, detail: str = "Too many concurrent requests"):
+        self.limit = limit
+        self.detail = detail
+        self._active = defaultdict(int)
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def acquire(self, key: Hashable):
+        if self._active[key] >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=self.detail,
+                headers={"Retry-After": "1"}
+            )
+        self._active[key] += 1
+        try:
+            yield
+        finally:
+            self._active[key] -= 1
+            if self._active[key] <= 0:
+                del self._active[key]
+
+    def metrics(self) -> dict:
+        return {"active_keys": len(self._active), "limit": self.limit, "rejected": self.rejected}
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets: each key may make `burst` requests at once and then `rate`
+    requests per second. Only the `max_keys` most recently seen keys are tracked.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000, detail: str = "Too many requests"):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.detail = detail
+        self._buckets = OrderedDict()
+        self.rejected = 0
+
+    def check(self, key: Hashable):
+        """Takes one token for `key`, or raises 429 with the time until the next token as Retry-After."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=self.detail,
+                headers={"Retry-After": str(max(1, math.ceil((1 - tokens) / self.rate)))}
+            )
+
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_keys:
+            # A forgotten key starts again with a full bucket, the same as a new client
+            self._buckets.popitem(last=False)
+
+    def metrics(self) -> dict:
+        return {"tracked_keys": len(self._buckets), "rate": self.rate, "burst": self.burst, "rejected": self.rejected}
@@ -0,0 +1,92 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from urllib.error import HTTPError
+
+from app.utils.cloudinary_helper import configure_cloudinary, download_from_cloudinary, upload_to_cloudinary
+
+
+def guess_extension(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+class StorageBackend(ABC):
+    """Blocking object storage used for uploaded images; run it on the I/O pool."""
+
+    def open(self):
+        """Sets up clients or credentials; called once from the app lifespan before the first save."""
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def save(self, data: bytes, key: str) -> str:
+        """Stores `data` under `key` and returns a public URL for it."""
+
+    def load(self, key: str) -> bytes:
+        """Reads back what was saved under `key`; raises FileNotFoundError if there is nothing."""
+        raise NotImplementedError
+
+
+class CloudinaryStorage(StorageBackend):
+    def __init__(self, folder: str = "DermaAI", cloud_name: str = None, api_key: str = None, api_secret: str = None):
+        self.folder = folder
+        self.credentials = {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret}
+
+    def open(self):
+        configure_cloudinary(**self.credentials)
+
+    def save(self, data: bytes, key: str) -> str:
+        return upload_to_cloudinary(data, folder=self.folder, public_id=key)
+
+    def load(self, key: str) -> bytes:
+        try:
+            return download_from_cloudinary(key, folder=self.folder)
+        except HTTPError as e:
+            if e.code == 404:
+                raise FileNotFoundError(key)
+            raise
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, data: bytes, key: str) -> str:
+        filename = f"{key}.{guess_extension(data)}"
+        path = os.path.join(self.root, filename)
+        if not os.path.exists(path):
+            # Write to a temporary file first so readers never see a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=self.root)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return f"{self.base_url}/{filename}"
+
+    def load(self, key: str) -> bytes:
+        for extension in ("webp", "jpg", "png", "bin"):
+            path = os.path.join(self.root, f"{key}.{extension}")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        raise FileNotFoundError(key)
+
+
+def get_storage_backend(name: str, **options) -> StorageBackend:
+    backends = {
+        "cloudinary": CloudinaryStorage,
+        "local": LocalStorage
+    }
+    if name not in backends:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return backends[name](**options)
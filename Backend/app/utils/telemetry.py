@@ -0,0 +1,103 @@
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+registry = CollectorRegistry()
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REQUEST_LATENCY = Histogram(
+    "dermaai_request_seconds", "End-to-end request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=registry)
+REQUESTS_IN_PROGRESS = Gauge(
+    "dermaai_requests_in_progress", "Requests currently being handled", registry=registry)
+STAGE_LATENCY = Histogram(
+    "dermaai_stage_seconds", "Latency of one step inside a request (read, preprocess, inference, upload, db)",
+    ["stage"], buckets=LATENCY_BUCKETS, registry=registry)
+STAGE_ERRORS = Counter(
+    "dermaai_stage_errors", "Steps that raised", ["stage"], registry=registry)
+MODEL_BATCH_SIZE = Histogram(
+    "dermaai_model_batch_size", "Images per model forward pass", ["source"],
+    buckets=BATCH_SIZE_BUCKETS, registry=registry)
+
+_tracer = None
+
+
+def configure_tracing(service_name: str, endpoint: Optional[str] = None):
+    """
+    Exports every stage as an OpenTelemetry span when the SDK is installed.
+    Without it (or with tracing disabled) stages only feed the Prometheus histograms.
+    """
+    global _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        print("OpenTelemetry is not installed; tracing stays disabled")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint or None)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("dermaai")
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block (sync or around an await) into the stage histogram, and a span if tracing is on."""
+    span = _tracer.start_as_current_span(name) if _tracer is not None else None
+    if span is not None:
+        span.__enter__()
+    started_at = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - started_at)
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+class StatsCollector:
+    """
+    Re-exports the metrics() dicts the services already keep (pools, scheduler, caches,
+    queues) as gauges at scrape time, so nothing extra runs on the request path.
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, metrics_fn: Callable[[], dict]):
+        self.sources[name] = metrics_fn
+
+    def collect(self):
+        for source, metrics_fn in self.sources.items():
+            try:
+                values = metrics_fn()
+            except Exception as e:
+                print(f"Error collecting {source} metrics: {str(e)}")
+                continue
+            yield from self._gauges(f"dermaai_{source}", values)
+
+    def _gauges(self, prefix: str, values: dict):
+        for key, value in values.items():
+            # Keys can be model names such as "dermaai:v2"; metric names only allow [a-zA-Z0-9_]
+            key = re.sub(r"[^a-zA-Z0-9_]", "_", str(key))
+            if isinstance(value, dict):
+                yield from self._gauges(f"{prefix}_{key}", value)
+            elif isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix.replace('_', ' ')} {key}", value=float(value))
+
+
+stats = StatsCollector()
+registry.register(stats)
@@ -0,0 +1,64 @@
+"""
+Reports cold-start time and per-image latency for each inference backend whose artifact exists.
+
+Run from the Backend directory:
+    python -m benchmarks.backends --iterations 50 --output backends.json
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.services.inference_backends import BACKENDS, INPUT_SHAPE, create_backend
+from benchmarks.common import percentiles, write_report
+
+
+def benchmark_backend(name: str, artifact_path: str, num_threads: int, iterations: int) -> dict:
+    started_at = time.perf_counter()
+    backend = create_backend(name, artifact_path, num_threads)
+    backend.load()
+    loaded_at = time.perf_counter()
+    backend.warmup()
+    warm_at = time.perf_counter()
+
+    image = np.random.rand(1, *INPUT_SHAPE).astype(np.float32)
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        backend.predict(image)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    return {
+        "artifact": backend.artifact_path,
+        "load_ms": (loaded_at - started_at) * 1000.0,
+        "warmup_ms": (warm_at - loaded_at) * 1000.0,
+        "startup_ms": (warm_at - started_at) * 1000.0,
+        "latency": percentiles(samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.backends:
+        backend = create_backend(name)
+        if not os.path.exists(backend.artifact_path):
+            results[name] = {"skipped": f"{backend.artifact_path} not found"}
+            continue
+        try:
+            results[name] = benchmark_backend(name, backend.artifact_path, args.threads, args.iterations)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    write_report("backends", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
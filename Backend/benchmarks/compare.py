@@ -0,0 +1,64 @@
+"""
+Compares two benchmark reports (e.g. from two commits) and flags regressions.
+
+Latency keys (*_ms) regress when they grow, throughput keys (*_per_second) when they
+shrink, beyond --threshold percent. Exits non-zero if anything regressed.
+
+Run from the Backend directory:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, child in value.items():
+            flat.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    base, cand = flatten(baseline["results"]), flatten(candidate["results"])
+    rows, regressions = [], []
+    for key in sorted(base.keys() & cand.keys()):
+        lower_is_better = key.endswith("_ms")
+        if not (lower_is_better or key.endswith("_per_second")) or base[key] == 0:
+            continue
+        change = (cand[key] - base[key]) / base[key] * 100.0
+        regressed = change > threshold if lower_is_better else change < -threshold
+        rows.append((key, base[key], cand[key], change, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{baseline['benchmark']}: {baseline['commit']} -> {candidate['commit']}")
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    for key, before, after, change, regressed in rows:
+        print(f"{'REGRESSED ' if regressed else '          '}{key}: {before:.3f} -> {after:.3f} ({change:+.1f}%)")
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
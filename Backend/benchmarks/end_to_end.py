@@ -0,0 +1,151 @@
+"""
+Drives the full FastAPI app in-process at a fixed concurrency and reports request latency
+percentiles, throughput and peak RSS.
+
+Mongo is mongomock-motor by default (--mongo-uri points it at a real server instead) and
+image uploads go to a stub storage backend, so the numbers cover the API, preprocessing,
+the scheduler and inference but not Cloudinary. The model is whatever MODEL_BACKEND /
+MODEL_ARTIFACT_PATH select. Needs httpx, plus mongomock-motor for the default mode.
+
+Run from the Backend directory:
+    python -m benchmarks.end_to_end --endpoint predict --concurrency 16 --requests 400
+    python -m benchmarks.end_to_end --endpoint batch --batch-files 8 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.utils.storage import StorageBackend
+from benchmarks.common import peak_children_rss_mb, percentiles, synthetic_jpeg, write_report
+
+ENDPOINTS = {
+    "guest": "/api/guest/guest-predict",
+    "predict": "/api/predict/predict",
+    "batch": "/api/predict/batch"
+}
+
+
+class StubStorage(StorageBackend):
+    """Stands in for Cloudinary: sleeps for the configured latency and returns a fake URL."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.saved = 0
+
+    def save(self, data: bytes, key: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        self.saved += 1
+        return f"https://storage.invalid/{key}"
+
+
+def use_database(mongo_uri: str = None):
+    # Must run before app.main is imported: the services bind their collections at import
+    import app.models.user_model as user_model
+    if mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        user_model.client = AsyncIOMotorClient(mongo_uri)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        user_model.client = AsyncMongoMockClient()
+    user_model.db = user_model.client.get_database("derma_ai_bench")
+
+
+def build_app(storage: StubStorage):
+    from app.main import app, resources
+    from app.api.auth import get_current_user
+    from app.models.user_model import UserDB
+    from app.services import prediction_services
+    from app.services.upload_queue import upload_queue
+
+    resources.storage = storage
+    upload_queue.storage = storage
+    prediction_services.storage = storage
+    app.dependency_overrides[get_current_user] = lambda: UserDB(
+        _id=1, full_name="Benchmark", email="bench@example.com", password="x", is_verified=True)
+    return app
+
+
+async def run(app, args) -> dict:
+    import httpx
+
+    # Distinct images defeat the prediction cache; --unique-images 1 measures the cached path
+    images = [synthetic_jpeg(args.image_width, args.image_width * 3 // 4, seed=i) for i in range(args.unique_images)]
+    path = ENDPOINTS[args.endpoint]
+    samples = []
+    statuses = {}
+    counter = iter(range(args.requests))
+
+    def request_files(n: int):
+        if args.endpoint == "batch":
+            return [("files", (f"{n}-{i}.jpg", images[(n + i) % len(images)], "image/jpeg"))
+                    for i in range(args.batch_files)]
+        return {"file": (f"{n}.jpg", images[n % len(images)], "image/jpeg")}
+
+    async def worker(client):
+        for n in counter:
+            t0 = time.perf_counter()
+            response = await client.post(path, files=request_files(n))
+            samples.append((time.perf_counter() - t0) * 1000.0)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async with app.router.lifespan_context(app):
+        await app.state.resources.wait_ready()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for n in range(min(args.warmup, len(images))):
+                await client.post(path, files=request_files(n))
+            started_at = time.perf_counter()
+            await asyncio.gather(*[worker(client) for _ in range(args.concurrency)])
+            elapsed = time.perf_counter() - started_at
+
+        from app.services.executor import pools
+        from app.services.prediction_services import scheduler
+        from app.services.prediction_cache import prediction_cache
+        server_metrics = {
+            "scheduler": scheduler.metrics(),
+            "pools": pools.metrics(),
+            "prediction_cache": prediction_cache.metrics()
+        }
+
+    images_per_request = args.batch_files if args.endpoint == "batch" else 1
+    return {
+        "endpoint": path,
+        "concurrency": args.concurrency,
+        "requests": len(samples),
+        "statuses": {str(code): count for code, count in statuses.items()},
+        "seconds": elapsed,
+        "requests_per_second": len(samples) / elapsed,
+        "images_per_second": len(samples) * images_per_request / elapsed,
+        "latency": percentiles(samples),
+        "server": server_metrics
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="predict")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--batch-files", type=int, default=8)
+    parser.add_argument("--unique-images", type=int, default=64)
+    parser.add_argument("--image-width", type=int, default=1024)
+    parser.add_argument("--storage-latency-ms", type=float, default=50.0)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI"))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_database(args.mongo_uri)
+    storage = StubStorage(args.storage_latency_ms)
+    app = build_app(storage)
+    results = asyncio.run(run(app, args))
+    results["uploads"] = storage.saved
+    # Pool workers have exited by now, so their peak RSS is visible to the parent
+    results["peak_worker_rss_mb"] = peak_children_rss_mb()
+    write_report("end_to_end", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the per-insert counter ($inc per ID) with the block ID allocator under
+concurrent allocation, reporting throughput, latency percentiles and counter writes.
+
+Run from the Backend directory against a local Mongo, or in-process with mongomock-motor:
+    python -m benchmarks.id_allocation --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.id_allocation --mongomock
+"""
+import argparse
+import asyncio
+import time
+
+from pymongo import ReturnDocument
+
+from app.services.id_allocator import BlockIdAllocator
+from benchmarks.common import percentiles, write_report
+
+
+class PerInsertCounter:
+    """The original approach: one find_one_and_update round-trip for every ID."""
+
+    def __init__(self, collection, name: str):
+        self.collection = collection
+        self.name = name
+        self.leases = 0
+
+    async def allocate(self, count: int = 1):
+        sequence_doc = await self.collection.find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'sequence_value': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.leases += 1
+        last_id = sequence_doc['sequence_value']
+        return list(range(last_id - count + 1, last_id + 1))
+
+
+async def run(allocator, concurrency: int, per_task: int) -> dict:
+    samples = []
+    ids = []
+
+    async def worker():
+        for _ in range(per_task):
+            t0 = time.perf_counter()
+            ids.extend(await allocator.allocate(1))
+            samples.append((time.perf_counter() - t0) * 1000.0)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started_at
+
+    assert len(ids) == len(set(ids)), "duplicate IDs allocated"
+    return {
+        "ids": len(ids),
+        "seconds": elapsed,
+        "ids_per_second": len(ids) / elapsed,
+        "counter_writes": allocator.leases,
+        "latency": percentiles(samples)
+    }
+
+
+async def main_async(args):
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_uri)
+    counters = client.get_database(args.database).counters
+    await counters.delete_many({"_id": {"$in": ["bench_per_insert", "bench_block"]}})
+
+    results = {
+        "per_insert": await run(PerInsertCounter(counters, "bench_per_insert"), args.concurrency, args.per_task),
+        "block": await run(BlockIdAllocator(counters, "bench_block", args.block_size), args.concurrency, args.per_task),
+        "concurrency": args.concurrency,
+        "block_size": args.block_size
+    }
+    await counters.delete_many({"_id": {"$in": ["bench_per_insert", "bench_block"]}})
+    write_report("id_allocation", results, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--database", default="derma_ai_bench")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--per-task", type=int, default=50)
+    parser.add_argument("--block-size", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures model latency and images/sec at each batch size for one inference backend,
+to pick INFERENCE_MAX_BATCH_SIZE for the hardware the API runs on.
+
+Run from the Backend directory:
+    python -m benchmarks.model_batches --backend tflite --batch-sizes 1 2 4 8 16 32 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.inference_backends import BACKENDS, INPUT_SHAPE, create_backend
+from benchmarks.common import percentiles, write_report
+
+
+def benchmark_batch(backend, batch_size: int, iterations: int) -> dict:
+    batch = np.random.rand(batch_size, *INPUT_SHAPE).astype(np.float32)
+    backend.predict(batch)
+
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        backend.predict(batch)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    latency = percentiles(samples)
+    return {
+        "latency": latency,
+        "per_image_ms": latency["mean_ms"] / batch_size,
+        "images_per_second": batch_size * 1000.0 / latency["mean_ms"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=settings.MODEL_BACKEND)
+    parser.add_argument("--artifact", default=settings.MODEL_ARTIFACT_PATH or None)
+    parser.add_argument("--precision", default=settings.MODEL_PRECISION)
+    parser.add_argument("--threads", type=int, default=settings.MODEL_NUM_THREADS)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    artifact = args.artifact
+    if artifact is None and args.backend == "keras":
+        artifact = settings.MODEL_WEIGHTS_PATH
+    backend = create_backend(args.backend, artifact, args.threads, args.precision)
+    backend.load()
+
+    results = {
+        "backend": args.backend,
+        "artifact": backend.artifact_path,
+        "precision": args.precision,
+        "batches": {str(size): benchmark_batch(backend, size, args.iterations) for size in args.batch_sizes}
+    }
+    write_report("model_batches", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Compares N independent workers, each holding its own copy of the model (what
+`uvicorn --workers N` does without a model server), against N workers that send their
+batches through shared memory to --server-processes model servers. Every worker loops
+over decoding synthetic JPEGs and classifying them, like a web worker under load.
+
+Reports total RSS and PSS over all processes once warm and at their peak during the
+run, plus aggregate throughput. PSS splits shared pages between the processes mapping
+them, so it is the fairer sum. Linux only (reads /proc); needs no Mongo.
+
+Run from the Backend directory:
+    python -m benchmarks.multiworker --workers 4 --server-processes 1 --seconds 30
+    python -m benchmarks.multiworker --backend tflite --precision int8 --workers 8 --output multiworker.json
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from app.services.inference_backends import BACKENDS, PRECISIONS
+from app.services.model_server import ModelServer, server_addresses
+from benchmarks.common import synthetic_jpeg, write_report
+
+MODEL_KEY = "bench:v1"
+AUTHKEY_ENV = "MULTIWORKER_BENCH_AUTHKEY"
+
+
+def process_memory_mb(pid: int) -> Dict[str, float]:
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0}
+    for path, field, name in ((f"/proc/{pid}/status", "VmRSS:", "rss_mb"),
+                              (f"/proc/{pid}/smaps_rollup", "Pss:", "pss_mb")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        memory[name] = int(line.split()[1]) / 1024
+                        break
+        except OSError:
+            pass
+    return memory
+
+
+def total_memory(pids: List[int]) -> Dict[str, float]:
+    per_process = [process_memory_mb(pid) for pid in pids]
+    return {
+        "rss_mb": sum(memory["rss_mb"] for memory in per_process),
+        "pss_mb": sum(memory["pss_mb"] for memory in per_process),
+        "max_process_rss_mb": max((memory["rss_mb"] for memory in per_process), default=0.0)
+    }
+
+
+def start_server(address: str, authkey: bytes, args) -> subprocess.Popen:
+    """
+    Runs a model server as its own command, as in a deployment. A multiprocessing child
+    would share this process's resource tracker with the workers, which a real server
+    never does.
+    """
+    command = [
+        sys.executable, "-m", "benchmarks.multiworker", "--serve", address,
+        "--backend", args.backend, "--precision", args.precision,
+        "--num-threads", str(args.num_threads), "--server-threads", str(args.server_threads)
+    ]
+    if args.artifact:
+        command += ["--artifact", args.artifact]
+    return subprocess.Popen(command, env={**os.environ, AUTHKEY_ENV: authkey.hex()}, stdout=subprocess.DEVNULL)
+
+
+def run_worker(config: tuple, addresses: List[str], authkey: bytes, args, ready, start, stop, results):
+    """One web worker: loads the model itself, or connects to the servers, then decodes and predicts until stopped."""
+    from app.services import model_loader
+    from app.utils.image_utils import preprocess_batch
+
+    client = None
+    if addresses:
+        from app.services.model_server import ModelServerClient
+        client = ModelServerClient(addresses, authkey, slot_rows=args.batch_size)
+        model_loader.use_model_server(client)
+    model_loader.configure({MODEL_KEY: config})
+    model_loader.load_model(MODEL_KEY)
+
+    images = [synthetic_jpeg(args.width, args.height, seed=os.getpid() + i) for i in range(args.batch_size)]
+    batch, _ = preprocess_batch(images)
+    model_loader.predict_batch(batch, MODEL_KEY)
+    ready.put(os.getpid())
+    start.wait()
+
+    counts = [0] * args.concurrency
+
+    def loop(index: int):
+        while not stop.is_set():
+            batch, _ = preprocess_batch(images)
+            model_loader.predict_batch(batch, MODEL_KEY)
+            counts[index] += len(images)
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(sum(counts))
+    if client is not None:
+        client.close()
+
+
+def wait_for_sockets(addresses: List[str], servers: List[subprocess.Popen], timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while not all(os.path.exists(address) for address in addresses):
+        if any(server.poll() is not None for server in servers):
+            raise RuntimeError("A model server exited during startup")
+        if time.monotonic() > deadline:
+            raise RuntimeError("Model servers did not start in time")
+        time.sleep(0.2)
+
+
+def run_mode(config: tuple, server_processes: int, args) -> dict:
+    """With `server_processes=0` every worker loads the model; otherwise they share the servers."""
+    context = multiprocessing.get_context("spawn")
+    authkey = secrets.token_bytes(32)
+    socket_dir = tempfile.mkdtemp(prefix="dermaai-bench-")
+    addresses = server_addresses(os.path.join(socket_dir, "model.sock"), server_processes)
+
+    started_at = time.perf_counter()
+    servers = [start_server(address, authkey, args) for address in addresses]
+    wait_for_sockets(addresses, servers)
+
+    ready, results = context.Queue(), context.Queue()
+    start, stop = context.Event(), context.Event()
+    workers = [
+        context.Process(target=run_worker, args=(config, addresses, authkey, args, ready, start, stop, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get(timeout=600)
+    startup_seconds = time.perf_counter() - started_at
+
+    pids = [process.pid for process in servers + workers]
+    warm = total_memory(pids)
+    peak = dict(warm)
+    start.set()
+    run_started_at = time.perf_counter()
+    while time.perf_counter() - run_started_at < args.seconds:
+        time.sleep(1.0)
+        sample = total_memory(pids)
+        peak = {key: max(peak[key], sample[key]) for key in peak}
+    stop.set()
+    images = sum(results.get(timeout=120) for _ in workers)
+    elapsed = time.perf_counter() - run_started_at
+
+    for worker in workers:
+        worker.join(30)
+    for server in servers:
+        server.terminate()
+        server.wait(10)
+    for address in addresses:
+        if os.path.exists(address):
+            os.remove(address)
+    os.rmdir(socket_dir)
+
+    return {
+        "workers": args.workers,
+        "server_processes": server_processes,
+        "startup_seconds": startup_seconds,
+        "images": images,
+        "seconds": elapsed,
+        "images_per_second": images / elapsed if elapsed else 0.0,
+        "memory_warm": warm,
+        "memory_peak": peak
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=list(BACKENDS), default="keras")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32")
+    parser.add_argument("--artifact")
+    parser.add_argument("--num-threads", type=int, default=0, help="Intra-op threads per model copy")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--server-processes", type=int, default=1)
+    parser.add_argument("--server-threads", type=int, default=2, help="Batches each server runs at once")
+    parser.add_argument("--concurrency", type=int, default=1, help="Request loops per worker")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=768)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--modes", nargs="*", choices=["independent", "server"], default=["independent", "server"])
+    parser.add_argument("--output")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    config = (args.backend, args.artifact, args.num_threads, args.precision)
+    if args.serve:
+        authkey = bytes.fromhex(os.environ[AUTHKEY_ENV])
+        ModelServer(args.serve, authkey, {MODEL_KEY: config}, threads=args.server_threads).serve_forever()
+        return
+    results = {}
+    if "independent" in args.modes:
+        results["independent"] = run_mode(config, 0, args)
+    if "server" in args.modes:
+        results["server"] = run_mode(config, args.server_processes, args)
+
+    if len(results) == 2:
+        independent, server = results["independent"], results["server"]
+        results["comparison"] = {
+            "pss_saved_mb": independent["memory_peak"]["pss_mb"] - server["memory_peak"]["pss_mb"],
+            "rss_saved_mb": independent["memory_peak"]["rss_mb"] - server["memory_peak"]["rss_mb"],
+            "pss_ratio": server["memory_peak"]["pss_mb"] / max(independent["memory_peak"]["pss_mb"], 1e-9),
+            "throughput_ratio": server["images_per_second"] / max(independent["images_per_second"], 1e-9)
+        }
+    write_report("multiworker", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures preprocess_image latency and throughput across source image sizes, plus the
+vectorized preprocess_batch path for the same images.
+
+Run from the Backend directory:
+    python -m benchmarks.preprocess --sizes 224 640 1024 2048 4032 --iterations 50
+"""
+import argparse
+import time
+
+from app.utils.image_utils import allocate_batch, preprocess_batch, preprocess_image
+from benchmarks.common import percentiles, synthetic_jpeg, write_report
+
+
+def benchmark_size(size: int, iterations: int, batch_size: int) -> dict:
+    # 4:3 like most phone cameras
+    image = synthetic_jpeg(size, size * 3 // 4, seed=size)
+    preprocess_image(image)
+
+    samples = []
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        preprocess_image(image)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    single_seconds = time.perf_counter() - started_at
+
+    images = [image] * batch_size
+    out = allocate_batch(batch_size)
+    batch_samples = []
+    for _ in range(max(iterations // batch_size, 3)):
+        t0 = time.perf_counter()
+        preprocess_batch(images, out)
+        batch_samples.append((time.perf_counter() - t0) * 1000.0)
+    batch_latency = percentiles(batch_samples)
+
+    return {
+        "width": size,
+        "height": size * 3 // 4,
+        "jpeg_kb": len(image) / 1024,
+        "latency": percentiles(samples),
+        "images_per_second": iterations / single_seconds,
+        "batch_size": batch_size,
+        "batch_latency": batch_latency,
+        "batch_images_per_second": batch_size * 1000.0 / batch_latency["mean_ms"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[224, 640, 1024, 2048, 4032])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = {str(size): benchmark_size(size, args.iterations, args.batch_size) for size in args.sizes}
+    write_report("preprocess", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
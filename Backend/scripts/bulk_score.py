@@ -0,0 +1,314 @@
+"""
+Scores every image in a directory, tar or zip archive and writes one row per image to
+Parquet or CSV (picked from the --output extension). Needs no Mongo or Cloudinary.
+
+A pool of decode processes runs the same preprocessing as the API while a prefetch
+thread keeps them fed, and the main process runs large-batch inference on whatever is
+already decoded. Results are written in parts next to the output and a checkpoint file
+lists the finished parts, so rerunning the same command after an interruption skips the
+images already scored. The parts are merged into the output once every image is done.
+
+Run from the Backend directory:
+    python -m scripts.bulk_score --input dumps/2024-05.tar.gz --output scores.parquet
+    python -m scripts.bulk_score --input data/test --output scores.csv --backend tflite --precision int8
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.inference_backends import BACKENDS, PRECISIONS, create_backend
+from app.services.model_loader import CLASS_NAMES
+from app.utils.image_utils import preprocess_batch
+from scripts.datasets import iter_image_bytes
+
+COLUMNS = ["name", "status", "disease", "confidence", "error", "model"]
+
+
+def probability_column(class_name: str) -> str:
+    return "p_" + class_name.lower().replace(" ", "_")
+
+
+def init_decoder():
+    import cv2
+    # Parallelism comes from the pool; threads inside each worker would only contend
+    cv2.setNumThreads(1)
+
+
+def decode_chunk(items: List[Tuple[str, bytes]]) -> Tuple[List[str], np.ndarray, List[Optional[str]]]:
+    """Runs in a decode worker: preprocesses a chunk of images into one float32 batch."""
+    batch, errors = preprocess_batch([data for _, data in items])
+    return [name for name, _ in items], batch, [str(error) if error is not None else None for error in errors]
+
+
+def chunked(items: Iterator, size: int) -> Iterator[list]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultWriter:
+    """
+    Writes result rows as numbered part files in `<output>.parts/` and records each
+    finished part in `<output>.checkpoint.json`. A part only counts once the checkpoint
+    lists it, so a crash mid-write never leaves half a part behind.
+    """
+
+    def __init__(self, output_path: str, columns: List[str]):
+        self.output_path = output_path
+        self.columns = columns
+        self.format = "parquet" if output_path.endswith(".parquet") else "csv"
+        self.parts_dir = output_path + ".parts"
+        self.checkpoint_path = output_path + ".checkpoint.json"
+        self.parts: List[str] = []
+        self.meta = {}
+
+    def resume(self, meta: dict) -> Set[str]:
+        """Loads the checkpoint and returns the names already scored; `meta` must match the earlier run."""
+        self.meta = meta
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint["meta"] != meta:
+                raise SystemExit(
+                    f"{self.checkpoint_path} was written for a different input, model or columns. "
+                    "Delete it and the .parts directory to start over.")
+            self.parts = checkpoint["parts"]
+
+        os.makedirs(self.parts_dir, exist_ok=True)
+        for filename in os.listdir(self.parts_dir):
+            if filename not in self.parts:
+                os.remove(os.path.join(self.parts_dir, filename))
+
+        done = set()
+        for part in self.parts:
+            done.update(self._read_names(os.path.join(self.parts_dir, part)))
+        return done
+
+    def _read_names(self, path: str) -> List[str]:
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            return pq.read_table(path, columns=["name"]).column("name").to_pylist()
+        with open(path, newline="") as f:
+            return [row["name"] for row in csv.DictReader(f)]
+
+    def _write_file(self, path: str, rows: List[dict]):
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pylist(rows, schema=self.schema())
+            pq.write_table(table, path)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def schema(self):
+        import pyarrow as pa
+        types = {"confidence": pa.float64()}
+        return pa.schema([
+            (column, types.get(column, pa.float64() if column.startswith("p_") else pa.string()))
+            for column in self.columns
+        ])
+
+    def write_part(self, rows: List[dict]):
+        if not rows:
+            return
+        part = f"part-{len(self.parts):05d}.{self.format}"
+        path = os.path.join(self.parts_dir, part)
+        self._write_file(path + ".tmp", rows)
+        os.replace(path + ".tmp", path)
+        self.parts.append(part)
+        with open(self.checkpoint_path + ".tmp", "w") as f:
+            json.dump({"meta": self.meta, "parts": self.parts}, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    def finalize(self):
+        """Merges the parts into the output file and removes the parts and the checkpoint."""
+        paths = [os.path.join(self.parts_dir, part) for part in self.parts]
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            with pq.ParquetWriter(self.output_path, self.schema()) as writer:
+                for path in paths:
+                    writer.write_table(pq.read_table(path))
+        else:
+            with open(self.output_path, "w", newline="") as out:
+                writer = csv.DictWriter(out, fieldnames=self.columns)
+                writer.writeheader()
+                for path in paths:
+                    with open(path, newline="") as f:
+                        writer.writerows(csv.DictReader(f))
+        shutil.rmtree(self.parts_dir)
+        os.remove(self.checkpoint_path)
+
+
+def prefetch(pool: ProcessPoolExecutor, items: Iterator, chunk_size: int, out: queue.Queue, stop: threading.Event):
+    """Reads images and submits decode chunks, keeping at most `out.maxsize` chunks ahead of inference."""
+    try:
+        for chunk in chunked(items, chunk_size):
+            future = pool.submit(decode_chunk, chunk)
+            while not stop.is_set():
+                try:
+                    out.put(future, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+    except Exception as e:
+        out.put(e)
+        return
+    out.put(None)
+
+
+def score_group(backend, group, model_label: str, probabilities: bool) -> List[dict]:
+    """One forward pass over the valid images of several decoded chunks; rows come back in input order."""
+    valid = [batch[[i for i, error in enumerate(errors) if error is None]] for _, batch, errors in group]
+    total = sum(len(rows) for rows in valid)
+    predictions = iter(backend.predict(np.concatenate(valid)) if total else [])
+
+    rows = []
+    for names, _, errors in group:
+        for name, error in zip(names, errors):
+            row = {"name": name, "model": model_label}
+            if error is not None:
+                rows.append({**row, "status": "failed", "error": error})
+                continue
+            prediction = next(predictions)
+            index = int(np.argmax(prediction))
+            row.update({"status": "ok", "disease": CLASS_NAMES[index], "confidence": float(prediction[index] * 100)})
+            if probabilities:
+                row.update({probability_column(class_name): float(p) for class_name, p in zip(CLASS_NAMES, prediction)})
+            rows.append(row)
+    return rows
+
+
+def run(args, backend, writer: ResultWriter, done: Set[str]) -> dict:
+    model_label = args.model_label or f"{backend.name}:{backend.precision}:{os.path.basename(backend.artifact_path)}"
+    items = ((name, data) for name, data in iter_image_bytes(args.input) if name not in done)
+
+    decoded = queue.Queue(maxsize=args.prefetch)
+    stop = threading.Event()
+    scored = failed = 0
+    rows: List[dict] = []
+    started_at = time.perf_counter()
+    last_report = started_at
+
+    pool = ProcessPoolExecutor(
+        max_workers=args.decode_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_decoder
+    )
+    reader = threading.Thread(target=prefetch, args=(pool, items, args.decode_chunk, decoded, stop), daemon=True)
+    reader.start()
+    try:
+        group = []
+        group_size = 0
+        finished = False
+        while not finished:
+            future = decoded.get()
+            if isinstance(future, Exception):
+                raise future
+            if future is None:
+                finished = True
+            else:
+                chunk = future.result()
+                group.append(chunk)
+                group_size += len(chunk[0])
+            if group and (finished or group_size >= args.batch_size):
+                group_rows = score_group(backend, group, model_label, args.probabilities)
+                scored += len(group_rows)
+                failed += sum(1 for row in group_rows if row["status"] == "failed")
+                rows.extend(group_rows)
+                group = []
+                group_size = 0
+            if len(rows) >= args.part_size or (finished and rows):
+                writer.write_part(rows)
+                rows = []
+            now = time.perf_counter()
+            if now - last_report >= args.report_seconds:
+                print(f"{scored} images scored, {scored / (now - started_at):.1f} images/s", file=sys.stderr)
+                last_report = now
+    except KeyboardInterrupt:
+        # Keep what was scored so the rerun doesn't redo it
+        writer.write_part(rows)
+        print(f"Interrupted after {scored} images; rerun the same command to resume", file=sys.stderr)
+        raise
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started_at
+    return {
+        "images": scored,
+        "failed": failed,
+        "resumed_from": len(done),
+        "seconds": elapsed,
+        "images_per_second": scored / elapsed if elapsed else 0.0,
+        "model": model_label
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="Image directory, .tar(.gz/.bz2/.xz) or .zip")
+    parser.add_argument("--output", required=True, help="Ends in .parquet (needs pyarrow) or .csv")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="keras")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32")
+    parser.add_argument("--artifact")
+    parser.add_argument("--num-threads", type=int, default=0)
+    parser.add_argument("--model-label", help="Written to the model column; defaults to backend:precision:artifact")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--decode-workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--decode-chunk", type=int, default=32, help="Images per decode task")
+    parser.add_argument("--prefetch", type=int, default=16, help="Decode chunks kept ahead of inference")
+    parser.add_argument("--part-size", type=int, default=4096, help="Rows per checkpointed part")
+    parser.add_argument("--probabilities", action="store_true", help="Add a p_<class> column per class")
+    parser.add_argument("--report-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.output.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow (or write .csv)")
+
+    backend = create_backend(args.backend, args.artifact, args.num_threads, args.precision)
+    backend.load()
+
+    columns = COLUMNS + ([probability_column(name) for name in CLASS_NAMES] if args.probabilities else [])
+    writer = ResultWriter(args.output, columns)
+    done = writer.resume({
+        "input": os.path.abspath(args.input),
+        "backend": backend.name,
+        "precision": backend.precision,
+        "artifact": os.path.abspath(backend.artifact_path),
+        "columns": columns
+    })
+
+    try:
+        report = run(args, backend, writer, done)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    writer.finalize()
+    report.update({"input": args.input, "output": args.output, "batch_size": args.batch_size,
+                   "decode_workers": args.decode_workers})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import re
+import tarfile
+import zipfile
+from typing import Iterator, Optional, Tuple
+
+from app.services.model_loader import CLASS_NAMES
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _normalize(name: str) -> str:
+    # Kaggle folders look like "BA- cellulitis" or "FU-athlete-foot"
+    name = re.sub(r"^[A-Z]{2}-\s*", "", name)
+    return re.sub(r"[^a-z]", "", name.lower())
+
+
+_CLASS_LOOKUP = {_normalize(name): index for index, name in enumerate(CLASS_NAMES)}
+
+
+def class_index_for_folder(folder_name: str) -> Optional[int]:
+    return _CLASS_LOOKUP.get(_normalize(folder_name))
+
+
+def iter_image_files(root: str) -> Iterator[str]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if _is_image(filename):
+                yield os.path.join(dirpath, filename)
+
+
+def _is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_image_bytes(source: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields (name, bytes) for every image in a directory, a tar archive (optionally
+    compressed) or a zip archive. Names are paths relative to the directory or archive
+    root, in a stable order so a run can be resumed by name. Tars are read as a stream.
+    """
+    if os.path.isdir(source):
+        for path in iter_image_files(source):
+            with open(path, "rb") as f:
+                yield os.path.relpath(path, source), f.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if not info.is_dir() and _is_image(info.filename):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"{source} is not a directory, tar or zip archive")
+
+
+def iter_labelled_images(root: str) -> Iterator[Tuple[str, int]]:
+    """Yields (path, class index) for images in class-named subfolders of `root`."""
+    for folder in sorted(os.listdir(root)):
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        label = class_index_for_folder(folder)
+        if label is None:
+            print(f"Skipping folder with unknown class: {folder}")
+            continue
+        for path in iter_image_files(folder_path):
+            yield path, label
@@ -0,0 +1,114 @@
+"""
+Exports the combined MobileNetV2 + classifier model to a self-contained artifact,
+so workers can start without downloading from tfhub.dev.
+
+Run from the Backend directory:
+    python -m scripts.export_model --format savedmodel
+    python -m scripts.export_model --format tflite
+    python -m scripts.export_model --format onnx      (requires tf2onnx)
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from app.services.inference_backends import DEFAULT_ARTIFACTS, EMBEDDING_NAME, INPUT_NAME, INPUT_SHAPE, OUTPUT_NAME
+from app.services.model_loader import DEFAULT_WEIGHTS_PATH, build_model
+
+
+def serving_function(model, embeddings: bool = True):
+    """
+    The serving signature. With `embeddings` it also returns the feature extractor output,
+    which the API stores for similar-case search.
+    """
+    import tensorflow as tf
+
+    feature_extractor, classifier = model.layers
+
+    @tf.function(input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name=INPUT_NAME)])
+    def serve(image):
+        features = feature_extractor(image, training=False)
+        outputs = {OUTPUT_NAME: classifier(features, training=False)}
+        if embeddings:
+            outputs[EMBEDDING_NAME] = features
+        return outputs
+
+    return serve
+
+
+def export_savedmodel(model, output_path: str, embeddings: bool = True):
+    import tensorflow as tf
+    tf.saved_model.save(model, output_path, signatures={"serving_default": serving_function(model, embeddings)})
+
+
+def export_tflite(
+    model,
+    output_path: str,
+    optimizations=None,
+    representative_dataset=None,
+    target_types=None,
+    target_ops=None
+):
+    import tensorflow as tf
+
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        # The TFLite backend reads a single output tensor, so only probabilities are exported
+        export_savedmodel(model, saved_model_dir, embeddings=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+        if optimizations:
+            converter.optimizations = optimizations
+        if representative_dataset is not None:
+            converter.representative_dataset = representative_dataset
+        if target_types:
+            converter.target_spec.supported_types = target_types
+        if target_ops:
+            converter.target_spec.supported_ops = target_ops
+        tflite_model = converter.convert()
+
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+
+
+def export_onnx(model, output_path: str, opset: int = 13):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("ONNX export requires tf2onnx: pip install tf2onnx onnxruntime")
+
+    serve = serving_function(model)
+    input_signature = [tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name=INPUT_NAME)]
+    # tf2onnx names the outputs Identity:0, Identity_1:0, ... in tf.nest order (sorted keys),
+    # so name them explicitly in that same order; ONNXBackend selects them by name
+    structured_outputs = serve.get_concrete_function().structured_outputs
+    output_names = tf.nest.flatten({name: name for name in structured_outputs})
+    tf2onnx.convert.from_function(
+        serve, input_signature=input_signature, opset=opset, output_path=output_path, output_names=output_names)
+
+
+EXPORTERS = {
+    "savedmodel": export_savedmodel,
+    "tflite": export_tflite,
+    "onnx": export_onnx
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=sorted(EXPORTERS), required=True)
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH)
+    parser.add_argument("--output", help="Defaults to the path the matching backend loads from")
+    args = parser.parse_args()
+
+    output_path = args.output or DEFAULT_ARTIFACTS[args.format]
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    model = build_model(args.weights)
+    EXPORTERS[args.format](model, output_path)
+    print(f"Exported {args.format} model to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Bulk jobs over the prediction history collection: export to NDJSON, import an export,
+and backfill fields on existing rows. Every job streams in --batch-size batches, writes
+with unordered bulk writes, can be throttled with --max-docs-per-second and checkpoints
+after each batch, so rerunning an interrupted command resumes where it stopped.
+
+Uses the configured MONGO_URI unless --mongo-uri is given; --mongomock runs the job
+in-process against an empty mongomock-motor database, which keeps nothing but is
+enough to try a job out (an import, say, checks that an export loads cleanly).
+Run from the Backend directory:
+    python -m scripts.history_jobs export --output history.ndjson [--user-id 42] [--no-embeddings]
+    python -m scripts.history_jobs import --input history.ndjson [--skip-existing]
+    python -m scripts.history_jobs --mongomock import --input history.ndjson
+    python -m scripts.history_jobs backfill-model --model dermaai:v1
+    python -m scripts.history_jobs rescore --backend tflite --precision int8 --max-docs-per-second 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from app.services.history_jobs import (
+    BackfillJob, ExportJob, ImportJob, ModelBackfill, RescoreBackfill, Throttle
+)
+from app.services.history_services import HistoryService
+
+
+def get_database(args):
+    from app.config import settings
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient().get_database(args.db_name or settings.MONGO_DB_NAME)
+    if args.mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(args.mongo_uri).get_database(args.db_name or settings.MONGO_DB_NAME)
+    from app.models.user_model import db
+    return db
+
+
+def build_job(args, history: HistoryService):
+    options = {
+        "batch_size": args.batch_size,
+        "throttle": Throttle(args.max_docs_per_second),
+        "report_seconds": args.report_seconds
+    }
+    if args.command == "export":
+        return ExportJob(history, args.output, user_id=args.user_id, include_embeddings=not args.no_embeddings,
+                         checkpoint_path=args.checkpoint or args.output + ".checkpoint.json", **options)
+    if args.command == "import":
+        return ImportJob(history, args.input, skip_existing=args.skip_existing,
+                         checkpoint_path=args.checkpoint or args.input + ".checkpoint.json", **options)
+
+    if args.command == "backfill-model":
+        backfill = ModelBackfill(args.model)
+    else:
+        from app.services.inference_backends import create_backend
+        from app.services.model_loader import CLASS_NAMES
+        backend = create_backend(args.backend, args.artifact, args.num_threads, args.precision)
+        backend.load()
+        label = args.model_label or f"{backend.name}:{backend.precision}:{os.path.basename(backend.artifact_path)}"
+        backfill = RescoreBackfill(backend, label, CLASS_NAMES)
+    return BackfillJob(history, backfill,
+                       checkpoint_path=args.checkpoint or f"history-{backfill.name}.checkpoint.json", **options)
+
+
+def main():
+    from app.services.inference_backends import BACKENDS, PRECISIONS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Defaults to MONGO_URI from the settings")
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock-motor database")
+    parser.add_argument("--db-name", help="Defaults to MONGO_DB_NAME")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-docs-per-second", type=float, default=0.0, help="0 means unthrottled")
+    parser.add_argument("--checkpoint", help="Checkpoint file; each job has a default next to its input or output")
+    parser.add_argument("--report-seconds", type=float, default=10.0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write history as NDJSON (MongoDB Extended JSON)")
+    export.add_argument("--output", required=True)
+    export.add_argument("--user-id", type=int, help="Only this user's history")
+    export.add_argument("--no-embeddings", action="store_true", help="Leave out stored image embeddings")
+
+    import_ = commands.add_parser("import", help="Load an export, replacing rows with the same _id")
+    import_.add_argument("--input", required=True)
+    import_.add_argument("--skip-existing", action="store_true", help="Keep rows that already exist instead")
+
+    backfill_model = commands.add_parser("backfill-model", help="Set `model` on rows saved without one")
+    backfill_model.add_argument("--model", required=True, help="Model key to record, e.g. dermaai:v1")
+
+    rescore = commands.add_parser("rescore", help="Re-score uploaded images into a `rescored` sub-document")
+    rescore.add_argument("--backend", choices=list(BACKENDS), default="keras")
+    rescore.add_argument("--precision", choices=PRECISIONS, default="float32")
+    rescore.add_argument("--artifact")
+    rescore.add_argument("--num-threads", type=int, default=0)
+    rescore.add_argument("--model-label", help="Stored as rescored.model; defaults to backend:precision:artifact")
+
+    args = parser.parse_args()
+    history = HistoryService(get_database(args))
+    try:
+        job = build_job(args, history)
+        report = asyncio.run(job.run())
+    except ValueError as e:
+        raise SystemExit(str(e))
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        sys.exit(130)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Checks that the `counters` documents used by the block ID allocator are ahead of every
+integer _id already stored, and moves them forward when they are not (for example after
+a restore or a manual import). Run it once before switching a deployment to leased IDs;
+it is safe to re-run.
+
+Run from the Backend directory:
+    python -m scripts.migrate_id_counters            (report only)
+    python -m scripts.migrate_id_counters --apply
+"""
+import argparse
+import asyncio
+
+from app.models.user_model import db
+
+COUNTERS = {"user_id": "users", "history_id": "history"}
+
+
+async def migrate(apply: bool):
+    for counter, collection_name in COUNTERS.items():
+        latest = await db[collection_name].find_one({}, sort=[("_id", -1)], projection={"_id": 1})
+        max_id = latest["_id"] if latest and isinstance(latest["_id"], int) else 0
+        counter_doc = await db.counters.find_one({"_id": counter})
+        current = counter_doc["sequence_value"] if counter_doc else 0
+
+        if current >= max_id:
+            print(f"{counter}: counter {current} is ahead of max _id {max_id}, nothing to do")
+            continue
+
+        print(f"{counter}: counter {current} is behind max _id {max_id}")
+        if apply:
+            await db.counters.update_one(
+                {"_id": counter}, {"$max": {"sequence_value": max_id}}, upsert=True)
+            print(f"{counter}: counter moved to {max_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Update counters instead of only reporting")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.apply))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Runs the model-server processes for multi-worker deployments. Each process loads the
+models once and serves every web worker on the host over a Unix socket, with batches
+passed through shared memory, so N web workers no longer mean N copies of TensorFlow
+and the weights. Server processes that die are restarted; web workers reconnect.
+
+Set MODEL_SERVER_SOCKET (and MODEL_SERVER_PROCESSES) in the environment of both this
+command and the API, then run from the Backend directory:
+    python -m scripts.model_server
+    uvicorn app.main:app --workers 4
+
+In containers, /dev/shm must fit every web worker's ring:
+MODEL_SERVER_RING_SLOTS x INFERENCE_MAX_BATCH_SIZE x ~0.6 MB per worker and server process.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+from app.config import settings
+from app.services.model_registry import model_registry
+from app.services.model_server import ModelServer, model_server_authkey, server_addresses
+
+
+def serve(address: str, model_configs: dict, threads: int):
+    ModelServer(address, model_server_authkey(), model_configs, threads=threads).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=settings.MODEL_SERVER_SOCKET, help="Defaults to MODEL_SERVER_SOCKET")
+    parser.add_argument("--processes", type=int, default=settings.MODEL_SERVER_PROCESSES)
+    parser.add_argument("--threads", type=int, default=settings.MODEL_SERVER_THREADS,
+                        help="Batches each process runs at once")
+    args = parser.parse_args()
+    if not args.socket:
+        raise SystemExit("Set MODEL_SERVER_SOCKET or pass --socket")
+
+    # TensorFlow is not fork-safe, so servers are spawned fresh
+    context = multiprocessing.get_context("spawn")
+    model_configs = model_registry.model_configs()
+    addresses = server_addresses(args.socket, args.processes)
+    servers = {}
+    stopping = False
+
+    def start(address: str):
+        process = context.Process(target=serve, args=(address, model_configs, args.threads), daemon=True)
+        process.start()
+        servers[address] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for address in addresses:
+        start(address)
+
+    try:
+        while not stopping:
+            time.sleep(1.0)
+            for address, process in list(servers.items()):
+                if not process.is_alive() and not stopping:
+                    print(f"Model server on {address} exited with {process.exitcode}; restarting")
+                    start(address)
+    finally:
+        for process in servers.values():
+            process.terminate()
+        for process in servers.values():
+            process.join(10)
+        for address in addresses:
+            if os.path.exists(address):
+                os.remove(address)
+
+
+if __name__ == "__main__":
+    main()
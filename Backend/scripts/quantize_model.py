@@ -0,0 +1,82 @@
+"""
+Builds a post-training quantized TFLite model from the existing Keras weights.
+
+INT8 quantization calibrates activation ranges on a representative sample of real
+images; float16 only halves the weights and needs no calibration data.
+
+Run from the Backend directory:
+    python -m scripts.quantize_model --precision int8 --calibration-dir data/train
+    python -m scripts.quantize_model --precision float16
+
+Serve the result with MODEL_BACKEND=tflite and MODEL_PRECISION=<precision>.
+"""
+import argparse
+import itertools
+import os
+import random
+
+from app.services.inference_backends import default_artifact
+from app.services.model_loader import DEFAULT_WEIGHTS_PATH, build_model
+from app.utils.image_utils import ImageValidationError, preprocess_image
+from scripts.datasets import iter_image_files
+from scripts.export_model import export_tflite
+
+
+def representative_dataset(calibration_dir: str, num_samples: int, seed: int = 0):
+    paths = list(iter_image_files(calibration_dir))
+    if not paths:
+        raise SystemExit(f"No images found in {calibration_dir}")
+    random.Random(seed).shuffle(paths)
+
+    def generator():
+        yielded = 0
+        for path in itertools.cycle(paths[:num_samples]):
+            if yielded >= num_samples:
+                return
+            with open(path, "rb") as f:
+                try:
+                    yield [preprocess_image(f.read())]
+                except ImageValidationError:
+                    continue
+            yielded += 1
+
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precision", choices=["int8", "float16"], required=True)
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH)
+    parser.add_argument("--calibration-dir", help="Folder of training images, required for int8")
+    parser.add_argument("--samples", type=int, default=200, help="Number of calibration images")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    output_path = args.output or default_artifact("tflite", args.precision)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    model = build_model(args.weights)
+
+    if args.precision == "float16":
+        export_tflite(
+            model, output_path,
+            optimizations=[tf.lite.Optimize.DEFAULT],
+            target_types=[tf.float16]
+        )
+    else:
+        if not args.calibration_dir:
+            parser.error("--calibration-dir is required for int8")
+        # Integer kernels throughout, with float32 input/output so callers are unchanged
+        export_tflite(
+            model, output_path,
+            optimizations=[tf.lite.Optimize.DEFAULT],
+            representative_dataset=representative_dataset(args.calibration_dir, args.samples),
+            target_ops=[tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        )
+
+    print(f"Wrote {args.precision} model to {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
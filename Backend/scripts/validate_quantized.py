@@ -0,0 +1,94 @@
+"""
+Compares a quantized (or any other) backend against the float reference over a labelled
+image folder, reporting accuracy, top-1 agreement and confidence drift.
+
+Images are read from class-named subfolders of --data-dir (Kaggle dataset layout works).
+Exits non-zero when agreement falls below --min-agreement, so it can gate a rollout.
+
+Run from the Backend directory:
+    python -m scripts.validate_quantized --data-dir data/test --precision int8
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from app.services.inference_backends import BACKENDS, PRECISIONS, create_backend
+from app.utils.image_utils import allocate_batch, preprocess_batch
+from scripts.datasets import iter_labelled_images
+
+
+def evaluate(reference, candidate, samples, batch_size: int) -> dict:
+    buffer = allocate_batch(batch_size)
+    labels, ref_probs, cand_probs = [], [], []
+
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        images = []
+        for path, _ in chunk:
+            with open(path, "rb") as f:
+                images.append(f.read())
+        batch, errors = preprocess_batch(images, buffer)
+        valid = [i for i, error in enumerate(errors) if error is None]
+        if not valid:
+            continue
+        batch = batch[valid]
+        labels.extend(chunk[i][1] for i in valid)
+        ref_probs.append(reference.predict(batch))
+        cand_probs.append(candidate.predict(batch))
+
+    if not labels:
+        raise SystemExit("No readable images to evaluate")
+
+    labels = np.asarray(labels)
+    ref_probs = np.concatenate(ref_probs)
+    cand_probs = np.concatenate(cand_probs)
+    ref_top1 = ref_probs.argmax(axis=1)
+    cand_top1 = cand_probs.argmax(axis=1)
+    rows = np.arange(len(labels))
+    # Drift of the confidence each model reports for the reference's predicted class
+    drift = np.abs(ref_probs[rows, ref_top1] - cand_probs[rows, ref_top1]) * 100
+
+    return {
+        "images": int(len(labels)),
+        "reference_accuracy": float((ref_top1 == labels).mean()),
+        "candidate_accuracy": float((cand_top1 == labels).mean()),
+        "top1_agreement": float((ref_top1 == cand_top1).mean()),
+        "mean_confidence_drift": float(drift.mean()),
+        "p95_confidence_drift": float(np.percentile(drift, 95)),
+        "max_confidence_drift": float(drift.max())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--reference-backend", choices=list(BACKENDS), default="keras")
+    parser.add_argument("--reference-artifact")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="tflite")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8")
+    parser.add_argument("--artifact")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    args = parser.parse_args()
+
+    reference = create_backend(args.reference_backend, args.reference_artifact)
+    candidate = create_backend(args.backend, args.artifact, precision=args.precision)
+    reference.load()
+    candidate.load()
+
+    samples = list(iter_labelled_images(args.data_dir))
+    report = evaluate(reference, candidate, samples, args.batch_size)
+    report.update({
+        "reference": f"{reference.name}:{reference.precision}",
+        "candidate": f"{candidate.name}:{candidate.precision}",
+        "min_agreement": args.min_agreement,
+        "passed": report["top1_agreement"] >= args.min_agreement
+    })
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
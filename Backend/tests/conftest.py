@@ -0,0 +1,25 @@
+import os
+
+# app.config requires these; tests never send mail or upload, so placeholders are enough
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_INITDB_DATABASE": "derma_ai",
+    "JWT_SECRET_KEY": "test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_FROM_NAME": "DermaAI",
+    "MAIL_PORT": "1025",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "USE_CREDENTIALS": "false",
+    "VALIDATE_CERTS": "false",
+    "EMAIL_VERIFICATION_TOKEN_EXPIRE_MINUTES": "60",
+    "CLOUDINARY_CLOUD_NAME": "test",
+    "CLOUDINARY_API_KEY": "test",
+    "CLOUDINARY_API_SECRET": "test",
+    "FRONTEND_URL": "http://localhost:5173"
+}.items():
+    os.environ.setdefault(name, value)
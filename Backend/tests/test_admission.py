@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event):
+    async with controller.admit():
+        await release.wait()
+
+
+async def queued_admit(controller: AdmissionController):
+    async with controller.admit():
+        pass
+
+
+def test_release_while_a_cancelled_waiter_unwinds():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, max_wait_ms=10_000)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(queued_admit(controller))
+        await asyncio.sleep(0)
+        assert controller.metrics()["queue_depth"] == 1
+
+        waiter.cancel()
+        # wait_for has cancelled the inner future but the waiter hasn't unwound yet
+        await asyncio.sleep(0)
+        controller._release(1, 0.0)
+        # Give the holder its slot back so its own release balances out
+        controller._in_flight += 1
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller._queued_cost == 0
+        assert controller.metrics()["queue_depth"] == 0
+
+        release.set()
+        await holder
+        assert controller.metrics()["in_flight"] == 0
+
+    asyncio.run(run())
+
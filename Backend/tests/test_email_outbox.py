@@ -0,0 +1,126 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.services import auth_services
+from app.services.email_outbox import EmailOutbox
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class Inbox:
+    """aiosmtpd handler that records deliveries and can refuse the next few."""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+        self.refuse = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        if self.refuse:
+            self.refuse -= 1
+            return "550 Mailbox unavailable"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def inbox(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Inbox()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(settings, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(settings, "MAIL_PORT", port)
+    monkeypatch.setattr(settings, "MAIL_STARTTLS", False)
+    monkeypatch.setattr(settings, "MAIL_SSL_TLS", False)
+    monkeypatch.setattr(settings, "USE_CREDENTIALS", False)
+    yield handler
+    controller.stop()
+
+
+def new_outbox(**options) -> EmailOutbox:
+    collection = mongomock_motor.AsyncMongoMockClient().get_database("derma_ai").email_outbox
+    return EmailOutbox(collection, **options)
+
+
+async def drain(outbox: EmailOutbox):
+    batch = await outbox._claim_batch()
+    await outbox._send_batch(batch)
+    return batch
+
+
+def test_batch_reuses_one_smtp_connection(inbox):
+    async def run():
+        outbox = new_outbox()
+        await outbox.ensure_indexes()
+        for i in range(3):
+            await outbox.enqueue(f"user{i}@example.com", "Hello", f"<p>{i}</p>")
+        assert len(await drain(outbox)) == 3
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert [envelope.rcpt_tos for envelope in inbox.messages] == [
+        ["user0@example.com"], ["user1@example.com"], ["user2@example.com"]]
+    assert len(inbox.peers) == 1
+    assert outbox.smtp.connects == 1
+    assert outbox.sent == 3
+
+
+def test_refused_send_is_retried_after_backoff(inbox):
+    inbox.refuse = 1
+
+    async def run():
+        outbox = new_outbox(backoff_seconds=30.0)
+        await outbox.ensure_indexes()
+        await outbox.enqueue("user@example.com", "Hello", "<p>hi</p>")
+
+        await drain(outbox)
+        doc = await outbox.collection.find_one({})
+        assert doc["status"] == "pending"
+        assert doc["attempts"] == 1
+        assert doc["next_attempt_at"] > datetime.utcnow() + timedelta(seconds=20)
+        # Still backing off: nothing to claim yet
+        assert await outbox._claim_batch() == []
+
+        await outbox.collection.update_one({}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+        await drain(outbox)
+        assert await outbox.collection.count_documents({}) == 0
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert len(inbox.messages) == 1
+    assert outbox.retried == 1
+    assert outbox.sent == 1
+    # The refused connection was dropped and a fresh one opened for the retry
+    assert outbox.smtp.connects == 2
+
+
+def test_repeat_verification_requests_send_one_email(inbox, monkeypatch):
+    outbox = new_outbox()
+    monkeypatch.setattr(auth_services, "email_outbox", outbox)
+    user = auth_services.UserDB(_id=1, full_name="T", email="t@example.com", password="x")
+    service = auth_services.AuthService(db=None)
+
+    async def run():
+        await outbox.ensure_indexes()
+        await service.send_verification_email(user)
+        monkeypatch.setattr(settings, "FRONTEND_URL", "https://app.example.com")
+        await service.send_verification_email(user)
+        await drain(outbox)
+        await outbox.stop()
+
+    asyncio.run(run())
+    assert outbox.deduplicated == 1
+    assert len(inbox.messages) == 1
+    # The pending email carries the newest link
+    assert b"https://app.example.com/verify-email" in inbox.messages[0].content
@@ -0,0 +1,56 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.embedding_index import EmbeddingIndex, encode_embedding
+
+
+def embeddings(seed: int, n: int, dim: int = 16) -> list:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim))
+    return [encode_embedding(vector) for vector in vectors]
+
+
+def test_two_instances_append_without_overwriting(tmp_path):
+    # Two API workers sharing EMBEDDING_INDEX_DIR
+    first = EmbeddingIndex(str(tmp_path), enabled=True)
+    second = EmbeddingIndex(str(tmp_path), enabled=True)
+    first_rows, second_rows = embeddings(1, 3), embeddings(2, 3)
+
+    first.add("dermaai:v1", [1, 2], [7, 7], first_rows[:2])
+    second.add("dermaai:v1", [101, 102], [7, 8], second_rows[:2])
+    first.add("dermaai:v1", [3], [8], first_rows[2:])
+    second.add("dermaai:v1", [103], [7], second_rows[2:])
+
+    for index in (first, second):
+        assert sorted(index._segment("dermaai:v1").history_ids()) == [1, 2, 3, 101, 102, 103]
+    # Each worker finds rows the other one wrote
+    query = np.frombuffer(second_rows[0], dtype=np.float16)
+    assert first.search("dermaai:v1", query, k=1, user_id=7)[0][0] == 101
+    query = np.frombuffer(first_rows[2], dtype=np.float16)
+    assert second.search("dermaai:v1", query, k=1, user_id=8)[0][0] == 3
+
+    second.remove(2)
+    reopened = EmbeddingIndex(str(tmp_path), enabled=True)
+    assert sorted(reopened._segment("dermaai:v1").history_ids()) == [-1, 1, 3, 101, 102, 103]
+
+
+def test_sync_picks_up_ids_below_the_highest_indexed(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient().get_database("derma_ai")
+    rows = embeddings(3, 3)
+    index = EmbeddingIndex(str(tmp_path), enabled=True)
+
+    async def run():
+        # A worker on a higher id block saved (and indexed) its row first
+        await db.history.insert_one({"_id": 2000, "user_id": 1, "model": "dermaai:v1", "embedding": rows[0]})
+        index.add("dermaai:v1", [2000], [1], rows[:1])
+        await db.history.insert_many([
+            {"_id": 5, "user_id": 1, "model": "dermaai:v1", "embedding": rows[1]},
+            {"_id": 6, "user_id": 2, "model": "dermaai:v1", "embedding": rows[2]}
+        ])
+        await index.sync(db)
+        await index.sync(db)
+
+    asyncio.run(run())
+    assert sorted(index._segment("dermaai:v1").history_ids()) == [5, 6, 2000]
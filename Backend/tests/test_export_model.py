@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from app.services.inference_backends import INPUT_SHAPE, ONNXBackend
+from app.services.model_loader import CLASS_NAMES
+from scripts.export_model import export_onnx
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tf2onnx")
+pytest.importorskip("onnxruntime")
+
+
+def small_model():
+    # Same two-layer layout as build_model: a feature extractor, then the classifier
+    feature_extractor = tf.keras.Sequential([
+        tf.keras.layers.Conv2D(4, 3, strides=8, input_shape=INPUT_SHAPE),
+        tf.keras.layers.GlobalAveragePooling2D()
+    ])
+    classifier = tf.keras.layers.Dense(len(CLASS_NAMES), activation="softmax")
+    return tf.keras.Sequential([feature_extractor, classifier])
+
+
+def test_onnx_round_trip_selects_probabilities(tmp_path):
+    model = small_model()
+    artifact = str(tmp_path / "model.onnx")
+    export_onnx(model, artifact)
+
+    backend = ONNXBackend(artifact)
+    backend.load()
+    batch = np.random.default_rng(0).random((3,) + INPUT_SHAPE, dtype=np.float32)
+    probabilities, embeddings = backend.predict_with_embeddings(batch)
+
+    assert probabilities.shape == (3, len(CLASS_NAMES))
+    np.testing.assert_allclose(probabilities, model(batch).numpy(), atol=1e-5)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, atol=1e-5)
+    assert embeddings.shape == (3, 4)
+    np.testing.assert_allclose(backend.predict(batch), probabilities)
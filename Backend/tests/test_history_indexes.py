@@ -0,0 +1,77 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app.services.history_services import HISTORY_INDEXES, HISTORY_SORT, HistoryService, encode_cursor
+
+# explain() needs a real server; mongomock has no query planner
+MONGO_URI = os.environ.get("TEST_MONGO_URI", os.environ["MONGO_URI"])
+
+
+@pytest.fixture(scope="module")
+def history():
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"No MongoDB reachable at {MONGO_URI}")
+
+    db = client[f"dermaai_test_{uuid.uuid4().hex[:8]}"]
+    for keys in HISTORY_INDEXES:
+        db.history.create_index(keys)
+    start = datetime(2024, 1, 1)
+    db.history.insert_many([
+        {
+            "_id": i,
+            "user_id": i % 20,
+            "disease": ["Acne", "Eczema", "Psoriasis"][i % 3],
+            "confidence": 90.0,
+            "timestamp": start + timedelta(minutes=i)
+        }
+        for i in range(2000)
+    ])
+    yield db.history
+    client.drop_database(db.name)
+    client.close()
+
+
+def plan_stages(plan) -> list:
+    """Every stage of a winning plan as (stage name, index key pattern or None)."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            key_pattern = plan.get("keyPattern")
+            stages.append((plan["stage"], list(key_pattern) if key_pattern else None))
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += plan_stages(value)
+    return stages
+
+
+def winning_stages(cursor) -> list:
+    return plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+
+
+def test_keyset_page_uses_user_timestamp_index(history):
+    first_page = list(history.find({"user_id": 3}).sort(HISTORY_SORT).limit(10))
+    query = HistoryService.build_query(3, before=encode_cursor(first_page[-1]))
+
+    stages = winning_stages(history.find(query).sort(HISTORY_SORT).limit(11))
+
+    assert ("IXSCAN", ["user_id", "timestamp", "_id"]) in stages
+    assert "COLLSCAN" not in [stage for stage, _ in stages]
+
+
+def test_disease_filter_uses_disease_index(history):
+    query = HistoryService.build_query(3, disease="Eczema")
+
+    stages = winning_stages(history.find(query).sort(HISTORY_SORT).limit(11))
+
+    assert ("IXSCAN", ["user_id", "disease", "timestamp", "_id"]) in stages
+    assert "COLLSCAN" not in [stage for stage, _ in stages]